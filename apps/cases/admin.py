@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Case, CaseDocument, SecondOpinion, CaseAuditLog, MedicalOpinion, FinalReport
+from .models import Case, CaseDocument, SecondOpinion, CaseAuditLog, MedicalOpinion, FinalReport, StoredBlob
 from .mdt_models import (
     MDTMessage, MDTMessageAttachment, UserPresence, AlgoritmoConfig,
     AsignacionAuditLog, ConsensusWorkflow, ConsensusVersion, ConsensusVote,
@@ -49,6 +49,15 @@ class CaseDocumentAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    """Admin (solo lectura) para los blobs deduplicados"""
+    
+    list_display = ('sha256', 'size', 'ref_count', 'created_at')
+    search_fields = ('sha256',)
+    readonly_fields = ('sha256', 'file', 'size', 'ref_count', 'created_at')
+
+
 @admin.register(SecondOpinion)
 class SecondOpinionAdmin(admin.ModelAdmin):
     """Admin para el modelo SecondOpinion"""
@@ -0,0 +1,92 @@
+"""
+Detección y reemplazo de PII en texto en una sola pasada.
+
+Email, teléfono, número de identificación y nombres se combinan en una
+única expresión regular con grupos con nombre; `re.sub` recorre el texto una
+vez y la función de reemplazo elige la etiqueta según el grupo que coincidió.
+A igualdad de posición gana el primer grupo (email > teléfono > id >
+nombre), el mismo orden en que se aplicaban las pasadas sucesivas.
+
+Los nombres se compilan como un trie (`ana(?:lia)?|juan`) en lugar de una
+alternativa plana: cada posición del texto se resuelve en un recorrido del
+trie, así que el coste no crece con el número de nombres del diccionario.
+Se comparan sin distinguir mayúsculas y como palabra completa.
+"""
+
+import re
+from functools import lru_cache
+
+PATRONES_PII = {
+    'email': r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}',
+    'telefono': r'(?:\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}',
+    'cedula': r'\d{6,12}',
+}
+
+REEMPLAZOS = {
+    'email': '[EMAIL_REMOVIDO]',
+    'telefono': '[TELÉFONO_REMOVIDO]',
+    'cedula': '[ID_REMOVIDO]',
+    'nombre': '[NOMBRE_REMOVIDO]',
+}
+
+# Palabras más cortas no se consideran nombres (evita "de", "la", "Ana"...)
+MIN_LONGITUD_NOMBRE = 4
+
+
+def _trie_pattern(palabras):
+    """Expresión regular equivalente a la alternativa de `palabras`, en forma de trie."""
+    trie = {}
+    for palabra in palabras:
+        nodo = trie
+        for caracter in palabra:
+            nodo = nodo.setdefault(caracter, {})
+        nodo[''] = True
+
+    def compilar(nodo):
+        fin = '' in nodo
+        ramas = [re.escape(c) + compilar(hijo) for c, hijo in sorted(nodo.items()) if c]
+        if not ramas:
+            return ''
+        patron = ramas[0] if len(ramas) == 1 else '(?:' + '|'.join(ramas) + ')'
+        if fin:
+            # Greedy: se prefiere la palabra más larga
+            patron = f'(?:{patron})?'
+        return patron
+
+    return compilar(trie)
+
+
+def normalizar_nombres(nombres):
+    """Tokens de nombre (str o iterable de str) en minúsculas, sin repetidos."""
+    if not nombres:
+        return ()
+    if isinstance(nombres, str):
+        nombres = [nombres]
+    tokens = {t.lower() for n in nombres if n for t in n.split() if len(t) >= MIN_LONGITUD_NOMBRE}
+    return tuple(sorted(tokens))
+
+
+@lru_cache(maxsize=256)
+def compilar_patron(nombres=()):
+    """Regex combinada para una tupla normalizada de nombres (cacheada)."""
+    partes = [f'(?P<{grupo}>{patron})' for grupo, patron in PATRONES_PII.items()]
+    if nombres:
+        partes.append(rf'(?P<nombre>(?<!\w)(?i:{_trie_pattern(nombres)})(?!\w))')
+    return re.compile('|'.join(partes))
+
+
+def _reemplazar(match):
+    return REEMPLAZOS[match.lastgroup]
+
+
+def anonimizar(texto, nombres=None):
+    """Reemplaza la PII de `texto` en una sola pasada."""
+    if not texto:
+        return texto
+    return compilar_patron(normalizar_nombres(nombres)).sub(_reemplazar, texto)
+
+
+def anonimizar_lote(textos, nombres=None):
+    """Anonimiza varios textos compilando el patrón una sola vez."""
+    patron = compilar_patron(normalizar_nombres(nombres))
+    return [patron.sub(_reemplazar, t) if t else t for t in textos]
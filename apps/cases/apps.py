@@ -32,3 +32,6 @@ class CasesConfig(AppConfig):
             from . import signals  # noqa: F401
         except Exception:
             pass
+        # La tabla de enrutamiento se registra en el caché de datos de
+        # referencia al importarse: así todos los procesos la invalidan
+        from . import routing_table  # noqa: F401
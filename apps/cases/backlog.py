@@ -0,0 +1,173 @@
+"""
+Asignación en lote de los casos que quedaron sin asignar.
+
+Los casos en SUBMITTED sin grupo médico (la asignación automática de
+`sop_step4` falló o no se ejecutó) se asignan con las mismas reglas que
+`asignar_caso_automatico`:
+
+- grupo: el del `tipo_cancer` si está activo o, si no, el primer grupo
+  activo cuyo nombre contiene `specialty_required`;
+- responsable y médico del caso: el líder del grupo (`get_lider`).
+
+Ambos salen de una `RoutingTable` (`cases.routing_table`) construida al
+empezar.
+
+Además se elige, con los scores de `cases.scoring`, el médico del grupo que
+recibe la carga del caso (`medico_asignado`); su `casos_actuales` se
+incrementa en memoria durante el lote para que los casos siguientes vean la
+carga actualizada.
+
+Los candidatos se cargan una sola vez. Cada bloque de casos se
+escribe en una transacción: `bulk_update` de los casos, `bulk_create` del
+registro de auditoría y de las notificaciones, y los incrementos de
+`casos_actuales` con F() (ver `cases.workload`).
+"""
+
+import logging
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Case
+from .routing_table import RoutingTable
+from .scoring import calcular_scores
+from .services import avisos_asignacion
+from .workload import sumar_cargas
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+class BacklogAssigner:
+    """Estado en memoria de una ejecución de asignación en lote."""
+
+    def __init__(self, config=None, ahora=None):
+        from core.reference_data import algoritmo_config
+        from medicos.models import DoctorGroupMembership
+        from .mdt_models import AlgoritmoConfig
+
+        self.config = config or algoritmo_config() or AlgoritmoConfig()
+        self.ahora = ahora or timezone.now()
+        # Tabla recién construida (no la del caché): el lote parte de datos al día
+        self.rutas = RoutingTable.build()
+
+        # Candidatos en el orden de las membresías (desempate del scoring)
+        self.candidatos = defaultdict(list)
+        for m in (
+            DoctorGroupMembership.objects.filter(grupo_id__in=self.rutas.nombres, activo=True)
+            .select_related('medico')
+            .order_by('-fecha_union')
+        ):
+            if self._es_candidato(m.medico):
+                self.candidatos[m.grupo_id].append(m.medico)
+        self.deltas = Counter()
+
+    def _es_candidato(self, medico):
+        if self.config.respetar_disponibilidad and not medico.disponible_segundas_opiniones:
+            return False
+        return medico.estado == 'activo'
+
+    def elegir_medico(self, grupo_id):
+        """Mejor candidato con la carga actual más la asignada en este lote, o None."""
+        limite = self.config.limite_mensual_por_medico
+        filas = [
+            (m.pk, m.casos_actuales + self.deltas[m.pk], m.max_casos_mes, m.fecha_ingreso)
+            for m in self.candidatos[grupo_id]
+            if m.casos_actuales + self.deltas[m.pk] < limite
+        ]
+        if not filas:
+            return None
+        scores = calcular_scores(filas, self.config, self.ahora)
+        return scores.fila(scores.top_k(1)[0])
+
+    def asignar_bloque(self, case_ids, notify=True, dry_run=False):
+        """Asigna un bloque de casos en una transacción. Devuelve (asignados, omitidos)."""
+        from notifications.models import Notification
+        from .mdt_models import AsignacionAuditLog
+
+        with transaction.atomic():
+            # Solo los que siguen sin asignar; los bloqueados por otra
+            # asignación en curso se dejan para la siguiente ejecución
+            casos = list(
+                Case.objects.select_for_update(skip_locked=True, of=('self',))
+                .filter(pk__in=case_ids, status='SUBMITTED', medical_group__isnull=True)
+                .select_related('tipo_cancer')
+                .order_by('created_at', 'pk')
+            )
+            asignados, omitidos, auditoria, avisos = [], [], [], []
+            deltas_bloque = Counter()
+
+            for case in casos:
+                ruta = self.rutas.ruta(case)
+                if not ruta or not ruta.responsable_id:
+                    omitidos.append(case.case_id)
+                    continue
+
+                case.medical_group_id = ruta.grupo_id
+                case.responsable_id = ruta.responsable_id
+                case.doctor_id = ruta.responsable_usuario_id
+                if not case.assigned_at:
+                    case.assigned_at = self.ahora
+                # bulk_update no aplica auto_now
+                case.updated_at = self.ahora
+                asignados.append(case)
+
+                elegido = self.elegir_medico(ruta.grupo_id)
+                if elegido:
+                    medico_id, carga, antiguedad, final = elegido
+                    case.medico_asignado_id = medico_id
+                    self.deltas[medico_id] += 1
+                    deltas_bloque[medico_id] += 1
+                    auditoria.append(AsignacionAuditLog(
+                        caso=case,
+                        medico_seleccionado_id=medico_id,
+                        decision='asignado',
+                        motivo=f'Backlog: carga={carga:.2f}, antiguedad={antiguedad:.2f}',
+                        score_carga=carga,
+                        score_antiguedad=antiguedad,
+                        score_final=final,
+                        config=self.config if self.config.pk else None,
+                    ))
+
+                if notify:
+                    avisos.extend(avisos_asignacion(case, ruta.grupo_nombre, self.rutas.receptores.get(ruta.grupo_id, ())))
+
+            if dry_run:
+                transaction.set_rollback(True)
+                return len(asignados), omitidos
+
+            Case.objects.bulk_update(asignados, ['medical_group', 'responsable', 'medico_asignado', 'doctor', 'assigned_at', 'updated_at'])
+            AsignacionAuditLog.objects.bulk_create(auditoria)
+            Notification.objects.bulk_create(avisos)
+            sumar_cargas(deltas_bloque)
+        return len(asignados), omitidos
+
+
+def pending_case_ids(limit=None):
+    qs = Case.objects.filter(status='SUBMITTED', medical_group__isnull=True).order_by('created_at', 'pk')
+    ids = list(qs.values_list('pk', flat=True))
+    return ids[:limit] if limit else ids
+
+
+def assign_backlog(chunk_size=DEFAULT_CHUNK_SIZE, limit=None, notify=True, dry_run=False, progress=None):
+    """
+    Asigna los casos pendientes por bloques. Devuelve un resumen con
+    `pendientes`, `asignados` y `omitidos` (case_id sin grupo o sin líder).
+    """
+    ids = pending_case_ids(limit)
+    resumen = {'pendientes': len(ids), 'asignados': 0, 'omitidos': []}
+    if not ids:
+        return resumen
+
+    assigner = BacklogAssigner()
+    for i in range(0, len(ids), chunk_size):
+        # Los casos se vuelven a leer (y bloquear) dentro de la transacción del bloque
+        asignados, omitidos = assigner.asignar_bloque(ids[i:i + chunk_size], notify=notify, dry_run=dry_run)
+        resumen['asignados'] += asignados
+        resumen['omitidos'].extend(omitidos)
+        if progress:
+            progress(min(i + chunk_size, len(ids)), len(ids), resumen)
+    log.info('assign_backlog: %s asignados, %s omitidos de %s', resumen['asignados'], len(resumen['omitidos']), len(ids))
+    return resumen
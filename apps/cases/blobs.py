@@ -0,0 +1,128 @@
+"""
+Almacenamiento de documentos direccionado por contenido.
+
+Cada archivo subido se identifica por su SHA-256, calculado leyendo el
+archivo por bloques (sin cargarlo en memoria). Si ya existe un StoredBlob
+con ese digest, el nuevo CaseDocument lo reutiliza e incrementa su
+contador de referencias; el archivo físico solo se borra cuando el
+contador llega a cero.
+"""
+
+import hashlib
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import StoredBlob
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStorageService:
+    """Alta y baja de referencias a StoredBlob."""
+
+    @staticmethod
+    def hash_file(f, extractor=None):
+        """
+        Devuelve `(sha256_hex, tamaño)` leyendo `f` por bloques y lo rebobina.
+        Si se pasa un `MetadataExtractor`, recibe los mismos bloques.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        if hasattr(f, 'seek'):
+            f.seek(0)
+        for chunk in f.chunks():
+            digest.update(chunk)
+            size += len(chunk)
+            if extractor is not None:
+                extractor.feed(chunk)
+        if hasattr(f, 'seek'):
+            f.seek(0)
+        return digest.hexdigest(), size
+
+    @staticmethod
+    def acquire(f, extractor=None):
+        """
+        Obtiene el StoredBlob del contenido de `f` sumando una referencia.
+
+        Si el contenido es nuevo se escribe en el storage; si ya existe no se
+        vuelve a escribir. Debe llamarse dentro de una transacción junto con
+        el guardado del CaseDocument que lo referencia.
+        """
+        sha256, size = BlobStorageService.hash_file(f, extractor)
+
+        updated = StoredBlob.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1)
+        if updated:
+            return StoredBlob.objects.get(sha256=sha256)
+
+        blob = StoredBlob(sha256=sha256, size=size, ref_count=1)
+        blob.file.save(sha256, f, save=False)
+        try:
+            with transaction.atomic():
+                blob.save()
+        except IntegrityError:
+            # Otra petición creó el mismo blob en paralelo: usar el suyo
+            StoredBlob.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1)
+            existente = StoredBlob.objects.get(sha256=sha256)
+            if blob.file.name != existente.file.name:
+                BlobStorageService._delete_file(blob.file.storage, blob.file.name)
+            return existente
+        return blob
+
+    @staticmethod
+    def release(blob_id):
+        """
+        Resta una referencia al blob. Si llega a cero borra la fila y, tras
+        el commit, el archivo físico. Devuelve True si el blob se eliminó.
+        """
+        with transaction.atomic():
+            blob = StoredBlob.objects.select_for_update().filter(pk=blob_id).first()
+            if blob is None:
+                return False
+            if blob.ref_count > 1:
+                StoredBlob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') - 1)
+                return False
+
+            name = blob.file.name
+            storage = blob.file.storage
+            blob.delete()
+            transaction.on_commit(lambda: BlobStorageService._delete_file(storage, name))
+            return True
+
+    @staticmethod
+    def release_many(counts):
+        """
+        Resta referencias en bloque: `counts` es `{blob_id: n}`. Los blobs
+        que llegan a cero se borran (el archivo, tras el commit). Devuelve el
+        número de blobs eliminados.
+        """
+        if not counts:
+            return 0
+        with transaction.atomic():
+            blobs = list(StoredBlob.objects.select_for_update().filter(pk__in=counts.keys()))
+            huerfanos = [b for b in blobs if b.ref_count <= counts[b.pk]]
+            # Una UPDATE por cada decremento distinto (normalmente solo n=1)
+            por_decremento = {}
+            for blob in blobs:
+                if blob.ref_count > counts[blob.pk]:
+                    por_decremento.setdefault(counts[blob.pk], []).append(blob.pk)
+            for n, ids in por_decremento.items():
+                StoredBlob.objects.filter(pk__in=ids).update(ref_count=F('ref_count') - n)
+            if huerfanos:
+                archivos = [(b.file.storage, b.file.name) for b in huerfanos]
+                StoredBlob.objects.filter(pk__in=[b.pk for b in huerfanos]).delete()
+                transaction.on_commit(
+                    lambda: [BlobStorageService._delete_file(storage, name) for storage, name in archivos]
+                )
+        return len(huerfanos)
+
+    @staticmethod
+    def _delete_file(storage, name):
+        try:
+            storage.delete(name)
+        except Exception:
+            logger.exception('Error borrando blob %s', name)
+        from documents.renditions import delete_renditions
+        delete_renditions(storage, name)
+
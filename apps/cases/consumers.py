@@ -10,6 +10,7 @@ Contiene:
 import json
 import asyncio
 from datetime import datetime
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.utils import timezone
@@ -23,11 +24,21 @@ class MDTChatConsumer(AsyncWebsocketConsumer):
     Canales:
     - /mdt/{grupo_id}/ - Sala de un grupo médico específico
     - /mdt/{grupo_id}/caso/{caso_id}/ - Chat de un caso específico
+    
+    Con `?modo=conteo` el cliente solo escucha (p. ej. el conteo de votos del
+    detalle del caso): no se anuncia en la sala ni puede enviar mensajes, y
+    solo se acepta si el usuario puede ver el caso.
     """
     
     async def connect(self):
         self.grupo_id = self.scope['url_route']['kwargs'].get('grupo_id')
         self.caso_id = self.scope['url_route']['kwargs'].get('caso_id')
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.solo_escucha = query.get('modo') == ['conteo']
+        
+        if self.solo_escucha and not await self.puede_escuchar_caso():
+            await self.close()
+            return
         
         # Construir nombre de grupo de canales
         if self.caso_id:
@@ -43,6 +54,9 @@ class MDTChatConsumer(AsyncWebsocketConsumer):
         
         await self.accept()
         
+        if self.solo_escucha:
+            return
+        
         # Notificar conexión
         await self.channel_layer.group_send(
             self.channel_group,
@@ -63,6 +77,8 @@ class MDTChatConsumer(AsyncWebsocketConsumer):
     
     async def receive(self, text_data):
         """Recibe mensaje del WebSocket y lo distribuye al grupo"""
+        if self.solo_escucha:
+            return
         data = json.loads(text_data)
         message_type = data.get('type', 'chat_message')
         
@@ -108,6 +124,24 @@ class MDTChatConsumer(AsyncWebsocketConsumer):
                 }
             )
     
+    @database_sync_to_async
+    def puede_escuchar_caso(self):
+        """
+        Mismas reglas que `DoctorCaseDetailView`: médico asignado, miembro
+        activo del grupo médico del caso o del comité de su localidad.
+        """
+        from django.db.models import Q
+        from cases.models import Case
+        
+        user = self.scope.get('user')
+        if not self.caso_id or not user or not user.is_authenticated:
+            return False
+        return Case.objects.filter(case_id=self.caso_id).filter(
+            Q(doctor=user)
+            | Q(medical_group__miembros__medico__usuario=user, medical_group__miembros__activo=True)
+            | Q(localidad__comite__medicos_miembros__usuario=user)
+        ).exists()
+    
     @database_sync_to_async
     def guardar_mensaje(self, data):
         """Guarda el mensaje en la base de datos"""
@@ -202,6 +236,13 @@ class MDTChatConsumer(AsyncWebsocketConsumer):
             'message': event['message'],
             'timestamp': event['timestamp']
         }))
+    
+    async def vote_tally(self, event):
+        """Reenvía el conteo de votos del caso (ver cases.vote_tally)"""
+        await self.send(text_data=json.dumps({
+            'type': 'vote_tally',
+            'conteo': event['conteo']
+        }))
 
 
 class PresenceConsumer(AsyncWebsocketConsumer):
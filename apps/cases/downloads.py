@@ -0,0 +1,150 @@
+"""
+Respuesta de descarga de documentos con soporte de Range, ETag y X-Accel-Redirect.
+
+La autorización se hace en la vista; aquí solo se construye la respuesta.
+Con `DOCUMENT_DOWNLOAD_X_ACCEL = True` y storage en disco local, Django
+devuelve solo las cabeceras y nginx sirve el archivo desde una location
+`internal` (ver nginx/nginx.conf), incluyendo rangos y condicionales.
+"""
+
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header, parse_etags, quote_etag
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def document_etag(doc, suffix=''):
+    """
+    ETag fuerte: el SHA-256 del blob o, si no hay, tamaño y fecha de
+    modificación. `suffix` distingue derivados del mismo original.
+    """
+    if doc.blob_id:
+        return quote_etag(doc.blob.sha256 + suffix)
+    storage = doc.file.storage
+    try:
+        mtime = int(storage.get_modified_time(doc.file.name).timestamp())
+    except (NotImplementedError, OSError):
+        mtime = int(doc.uploaded_at.timestamp()) if doc.uploaded_at else 0
+    return quote_etag(f'{doc.file.size:x}-{mtime:x}{suffix}')
+
+
+def parse_range(header, size):
+    """
+    Interpreta una cabecera `Range` de un solo rango.
+
+    Devuelve `(inicio, fin)` inclusivos, None si la cabecera no aplica
+    (ausente, multi-rango o mal formada: se sirve el archivo completo) o
+    lanza ValueError si el rango no es satisfacible.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Sufijo: los últimos N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError('Rango vacío')
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Rango no satisfacible')
+    return start, end
+
+
+def _iter_range(f, start, length):
+    try:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def _use_x_accel(storage):
+    return getattr(settings, 'DOCUMENT_DOWNLOAD_X_ACCEL', False) and isinstance(storage, FileSystemStorage)
+
+
+def document_response(request, doc):
+    """Construye la respuesta de descarga de `doc` (ya autorizado)."""
+    return file_response(
+        request,
+        doc.file.storage,
+        doc.file.name,
+        etag=document_etag(doc),
+        content_type=doc.mime_type or 'application/octet-stream',
+        filename=doc.file_name or os.path.basename(doc.file.name),
+    )
+
+
+def file_response(request, storage, name, etag, content_type, filename=None, as_attachment=True):
+    """Respuesta con Range/ETag (o X-Accel-Redirect) para el archivo `name` del storage."""
+    base_headers = {
+        'ETag': etag,
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'private, no-cache',
+    }
+    disposition = content_disposition_header(as_attachment, filename or os.path.basename(name))
+
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+        response = HttpResponse(status=304)
+        for key, value in base_headers.items():
+            response[key] = value
+        return response
+
+    if _use_x_accel(storage):
+        # nginx resuelve Range/If-Range sobre el archivo real
+        prefix = getattr(settings, 'DOCUMENT_X_ACCEL_PREFIX', '/protected-media/')
+        response = HttpResponse(content_type=content_type)
+        # Los nombres antiguos conservan el original (espacios, acentos, ?, #):
+        # nginx decodifica la URI interna antes de buscar el archivo
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(name.lstrip('/'))
+        response['Content-Disposition'] = disposition
+        for key, value in base_headers.items():
+            response[key] = value
+        return response
+
+    size = storage.size(name)
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    f = storage.open(name, 'rb')
+    if byte_range is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+
+    length = end - start + 1 if size else 0
+    response = StreamingHttpResponse(_iter_range(f, start, length), status=status, content_type=content_type)
+    response['Content-Length'] = str(length)
+    response['Content-Disposition'] = disposition
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    for key, value in base_headers.items():
+        response[key] = value
+    return response
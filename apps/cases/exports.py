@@ -0,0 +1,138 @@
+"""
+Exportación en ZIP de los documentos de un caso o de un paciente.
+
+El ZIP se genera al vuelo sobre un sumidero no seekable: `zipfile` escribe
+cada entrada con data descriptor y los bytes se entregan a medida que se
+producen, de modo que la memoria usada no depende del tamaño de los
+documentos y no se hacen copias temporales en disco. Sirve tanto para un
+`StreamingHttpResponse` como para escribir a un fichero desde un comando.
+
+Cada entrada se llama `<case_id>__<doc_id>__<file_name>`; el informe final,
+si existe, va como `<case_id>__informe__<nombre>`. Al final se añade
+`manifest.json` con el SHA-256 y tamaño de cada entrada y los documentos que
+no se pudieron incluir.
+"""
+
+import hashlib
+import json
+import os
+import time
+import zipfile
+
+from django.utils import timezone
+
+MANIFEST_NAME = 'manifest.json'
+EXPORT_CHUNK_SIZE = 64 * 1024
+# Formatos ya comprimidos: se guardan sin deflate para no gastar CPU
+STORED_EXTENSIONS = {'.zip', '.gz', '.jpg', '.jpeg', '.png', '.mp4', '.docx', '.xlsx'}
+
+
+class _StreamSink:
+    """Sumidero de escritura no seekable que acumula hasta que se vacía."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _safe_name(name):
+    return os.path.basename(name or '').replace('/', '_').replace('\\', '_') or 'documento'
+
+
+def collect_entries(cases):
+    """
+    Devuelve la lista de entradas `(arcname, file_field, info)` de los
+    casos, con sus documentos y el informe final si tiene PDF.
+    """
+    from .models import CaseDocument, FinalReport
+
+    case_ids = [c.pk for c in cases]
+    entries = []
+    docs = (
+        CaseDocument.objects.filter(case_id__in=case_ids)
+        .select_related('case', 'blob')
+        .order_by('case_id', 'pk')
+    )
+    for doc in docs:
+        arcname = f'{doc.case.case_id}__{doc.pk}__{_safe_name(doc.file_name or doc.file.name)}'
+        entries.append((arcname, doc.file, {
+            'case_id': doc.case.case_id,
+            'document_id': doc.pk,
+            'document_type': doc.document_type,
+            'file_name': doc.file_name,
+        }))
+
+    for informe in FinalReport.objects.filter(case_id__in=case_ids).select_related('case'):
+        if not informe.pdf_file:
+            continue
+        arcname = f'{informe.case.case_id}__informe__{_safe_name(informe.pdf_file.name)}'
+        entries.append((arcname, informe.pdf_file, {
+            'case_id': informe.case.case_id,
+            'document_id': None,
+            'document_type': 'informe_final',
+            'file_name': os.path.basename(informe.pdf_file.name),
+        }))
+    return entries
+
+
+def iter_zip(entries):
+    """Genera los bytes del ZIP de `entries` (ver `collect_entries`)."""
+    sink = _StreamSink()
+    manifest = {'generated_at': timezone.now().isoformat(), 'files': [], 'missing': []}
+
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as zf:
+        for arcname, field, info in entries:
+            if not field or not field.name:
+                manifest['missing'].append({**info, 'error': 'sin archivo'})
+                continue
+            try:
+                f = field.storage.open(field.name, 'rb')
+                size = field.storage.size(field.name)
+            except (FileNotFoundError, OSError) as e:
+                manifest['missing'].append({**info, 'error': str(e)})
+                continue
+
+            zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+            ext = os.path.splitext(arcname)[1].lower()
+            zinfo.compress_type = zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+            # Con el tamaño conocido zipfile decide si necesita ZIP64
+            zinfo.file_size = size
+            digest = hashlib.sha256()
+            try:
+                with zf.open(zinfo, 'w') as dest:
+                    while True:
+                        chunk = f.read(EXPORT_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        dest.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            finally:
+                f.close()
+            manifest['files'].append({**info, 'name': arcname, 'size': size, 'sha256': digest.hexdigest()})
+            yield sink.drain()
+
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2), zipfile.ZIP_DEFLATED)
+    yield sink.drain()
+
+
+def export_filename(label):
+    return f'documentos_{_safe_name(label)}_{timezone.now():%Y%m%d}.zip'
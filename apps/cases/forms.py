@@ -74,6 +74,13 @@ class CaseDraftForm(forms.Form):
     )
     referring_institution = forms.CharField(max_length=255, label='Hospital que emitio el diagnostico', widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Nombre del hospital que emitio el diagnostico'}))
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Opciones desde el caché de datos de referencia (sin consulta al renderizar)
+        from core.reference_data import tipos_cancer_activos
+        field = self.fields['tipo_cancer']
+        field.choices = [('', field.empty_label)] + [(tc.pk, str(tc)) for tc in tipos_cancer_activos()]
+
     def clean_diagnosis_date(self):
         """Validacion adicional en clean para mayor seguridad"""
         diagnosis_date = self.cleaned_data.get('diagnosis_date')
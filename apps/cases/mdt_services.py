@@ -9,7 +9,7 @@ Contiene:
 - Generación de respuestas y PDFs
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Count, Q, F, Avg, Max
 from django.utils import timezone
 from datetime import timedelta
@@ -19,13 +19,15 @@ from django.template.loader import render_to_string
 
 from .models import Case, MedicalOpinion
 from .mdt_models import (
-    MDTMessage, UserPresence, AlgoritmoConfig, AsignacionAuditLog,
-    ConsensusWorkflow, ConsensusVersion, ConsensusVote, OpinionDisidente,
+    MDTMessage, UserPresence, AsignacionAuditLog,
+    ConsensusWorkflow, ConsensusVersion, OpinionDisidente,
     ClinicalTemplate
 )
 from medicos.models import Medico, MedicalGroup, DoctorGroupMembership
+from .voting import registrar_voto
 
 import io
+import tempfile
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
@@ -51,8 +53,9 @@ class AssignmentService:
     
     @staticmethod
     def get_config():
-        """Obtiene la configuración activa del algoritmo"""
-        return AlgoritmoConfig.objects.filter(activo=True).first()
+        """Obtiene la configuración activa del algoritmo (caché de datos de referencia)"""
+        from core.reference_data import algoritmo_config
+        return algoritmo_config()
     
     @staticmethod
     def calcular_score_carga(medico, config):
@@ -77,11 +80,11 @@ class AssignmentService:
         return min(1.0, dias_activo / 1825)
     
     @staticmethod
-    def calcular_score_compuesto(medico, config):
+    def calcular_scores(medico, config):
         """
-        Calcula score final ponderado.
+        Scores del médico como tupla `(score_carga, score_antiguedad, score_final)`.
         
-        Score menor = mejor candidato (menos casos, más antigüedad)
+        Score final menor = mejor candidato (menos casos, más antigüedad)
         """
         score_carga = AssignmentService.calcular_score_carga(medico, config)
         score_antiguedad = AssignmentService.calcular_score_antiguedad(medico)
@@ -95,6 +98,16 @@ class AssignmentService:
             # Ponderación configurada
             score_final = (ponderacion * score_carga) - ((1 - ponderacion) * score_antiguedad)
         
+        return score_carga, score_antiguedad, score_final
+    
+    @staticmethod
+    def calcular_score_compuesto(medico, config):
+        """
+        Calcula score final ponderado.
+        
+        Score menor = mejor candidato (menos casos, más antigüedad)
+        """
+        score_carga, score_antiguedad, score_final = AssignmentService.calcular_scores(medico, config)
         return {
             'score_carga': score_carga,
             'score_antiguedad': score_antiguedad,
@@ -139,6 +152,13 @@ class AssignmentService:
         """
         Asigna un caso al médico más apropiado.
         
+        Seguro con varios workers en paralelo: el caso se reclama con
+        `select_for_update(skip_locked=True)` (si otro proceso lo está
+        asignando se devuelve None) y la plaza del médico se reserva con un
+        UPDATE condicional sobre `casos_actuales`; si otro worker llenó al
+        elegido entretanto, se pasa al siguiente mejor candidato. Un caso que
+        ya tiene `medico_asignado` no se vuelve a asignar salvo por override.
+        
         Args:
             caso: Instancia de Case
             override_medico: Médico para asignación manual (opcional)
@@ -148,79 +168,112 @@ class AssignmentService:
         Returns:
             Medico asignado o None si no hay candidatos
         """
+        from .workload import asignar_carga, reservar_carga
+        
         config = AssignmentService.get_config()
+        grupo = caso.medical_group
         
         if override_medico:
-            # Override manual
+            # Override manual: espera al lock del caso y puede superar el límite
             medico = override_medico
-            decision = 'asignado'
-            motivo = f'Override manual por {override_por.email}'
-            
-            AsignacionAuditLog.objects.create(
-                caso=caso,
-                medico_seleccionado=medico,
-                decision=decision,
-                motivo=motivo,
-                config=config,
-                es_override=True,
-                override_justificacion=override_justificacion,
-                override_por=override_por
+            with transaction.atomic():
+                # medico_asignado leído bajo el lock, por si otro worker lo cambió
+                caso.medico_asignado_id = (
+                    Case.objects.select_for_update().filter(pk=caso.pk)
+                    .values_list('medico_asignado_id', flat=True).first()
+                )
+                AsignacionAuditLog.objects.create(
+                    caso=caso,
+                    medico_seleccionado=medico,
+                    decision='asignado',
+                    motivo=f'Override manual por {override_por.email}',
+                    config=config,
+                    es_override=True,
+                    override_justificacion=override_justificacion,
+                    override_por=override_por
+                )
+                asignar_carga(caso, medico)
+                AssignmentService._guardar_asignacion(caso, grupo, medico)
+            return medico
+        
+        # Algoritmo automático
+        if not grupo:
+            return None
+        
+        with transaction.atomic():
+            # Reclamar el caso; si otro worker lo tiene bloqueado, es suyo
+            reclamado = list(
+                Case.objects.select_for_update(skip_locked=True)
+                .filter(pk=caso.pk)
+                .values_list('medico_asignado_id', 'status')
             )
-        else:
-            # Algoritmo automático
-            grupo = caso.medical_group
-            if not grupo:
+            if not reclamado:
                 return None
-            
-            candidatos = AssignmentService.get_candidatos(grupo, config)
-            
-            if not candidatos:
+            asignado_id, status = reclamado[0]
+            if asignado_id:
+                # Ya asignado (p. ej. reintento de una tarea): idempotente
+                return Medico.objects.select_related('usuario').get(pk=asignado_id)
+            
+            # Scores de todo el grupo con una consulta (ver cases.scoring)
+            from .scoring import puntuar_grupo
+            scores = puntuar_grupo(grupo, config)
+            
+            # El mejor candidato al que se le puede reservar plaza
+            limite = config.limite_mensual_por_medico
+            mejor = next(
+                (i for i in AssignmentService._orden_candidatos(scores) if reservar_carga(scores.fila(i)[0], limite)),
+                None
+            )
+            if mejor is None:
                 return None
             
-            # Calcular scores y ordenar
-            candidatos_con_score = []
-            for medico in candidatos:
-                scores = AssignmentService.calcular_score_compuesto(medico, config)
-                candidatos_con_score.append({
-                    'medico': medico,
-                    **scores
-                })
-            
-            # Ordenar por score (menor = mejor)
-            candidatos_con_score.sort(key=lambda x: x['score_final'])
-            
-            # Seleccionar el mejor candidato
-            mejor = candidatos_con_score[0]
-            medico = mejor['medico']
-            decision = 'asignado'
-            motivo = f'Score más bajo: carga={mejor["score_carga"]:.2f}, antiguedad={mejor["score_antiguedad"]:.2f}'
+            medico_id, mejor_carga, mejor_antiguedad, mejor_final = scores.fila(mejor)
+            medico = Medico.objects.select_related('usuario').get(pk=medico_id)
             
-            # Registrar por qué se saltaron los otros
-            for candidato in candidatos_con_score[1:]:
-                AsignacionAuditLog.objects.create(
+            # Por qué se saltaron los otros y la asignación: un solo INSERT
+            registros = []
+            for i in range(len(scores)):
+                if i == mejor:
+                    continue
+                otro_id, carga, antiguedad, final = scores.fila(i)
+                registros.append(AsignacionAuditLog(
                     caso=caso,
-                    medico_seleccionado=candidato['medico'],
+                    medico_seleccionado_id=otro_id,
                     decision='saltado',
-                    motivo=f'Score mayor: {candidato["score_final"]:.2f}',
-                    score_carga=candidato['score_carga'],
-                    score_antiguedad=candidato['score_antiguedad'],
-                    score_final=candidato['score_final'],
+                    motivo=f'Score mayor: {final:.2f}',
+                    score_carga=carga,
+                    score_antiguedad=antiguedad,
+                    score_final=final,
                     config=config
-                )
-            
-            # Registrar asignación
-            AsignacionAuditLog.objects.create(
+                ))
+            registros.append(AsignacionAuditLog(
                 caso=caso,
                 medico_seleccionado=medico,
-                decision=decision,
-                motivo=motivo,
-                score_carga=mejor['score_carga'],
-                score_antiguedad=mejor['score_antiguedad'],
-                score_final=mejor['score_final'],
+                decision='asignado',
+                motivo=f'Score más bajo: carga={mejor_carga:.2f}, antiguedad={mejor_antiguedad:.2f}',
+                score_carga=mejor_carga,
+                score_antiguedad=mejor_antiguedad,
+                score_final=mejor_final,
                 config=config
-            )
+            ))
+            AsignacionAuditLog.objects.bulk_create(registros)
+            
+            caso.medico_asignado = medico
+            AssignmentService._guardar_asignacion(caso, grupo, medico)
         
-        # Asignar al caso: el responsable es siempre el líder del grupo
+        return medico
+    
+    @staticmethod
+    def _orden_candidatos(scores):
+        """Índices de mejor a peor; el orden completo solo si el primero ya no tiene plaza."""
+        if not len(scores):
+            return
+        yield from scores.top_k(1)
+        yield from scores.top_k(len(scores))[1:]
+    
+    @staticmethod
+    def _guardar_asignacion(caso, grupo, medico):
+        """Responsable, médico y estado del caso; el responsable es siempre el líder del grupo."""
         lider = grupo.get_lider() if grupo else None
         responsable = lider or medico
         caso.responsable = responsable
@@ -234,9 +287,8 @@ class AssignmentService:
         except Exception:
             pass
         
-        caso.save()
-        
-        return medico
+        # Solo los campos de la asignación: el resto de la instancia puede ser anterior al lock
+        caso.save(update_fields=['responsable', 'doctor', 'medico_asignado', 'assigned_at', 'status', 'updated_at'])
 
 
 # =====================================================
@@ -311,30 +363,8 @@ class ConsensusService:
         """
         Emite un voto en la fase de votación.
         """
-        # Crear o actualizar voto
-        voto, created = ConsensusVote.objects.update_or_create(
-            workflow=workflow,
-            medico=medico,
-            defaults={
-                'voto': tipo_voto,
-                'justificacion': justificacion
-            }
-        )
-        
-        # Recalcular conteos
-        workflow.votos_a_favor = workflow.votos.filter(
-            voto__in=['aprueba', 'aprueba_mod']
-        ).count()
-        workflow.votos_en_contra = workflow.votos.filter(
-            voto__in=['contraindicado', 'alternativa']
-        ).count()
-        workflow.abstenciones = workflow.votos.filter(
-            voto='abstiene'
-        ).count()
-        
-        workflow.save()
-        
-        return voto
+        # Cambia los contadores con un UPDATE atómico (ver cases.voting)
+        return registrar_voto(workflow, medico, tipo_voto, justificacion)
     
     @staticmethod
     def cerrar_votacion(workflow, es_consenso=True, opiniones_disidentes=None):
@@ -545,13 +575,14 @@ class AnonymizationService:
     """
     
     import re
+    from .anonymization import PATRONES_PII as _PATRONES
     
     # Patrones para detección de PII
     PATRONES_PII = {
-        'email': re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'),
-        'telefono': re.compile(r'(\+?\d{1,3}[-.\s]?)?\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}'),
+        'email': re.compile(_PATRONES['email']),
+        'telefono': re.compile(_PATRONES['telefono']),
         'fecha': re.compile(r'\d{1,2}[/-]\d{1,2}[/-]\d{2,4}'),
-        'cedula': re.compile(r'\d{6,12}'),
+        'cedula': re.compile(_PATRONES['cedula']),
     }
     
     @staticmethod
@@ -559,66 +590,64 @@ class AnonymizationService:
         """
         Reemplaza PII en texto.
         
+        Email, teléfonos, números de identificación y las palabras del
+        nombre del paciente se sustituyen en una sola pasada con una regex
+        combinada (ver cases.anonymization).
+        
         Args:
             texto: Texto a anonimizar
-            paciente_nombre: Nombre del paciente para reemplazar
+            paciente_nombre: Nombre del paciente (o lista de nombres) para reemplazar
             
         Returns:
             Texto anonimizado
         """
-        if not texto:
-            return texto
-        
-        resultado = texto
-        
-        # Reemplazar email
-        resultado = AnonymizationService.PATRONES_PII['email'].sub(
-            '[EMAIL_REMOVIDO]',
-            resultado
-        )
-        
-        # Reemplazar teléfonos
-        resultado = AnonymizationService.PATRONES_PII['telefono'].sub(
-            '[TELÉFONO_REMOVIDO]',
-            resultado
-        )
-        
-        # Reemplazar números de identificación
-        resultado = AnonymizationService.PATRONES_PII['cedula'].sub(
-            '[ID_REMOVIDO]',
-            resultado
-        )
+        from .anonymization import anonimizar
+        return anonimizar(texto, paciente_nombre)
+    
+    @staticmethod
+    def anonimizar_lote(textos, paciente_nombre=None):
+        """
+        Anonimiza una lista de textos con el mismo diccionario de nombres.
         
-        # Reemplazar nombre del paciente si se proporciona
-        if paciente_nombre:
-            # Reemplazar todas las ocurrencias del nombre
-            for nombre in paciente_nombre.split():
-                if len(nombre) > 3:  # Solo palabras significativas
-                    resultado = resultado.replace(nombre, '[NOMBRE_REMOVIDO]')
+        El patrón se compila una vez para todo el lote.
         
-        return resultado
+        Returns:
+            Lista de textos anonimizados, en el mismo orden
+        """
+        from .anonymization import anonimizar_lote
+        return anonimizar_lote(textos, paciente_nombre)
     
     @staticmethod
     def generar_version_anonima(documento, paciente_nombre=None):
         """
-        Genera una versión anonimizada de un documento.
+        Encola la generación de la versión anonimizada de un documento.
+        
+        Los PDF se procesan en segundo plano (documents.tasks.anonymize_pdf_document):
+        el texto de cada página pasa por el redactor de PII y el avance queda
+        en `documento.anonymization_progress`. Los DICOM subidos al almacén de
+        objetos se anonimizan con `anonymize_document`. El resto (imágenes
+        y otros archivos locales) no tiene tarea y se marca en el momento.
         
         Args:
             documento: Instancia de CaseDocument
-            paciente_nombre: Nombre del paciente
+            paciente_nombre: No se usa; el nombre se toma del paciente del caso
             
         Returns:
-            Contenido anonimizado o ruta del archivo generado
+            El documento (se marca como anonimizado cuando termina la tarea)
         """
-        # TODO: Implementar procesamiento real de PDF/imágenes
-        # Por ahora, retorna indicador de que necesita procesamiento
-        
         if documento.is_anonymized:
             return documento  # Ya anonimizado
         
-        # Marcar como anonimizado
-        documento.is_anonymized = True
-        documento.save()
+        from documents.pdf_redaction import is_pdf
+        from documents.tasks import anonymize_document, anonymize_pdf_document
+        
+        if is_pdf(documento):
+            anonymize_pdf_document.delay(documento.pk)
+        elif documento.s3_file_path:
+            anonymize_document.delay(documento.s3_file_path, documento.pk)
+        else:
+            documento.is_anonymized = True
+            documento.save(update_fields=['is_anonymized'])
         
         return documento
 
@@ -687,6 +716,25 @@ class MDTResponseService:
     Genera PDF y envía correo al paciente.
     """
     
+    # Incrementar al cambiar el diseño de `_generar_pdf`: invalida los
+    # digests guardados en FinalReport.firma_electronica
+    PDF_TEMPLATE_VERSION = 'respuesta-1'
+    
+    @staticmethod
+    def _payload_respuesta(caso, paciente, responsable, conformidad, explicacion, votos):
+        """Entradas que determinan el contenido del PDF de respuesta."""
+        return {
+            'case_id': caso.case_id,
+            'fecha_solicitud': caso.created_at.strftime('%d/%m/%Y') if caso.created_at else '',
+            'tipo_cancer': str(caso.tipo_cancer) if caso.tipo_cancer else 'No especificado',
+            'diagnostico': caso.primary_diagnosis or 'No especificado',
+            'paciente': paciente.get_full_name() or paciente.email,
+            'responsable': [responsable.nombre_completo, responsable.registro_medico],
+            'conformidad': conformidad,
+            'explicacion': explicacion,
+            'votos': votos,
+        }
+    
     @staticmethod
     def generar_y_enviar_respuesta(caso, responsable, conformidad, explicacion=''):
         """
@@ -709,59 +757,75 @@ class MDTResponseService:
             # Obtener votos de los miembros
             votos = []
             if workflow:
-                for voto in workflow.votos.all():
+                for voto in workflow.votos.select_related('medico'):
                     votos.append({
                         'medico': voto.medico.nombre_completo,
                         'voto': voto.get_voto_display(),
                         'justificacion': voto.justificacion
                     })
             
-            # Generar PDF
-            pdf_buffer = MDTResponseService._generar_pdf(
-                caso=caso,
-                paciente=paciente,
-                responsable=responsable,
-                conformidad=conformidad,
-                explicacion=explicacion,
-                votos=votos
-            )
-            
-            # Guardar PDF - Primero crear el registro de FinalReport si no existe
-            from django.core.files.base import ContentFile
-            pdf_filename = f'respuesta_{caso.case_id}.pdf'
-            
-            # Crear o obtener el informe final
+            # Digest de las entradas: si el PDF almacenado ya corresponde a
+            # ellas no se vuelve a renderizar ni a escribir en el storage
+            from django.core.files import File
             from cases.models import FinalReport
-            informe_final, created = FinalReport.objects.get_or_create(
-                case=caso,
-                defaults={
-                    'conclusion': conformidad,
-                    'justificacion': explicacion,
-                    'recomendaciones': 'Generado automáticamente',
-                    'redactado_por': responsable
-                }
+            from cases.reports import compute_input_digest, stored_pdf_matches
+            digest = compute_input_digest(
+                MDTResponseService._payload_respuesta(caso, paciente, responsable, conformidad, explicacion, votos),
+                template_version=MDTResponseService.PDF_TEMPLATE_VERSION,
             )
-            # Actualizar campos
-            informe_final.conclusion = conformidad
-            informe_final.justificacion = explicacion
-            informe_final.recomendaciones = 'Generado automáticamente'
-            informe_final.redactado_por = responsable
-            informe_final.save()
-            
-            # Guardar el PDF en el campo pdf_file
-            informe_final.pdf_file.save(pdf_filename, ContentFile(pdf_buffer.getvalue()))
-            informe_final.save()
+            informe_final = FinalReport.objects.filter(case=caso).first()
+            reutilizar = stored_pdf_matches(informe_final, digest)
             
-            # Limpiar archivos del caso después de generar el PDF final
-            MDTResponseService._limpiar_archivos_caso(caso)
-            
-            # Enviar correo
-            email_enviado = MDTResponseService._enviar_correo(
-                caso=caso,
-                paciente=paciente,
-                pdf_buffer=pdf_buffer,
-                conformidad=conformidad
-            )
+            if reutilizar:
+                pdf_file = informe_final.pdf_file.open('rb')
+            else:
+                # Generar PDF en un archivo temporal: en memoria si es pequeño,
+                # volcado a disco si crece (informes con muchos votos)
+                spool_max = getattr(settings, 'REPORT_PDF_SPOOL_MAX_SIZE', 5 * 1024 * 1024)
+                pdf_file = tempfile.SpooledTemporaryFile(max_size=spool_max)
+            try:
+                if not reutilizar:
+                    MDTResponseService._generar_pdf(
+                        caso=caso,
+                        paciente=paciente,
+                        responsable=responsable,
+                        conformidad=conformidad,
+                        explicacion=explicacion,
+                        votos=votos,
+                        output=pdf_file
+                    )
+                    
+                    # Volcar el PDF al storage por bloques, sin copiarlo entero a memoria
+                    pdf_field = FinalReport._meta.get_field('pdf_file')
+                    pdf_name = pdf_field.generate_filename(None, f'respuesta_{caso.case_id}.pdf')
+                    pdf_name = pdf_field.storage.save(pdf_name, File(pdf_file, name=pdf_name))
+                    
+                    # Crear o actualizar el informe final con una sola escritura
+                    # (update_or_create bloquea la fila mientras actualiza)
+                    informe_final, created = FinalReport.objects.update_or_create(
+                        case=caso,
+                        defaults={
+                            'conclusion': conformidad,
+                            'justificacion': explicacion,
+                            'recomendaciones': 'Generado automáticamente',
+                            'redactado_por': responsable,
+                            'pdf_file': pdf_name,
+                            'firma_electronica': digest,
+                        }
+                    )
+                
+                # Limpiar archivos del caso después de generar el PDF final
+                MDTResponseService._limpiar_archivos_caso(caso)
+                
+                # Enviar correo reutilizando el mismo archivo
+                email_enviado = MDTResponseService._enviar_correo(
+                    caso=caso,
+                    paciente=paciente,
+                    pdf_file=pdf_file,
+                    conformidad=conformidad
+                )
+            finally:
+                pdf_file.close()
             
             return {
                 'success': True,
@@ -778,9 +842,14 @@ class MDTResponseService:
             }
     
     @staticmethod
-    def _generar_pdf(caso, paciente, responsable, conformidad, explicacion, votos):
-        """Genera el PDF de respuesta"""
-        buffer = io.BytesIO()
+    def _generar_pdf(caso, paciente, responsable, conformidad, explicacion, votos, output=None):
+        """
+        Genera el PDF de respuesta en `output` (file-like binario).
+        
+        Si no se indica `output` se usa un BytesIO. Devuelve el objeto de
+        salida posicionado al inicio.
+        """
+        buffer = output if output is not None else io.BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
         
         styles = getSampleStyleSheet()
@@ -873,7 +942,7 @@ class MDTResponseService:
         return buffer
     
     @staticmethod
-    def _enviar_correo(caso, paciente, pdf_buffer, conformidad):
+    def _enviar_correo(caso, paciente, pdf_file, conformidad):
         """Envía el correo con el PDF adjunto"""
         try:
             subject = f"Segunda Opinión Médica - Caso {caso.case_id}"
@@ -912,7 +981,8 @@ Equipo Multidisciplinario del Instituto de Oncología y Radiobiología
                 settings.DEFAULT_FROM_EMAIL,
                 [paciente.email]
             )
-            email.attach('informe_segunda_opinion.pdf', pdf_buffer.getvalue(), 'application/pdf')
+            pdf_file.seek(0)
+            email.attach('informe_segunda_opinion.pdf', pdf_file.read(), 'application/pdf')
             email.send(fail_silently=False)
             
             return True
@@ -927,43 +997,18 @@ Equipo Multidisciplinario del Instituto de Oncología y Radiobiología
         Limpia los archivos del caso después de generar el PDF final.
         Elimina todos los documentos del caso excepto el informe final.
         
+        El borrado se hace en segundo plano y en bloque (ver
+        `documents.services.delete_case_files`), tras el commit.
+        
         Args:
             caso: Instancia del modelo Case
         """
         try:
-            from cases.models import CaseDocument
-            from django.conf import settings
-            import os
-            
-            # Obtener todos los documentos del caso
-            documentos = CaseDocument.objects.filter(case=caso)
-            
-            # Eliminar archivos físicos y registros
-            for doc in documentos:
-                try:
-                    # Eliminar archivo físico si existe
-                    if doc.file and doc.file.path:
-                        if os.path.exists(doc.file.path):
-                            os.remove(doc.file.path)
-                except Exception as e:
-                    print(f"Error deleting file {doc.file}: {e}")
-                
-                # Eliminar el registro de la base de datos
-                try:
-                    doc.delete()
-                except Exception as e:
-                    print(f"Error deleting document record: {e}")
-            
-            # También limpiar la carpeta media del caso si existe
-            case_folder = os.path.join(settings.MEDIA_ROOT, 'cases', caso.case_id)
-            if os.path.exists(case_folder):
-                try:
-                    import shutil
-                    shutil.rmtree(case_folder)
-                except Exception as e:
-                    print(f"Error deleting case folder: {e}")
+            from django.db import transaction
+            from documents.services import schedule_delete_case_files
             
-            print(f"Archivos del caso {caso.case_id} eliminados correctamente")
+            case_id = caso.case_id
+            transaction.on_commit(lambda: schedule_delete_case_files(case_id, enforce_state=False))
             
         except Exception as e:
             print(f"Error cleaning case files: {e}")
@@ -0,0 +1,41 @@
+# Generated by Django 5.0 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cases", "0015_storedblob_casedocument_blob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="casedocument",
+            name="page_count",
+            field=models.PositiveIntegerField(
+                blank=True, help_text="Número de páginas (PDF)", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="casedocument",
+            name="image_width",
+            field=models.PositiveIntegerField(
+                blank=True, help_text="Ancho en píxeles (imágenes y DICOM)", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="casedocument",
+            name="image_height",
+            field=models.PositiveIntegerField(
+                blank=True, help_text="Alto en píxeles (imágenes y DICOM)", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="casedocument",
+            name="dicom_modality",
+            field=models.CharField(
+                blank=True, help_text="Modalidad DICOM (CT, MR, ...)", max_length=16
+            ),
+        ),
+    ]
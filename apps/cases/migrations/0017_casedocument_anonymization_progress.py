@@ -0,0 +1,20 @@
+# Generated by Django 5.0 on 2026-10-19 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cases", "0016_casedocument_ingest_metadata"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="casedocument",
+            name="anonymization_progress",
+            field=models.PositiveSmallIntegerField(
+                default=0, help_text="Progreso (0-100) de la anonimización del texto del PDF"
+            ),
+        ),
+    ]
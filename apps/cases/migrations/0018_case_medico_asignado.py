@@ -0,0 +1,54 @@
+# Generated by Django 5.0 on 2026-10-19 15:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_medico_asignado(apps, schema_editor):
+    """Médico de la última asignación registrada y recálculo de casos_actuales."""
+    Case = apps.get_model('cases', 'Case')
+    AsignacionAuditLog = apps.get_model('cases', 'AsignacionAuditLog')
+    Medico = apps.get_model('medicos', 'Medico')
+
+    ultima = (
+        AsignacionAuditLog.objects.filter(caso=OuterRef('pk'), decision='asignado', medico_seleccionado__isnull=False)
+        .order_by('-creado_en', '-pk')
+        .values('medico_seleccionado')[:1]
+    )
+    Case.objects.filter(medico_asignado__isnull=True).update(medico_asignado=Subquery(ultima))
+
+    abiertos = (
+        Case.objects.filter(medico_asignado=OuterRef('pk'))
+        .exclude(status__in=('CLOSED', 'CANCELLED'))
+        .order_by()
+        .values('medico_asignado')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Medico.objects.update(casos_actuales=Coalesce(Subquery(abiertos), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("medicos", "0010_change_tipo_cancer_to_fk"),
+        ("cases", "0017_casedocument_anonymization_progress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="case",
+            name="medico_asignado",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Médico elegido por el algoritmo de asignación; el caso cuenta en su carga mientras esté abierto",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="casos_asignados",
+                to="medicos.medico",
+            ),
+        ),
+        migrations.RunPython(backfill_medico_asignado, migrations.RunPython.noop),
+    ]
@@ -21,6 +21,10 @@ except Exception:
     EncryptedTextField = models.TextField
 
 
+# Estados en los que un caso ya no cuenta en la carga de su médico
+CASE_STATUSES_WITHOUT_WORKLOAD = ('CLOSED', 'CANCELLED')
+
+
 class Case(models.Model):
     """
     Modelo de Caso de Segunda Opinión.
@@ -78,6 +82,16 @@ class Case(models.Model):
         related_name='cases_responsable',
         help_text="Líder del grupo MDT: redacta y envía la respuesta final al paciente"
     )
+
+    # Médico que computa el caso en su carga (Medico.casos_actuales)
+    medico_asignado = models.ForeignKey(
+        'medicos.Medico',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='casos_asignados',
+        help_text="Médico elegido por el algoritmo de asignación; el caso cuenta en su carga mientras esté abierto"
+    )
     
     # Datos del caso
     case_id = models.CharField(
@@ -161,6 +175,28 @@ class Case(models.Model):
         db_table = 'cases_case'
         ordering = ['-created_at']
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores guardados: save() detecta el cierre o la cancelación y la
+        # señal post_save el cambio de localidad
+        instance._status_guardado = instance.__dict__.get('status')
+        instance._localidad_guardada = instance.__dict__.get('localidad_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        anterior = getattr(self, '_status_guardado', None)
+        if (
+            self.medico_asignado_id
+            and anterior and anterior not in CASE_STATUSES_WITHOUT_WORKLOAD
+            and self.status in CASE_STATUSES_WITHOUT_WORKLOAD
+        ):
+            from .workload import liberar_carga
+            liberar_carga(self.medico_asignado_id)
+        self._status_guardado = self.status
+        self._localidad_guardada = self.localidad_id
+
     def __str__(self):
         return f"Caso {self.case_id} - {self.primary_diagnosis}"
     
@@ -348,6 +384,41 @@ def case_document_upload_path(instance, filename):
     return f'cases/{case_id}/documents/{folder}/{filename}'
 
 
+def stored_blob_upload_path(instance, filename):
+    """
+    Ruta direccionada por contenido: `blobs/<aa>/<bb>/<sha256>`.
+
+    Vive fuera de `cases/<case_id>/` porque un mismo blob puede estar
+    referenciado por documentos de varios casos.
+    """
+    digest = instance.sha256
+    return f'blobs/{digest[:2]}/{digest[2:4]}/{digest}'
+
+
+class StoredBlob(models.Model):
+    """
+    Archivo físico único identificado por su SHA-256.
+
+    Varios CaseDocument con el mismo contenido comparten un StoredBlob;
+    `ref_count` cuenta esas referencias y el archivo solo se borra del
+    storage cuando llega a cero (ver `cases.blobs.BlobStorageService`).
+    """
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to=stored_blob_upload_path, max_length=255)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Blob Almacenado'
+        verbose_name_plural = 'Blobs Almacenados'
+        db_table = 'cases_storedblob'
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+
+
 class CaseDocument(models.Model):
     """
     Modelo para almacenar documentos médicos asociados a un caso.
@@ -380,6 +451,15 @@ class CaseDocument(models.Model):
         help_text="Archivo del documento"
     )
     
+    # Contenido deduplicado: `file` apunta al archivo del blob
+    blob = models.ForeignKey(
+        StoredBlob,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='documents'
+    )
+    
     # Nuevos campos
     description = models.CharField(
         max_length=255,
@@ -397,6 +477,10 @@ class CaseDocument(models.Model):
         default=False,
         help_text="Indica si el archivo fue anonimizado"
     )
+    anonymization_progress = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Progreso (0-100) de la anonimización del texto del PDF"
+    )
     
     # Tamaño y tipo MIME
     file_size = models.PositiveIntegerField(
@@ -410,6 +494,28 @@ class CaseDocument(models.Model):
         help_text="Tipo MIME del archivo"
     )
     
+    # Metadatos extraídos al ingerir (ver documents.metadata)
+    page_count = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Número de páginas (PDF)"
+    )
+    image_width = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Ancho en píxeles (imágenes y DICOM)"
+    )
+    image_height = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Alto en píxeles (imágenes y DICOM)"
+    )
+    dicom_modality = models.CharField(
+        max_length=16,
+        blank=True,
+        help_text="Modalidad DICOM (CT, MR, ...)"
+    )
+    
     file_name = models.CharField(
         max_length=255,
         help_text="Nombre original del archivo"
@@ -430,6 +536,22 @@ class CaseDocument(models.Model):
     def __str__(self):
         return f"{self.file_name} - Caso {self.case.case_id}"
 
+    def save(self, *args, **kwargs):
+        # Un archivo recién subido se guarda como blob deduplicado en lugar
+        # de copiarse bajo cases/<case_id>/documents/
+        if self.file and not self.file._committed and self.blob_id is None:
+            from .blobs import BlobStorageService
+            from documents.metadata import MetadataExtractor, apply_metadata
+            from django.db import transaction
+            # Los metadatos salen de la misma lectura que calcula el SHA-256
+            extractor = MetadataExtractor(self.file_name or self.file.name)
+            with transaction.atomic():
+                self.blob = BlobStorageService.acquire(self.file.file, extractor=extractor)
+                self.file = self.blob.file.name
+                apply_metadata(self, extractor.result())
+                return super().save(*args, **kwargs)
+        return super().save(*args, **kwargs)
+
     @property
     def has_stored_file(self):
         return bool(self.file and self.file.name)
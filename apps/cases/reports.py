@@ -0,0 +1,198 @@
+"""
+Generación del informe final (PDF) de un caso a partir de las opiniones del comité.
+
+Separa la lectura de datos (`build_report_payload`) del renderizado
+(`render_report_pdf`): el payload es un dict de tipos simples, de modo que el
+renderizado puede ejecutarse en procesos worker sin acceso a la base de datos.
+"""
+
+import hashlib
+import io
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Importar reportlab solo si está disponible
+try:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+
+# Incrementar al cambiar el diseño del PDF: invalida los digests almacenados
+# y fuerza el re-renderizado de los informes existentes.
+REPORT_TEMPLATE_VERSION = '1'
+
+RECOMENDACIONES_POR_DEFECTO = (
+    "Se recomienda continuar con el seguimiento regular y consultar con el oncólogo "
+    "tratante para definir el plan de tratamiento más adecuado según el caso específico."
+)
+
+
+def report_filename(case_id):
+    """Nombre del archivo PDF del informe final de un caso."""
+    return f'respuesta_{case_id}.pdf'
+
+
+def determinar_conformidad(votos_acuerdo, votos_desacuerdo):
+    """
+    Determina la conclusión del comité a partir del recuento de votos.
+
+    Returns:
+        tuple: (conformidad, explicacion)
+    """
+    if votos_acuerdo > votos_desacuerdo:
+        return 'acuerdo', 'La mayoría de los especialistas están de acuerdo con el tratamiento propuesto.'
+    if votos_desacuerdo > votos_acuerdo:
+        return 'desacuerdo', 'La mayoría de los especialistas no están de acuerdo con el tratamiento propuesto.'
+    return 'consenso_parcial', 'No hay consenso claro entre los especialistas.'
+
+
+def compute_input_digest(payload, template_version=REPORT_TEMPLATE_VERSION):
+    """
+    SHA-256 canónico (hex, 64 caracteres) de las entradas de un informe.
+
+    El payload se serializa como JSON con claves ordenadas, de modo que las
+    mismas entradas producen siempre el mismo digest. Se guarda en
+    `FinalReport.firma_electronica`.
+    """
+    canonical = json.dumps(
+        {'template_version': template_version, 'payload': payload},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(',', ':'),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def stored_pdf_matches(informe, digest):
+    """Indica si el informe ya tiene un PDF almacenado para ese digest."""
+    if informe is None or not informe.pdf_file or informe.firma_electronica != digest:
+        return False
+    try:
+        return informe.pdf_file.storage.exists(informe.pdf_file.name)
+    except Exception:
+        return False
+
+
+def build_report_payload(caso, opiniones):
+    """
+    Construye el payload serializable del informe final.
+
+    Args:
+        caso: Instancia de Case (idealmente con tipo_cancer ya cargado)
+        opiniones: Iterable de MedicalOpinion con `doctor` ya cargado
+
+    Returns:
+        dict con tipos simples (str/int/list) apto para pickle/JSON
+    """
+    opiniones = list(opiniones)
+    votos_acuerdo = sum(1 for o in opiniones if o.voto == 'acuerdo')
+    votos_desacuerdo = sum(1 for o in opiniones if o.voto == 'desacuerdo')
+    votos_abstencion = sum(1 for o in opiniones if o.voto == 'abstencion')
+    conformidad, explicacion = determinar_conformidad(votos_acuerdo, votos_desacuerdo)
+
+    return {
+        'case_id': caso.case_id,
+        'fecha_solicitud': caso.created_at.strftime('%d/%m/%Y') if caso.created_at else '',
+        'tipo_cancer': str(caso.tipo_cancer) if caso.tipo_cancer else 'No especificado',
+        'diagnostico': caso.primary_diagnosis or 'No especificado',
+        'votos_acuerdo': votos_acuerdo,
+        'votos_desacuerdo': votos_desacuerdo,
+        'votos_abstencion': votos_abstencion,
+        'opiniones': [
+            {
+                'medico': o.doctor.nombre_completo,
+                'voto': o.get_voto_display(),
+                'comentario': o.comentario_privado or '',
+            }
+            for o in opiniones
+        ],
+        'conclusion': conformidad,
+        'explicacion': explicacion,
+        'recomendaciones': RECOMENDACIONES_POR_DEFECTO,
+    }
+
+
+def render_report_pdf(payload, output=None):
+    """
+    Renderiza el informe final en `output` (file-like binario).
+
+    Si no se indica `output` se usa un BytesIO. Devuelve el objeto de salida
+    posicionado al inicio.
+    """
+    if not REPORTLAB_AVAILABLE:
+        raise RuntimeError("reportlab no está instalado. Instala pip install reportlab")
+
+    if output is None:
+        output = io.BytesIO()
+
+    doc = SimpleDocTemplate(output, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    styles = getSampleStyleSheet()
+    story = []
+
+    # Título
+    story.append(Paragraph("SEGUNDA OPINIÓN MÉDICA", styles['Title']))
+    story.append(Spacer(1, 0.2*inch))
+
+    # Información del caso
+    story.append(Paragraph("INFORMACIÓN DEL CASO", styles['Heading2']))
+    info_data = [
+        ["ID del Caso:", payload['case_id']],
+        ["Fecha de Solicitud:", payload['fecha_solicitud']],
+        ["Tipo de Cáncer:", payload['tipo_cancer']],
+        ["Diagnóstico:", payload['diagnostico']],
+    ]
+    t = Table(info_data, colWidths=[2*inch, 4*inch])
+    t.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ]))
+    story.append(t)
+    story.append(Spacer(1, 0.3*inch))
+
+    # Votación
+    story.append(Paragraph("RESULTADO DE LA VOTACIÓN", styles['Heading2']))
+    story.append(Paragraph(f"Votos a favor: {payload['votos_acuerdo']}", styles['Normal']))
+    story.append(Paragraph(f"Votos en contra: {payload['votos_desacuerdo']}", styles['Normal']))
+    story.append(Paragraph(f"Abstenciones: {payload['votos_abstencion']}", styles['Normal']))
+    story.append(Spacer(1, 0.2*inch))
+
+    # Opiniones de los especialistas
+    story.append(Paragraph("OPINIONES DE LOS ESPECIALISTAS", styles['Heading2']))
+    for opinion in payload['opiniones']:
+        story.append(Paragraph(f"<b>Dr. {opinion['medico']}</b>: {opinion['voto']}", styles['Normal']))
+        if opinion['comentario']:
+            story.append(Paragraph(f"  Comentario: {opinion['comentario']}", styles['Normal']))
+        story.append(Spacer(1, 0.1*inch))
+    story.append(Spacer(1, 0.3*inch))
+
+    # Conclusión
+    story.append(Paragraph("CONCLUSIÓN", styles['Heading2']))
+    story.append(Paragraph(payload['explicacion'], styles['Normal']))
+    story.append(Spacer(1, 0.3*inch))
+
+    # Recomendaciones
+    story.append(Paragraph("RECOMENDACIONES", styles['Heading2']))
+    story.append(Paragraph(payload['recomendaciones'], styles['Normal']))
+
+    doc.build(story)
+    output.seek(0)
+    return output
+
+
+def render_report_pdf_bytes(payload):
+    """
+    Renderiza el informe y devuelve `(case_id, bytes)`.
+
+    Punto de entrada para `ProcessPoolExecutor`: solo recibe y devuelve
+    tipos simples, sin tocar la base de datos.
+    """
+    return payload['case_id'], render_report_pdf(payload).getvalue()
@@ -0,0 +1,104 @@
+"""
+Tabla de enrutamiento de casos a grupos médicos.
+
+Precalcula, con tres consultas, todo lo que necesita la asignación
+automática para decidir grupo y responsable:
+
+- `tipo_cancer_id -> grupo_id` de los tipos cuyo grupo está activo;
+- los grupos activos ordenados por nombre, con el nombre normalizado para
+  el fallback por `specialty_required` (antes un `icontains` sin índice por
+  cada caso); cada clave de especialidad se resuelve una vez y se memoriza;
+- `grupo_id -> líder` (mismo criterio que `MedicalGroup.get_lider`) y los
+  usuarios de los miembros activos, receptores de las notificaciones.
+
+La tabla vive en el caché de datos de referencia (`core.reference_data`) y
+se reconstruye al guardar o borrar un `TipoCancer`, `MedicalGroup`,
+`DoctorGroupMembership` o `Medico`, así que enrutar un caso no hace
+consultas.
+"""
+
+from collections import defaultdict, namedtuple
+
+from core.reference_data import reference_cache
+
+Ruta = namedtuple('Ruta', 'grupo_id grupo_nombre responsable_id responsable_usuario_id responsable_nombre')
+
+
+def normalizar_especialidad(texto):
+    return ' '.join((texto or '').split()).casefold()
+
+
+class RoutingTable:
+    def __init__(self, grupos, por_tipo_cancer, lideres, receptores):
+        self.grupos = grupos  # [(grupo_id, nombre, nombre_normalizado)] por nombre
+        self.nombres = {grupo_id: nombre for grupo_id, nombre, _ in grupos}
+        self.por_tipo_cancer = por_tipo_cancer
+        self.lideres = lideres  # grupo_id -> (medico_id, usuario_id, nombre)
+        self.receptores = receptores  # grupo_id -> [usuario_id]
+        self._por_especialidad = {}
+
+    @classmethod
+    def build(cls):
+        from medicos.models import DoctorGroupMembership, MedicalGroup, TipoCancer
+
+        grupos, por_defecto = [], {}
+        for grupo_id, nombre, medico_id, usuario_id, nombres, apellidos in (
+            MedicalGroup.objects.filter(activo=True).order_by('nombre', 'pk').values_list(
+                'pk', 'nombre', 'responsable_por_defecto_id', 'responsable_por_defecto__usuario_id',
+                'responsable_por_defecto__nombres', 'responsable_por_defecto__apellidos',
+            )
+        ):
+            grupos.append((grupo_id, nombre, normalizar_especialidad(nombre)))
+            if medico_id:
+                por_defecto[grupo_id] = (medico_id, usuario_id, f'{nombres} {apellidos}')
+        activos = {g[0] for g in grupos}
+
+        por_tipo_cancer = dict(
+            TipoCancer.objects.filter(grupo_medico_id__in=activos).values_list('pk', 'grupo_medico_id')
+        )
+
+        lideres, receptores = dict(por_defecto), defaultdict(list)
+        membresias = (
+            DoctorGroupMembership.objects.filter(grupo_id__in=activos, activo=True)
+            .order_by('grupo_id', '-es_responsable', 'fecha_union', 'pk')
+            .values_list('grupo_id', 'es_responsable', 'rol', 'medico_id', 'medico__usuario_id', 'medico__nombres', 'medico__apellidos')
+        )
+        for grupo_id, es_responsable, rol, medico_id, usuario_id, nombres, apellidos in membresias:
+            receptores[grupo_id].append(usuario_id)
+            if grupo_id not in lideres and (es_responsable or rol == 'coordinador'):
+                lideres[grupo_id] = (medico_id, usuario_id, f'{nombres} {apellidos}')
+        return cls(grupos, por_tipo_cancer, lideres, dict(receptores))
+
+    def grupo_por_especialidad(self, especialidad):
+        """
+        Primer grupo activo (por nombre) cuyo nombre contiene la especialidad.
+        Una especialidad vacía coincide con el primero, como `nombre__icontains=''`.
+        """
+        clave = normalizar_especialidad(especialidad)
+        if clave not in self._por_especialidad:
+            self._por_especialidad[clave] = next((g[0] for g in self.grupos if clave in g[2]), None)
+        return self._por_especialidad[clave]
+
+    def grupo_para(self, tipo_cancer_id, especialidad):
+        """Grupo del tipo de cáncer si está activo o, si no, el de la especialidad."""
+        return self.por_tipo_cancer.get(tipo_cancer_id) or self.grupo_por_especialidad(especialidad)
+
+    def ruta(self, case):
+        """`Ruta` del caso o None si no hay grupo. `responsable_id` es None si el grupo no tiene líder."""
+        grupo_id = self.grupo_para(case.tipo_cancer_id, case.specialty_required)
+        if not grupo_id:
+            return None
+        lider = self.lideres.get(grupo_id, (None, None, ''))
+        return Ruta(grupo_id, self.nombres[grupo_id], *lider)
+
+
+@reference_cache(
+    'routing_table',
+    models=('medicos.TipoCancer', 'medicos.MedicalGroup', 'medicos.DoctorGroupMembership', 'medicos.Medico'),
+)
+def _routing_table():
+    return RoutingTable.build()
+
+
+def routing_table():
+    return _routing_table.get()
@@ -0,0 +1,142 @@
+"""
+Motor de puntuación de candidatos para la asignación de casos.
+
+Carga los campos que necesita de todos los candidatos de un grupo con una
+sola consulta `values_list` y calcula los scores de carga y antigüedad como
+arrays de NumPy con los pesos del `AlgoritmoConfig` activo. El mejor
+candidato (o los k mejores) se obtiene con selección parcial
+(`argpartition`) en lugar de ordenar todo el grupo.
+
+Los resultados son los mismos que los de
+`AssignmentService.calcular_score_compuesto`: los días de antigüedad son
+los de `timedelta.days` y, ante empates, gana el candidato que aparece
+antes en el orden de las membresías (el mismo desempate que el `sort`
+estable de la implementación anterior). Sin NumPy se usa el mismo cálculo en
+Python puro.
+"""
+
+from django.utils import timezone
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Antigüedad a partir de la cual el score es 1 (5 años)
+DIAS_ANTIGUEDAD_MAX = 1825
+
+CANDIDATE_FIELDS = ('medico_id', 'medico__casos_actuales', 'medico__max_casos_mes', 'medico__fecha_ingreso')
+
+
+def candidatos_queryset(grupo, config):
+    """Membresías candidatas del grupo con los mismos filtros que `get_candidatos`."""
+    from medicos.models import DoctorGroupMembership
+
+    qs = DoctorGroupMembership.objects.filter(
+        grupo=grupo,
+        activo=True,
+        medico__estado='activo',
+        medico__casos_actuales__lt=config.limite_mensual_por_medico,
+    )
+    if config.respetar_disponibilidad:
+        qs = qs.filter(medico__disponible_segundas_opiniones=True)
+    return qs
+
+
+class CandidateScores:
+    """
+    Scores de un conjunto de candidatos, en el orden de las membresías.
+
+    Atributos (arrays de NumPy, o listas sin NumPy): `medico_ids`,
+    `score_carga`, `score_antiguedad`, `score_final`.
+    """
+
+    def __init__(self, medico_ids, score_carga, score_antiguedad, score_final):
+        self.medico_ids = medico_ids
+        self.score_carga = score_carga
+        self.score_antiguedad = score_antiguedad
+        self.score_final = score_final
+
+    def __len__(self):
+        return len(self.medico_ids)
+
+    def fila(self, i):
+        """`(medico_id, score_carga, score_antiguedad, score_final)` del candidato i."""
+        return (
+            int(self.medico_ids[i]),
+            float(self.score_carga[i]),
+            float(self.score_antiguedad[i]),
+            float(self.score_final[i]),
+        )
+
+    def top_k(self, k=1):
+        """Índices de los k mejores (score_final menor), en orden, desempate estable."""
+        n = len(self)
+        k = min(k, n)
+        if k <= 0:
+            return []
+        if not NUMPY_AVAILABLE:
+            return sorted(range(n), key=lambda i: self.score_final[i])[:k]
+        final = self.score_final
+        if k == 1:
+            # argmin devuelve la primera aparición del mínimo
+            return [int(np.argmin(final))]
+        if k < n:
+            umbral = final[np.argpartition(final, k - 1)[k - 1]]
+            # Todos los estrictamente mejores más los empatados en el umbral,
+            # por orden de aparición, hasta completar k
+            menores = np.flatnonzero(final < umbral)
+            empatados = np.flatnonzero(final == umbral)[:k - len(menores)]
+            idx = np.concatenate([menores, empatados])
+        else:
+            idx = np.arange(n)
+        # lexsort: la última clave es la principal; el índice desempata
+        return [int(i) for i in idx[np.lexsort((idx, final[idx]))]]
+
+
+def calcular_scores(filas, config, ahora=None):
+    """
+    Scores a partir de filas `(medico_id, casos_actuales, max_casos_mes, fecha_ingreso)`.
+
+    Devuelve un `CandidateScores`. `ahora` se toma una sola vez para todo el grupo.
+    """
+    ahora = ahora or timezone.now()
+    ponderacion = config.ponderacion_carga / 100.0
+
+    if not NUMPY_AVAILABLE:
+        ids, cargas, antiguedades, finales = [], [], [], []
+        for medico_id, casos, capacidad, ingreso in filas:
+            carga = min(1.0, (casos or 0) / (capacidad or 1))
+            antiguedad = min(1.0, (ahora - ingreso).days / DIAS_ANTIGUEDAD_MAX)
+            if config.modo_estricto:
+                final = -antiguedad
+            else:
+                final = (ponderacion * carga) - ((1 - ponderacion) * antiguedad)
+            ids.append(medico_id)
+            cargas.append(carga)
+            antiguedades.append(antiguedad)
+            finales.append(final)
+        return CandidateScores(ids, cargas, antiguedades, finales)
+
+    n = len(filas)
+    ids = np.fromiter((f[0] for f in filas), dtype=np.int64, count=n)
+    casos = np.fromiter((f[1] or 0 for f in filas), dtype=np.float64, count=n)
+    capacidad = np.fromiter((f[2] or 1 for f in filas), dtype=np.float64, count=n)
+    # timedelta.days exacto (la conversión a timestamps en coma flotante
+    # podría cambiar el día en los bordes)
+    dias = np.fromiter(((ahora - f[3]).days for f in filas), dtype=np.float64, count=n)
+
+    score_carga = np.minimum(1.0, casos / capacidad)
+    score_antiguedad = np.minimum(1.0, dias / DIAS_ANTIGUEDAD_MAX)
+    if config.modo_estricto:
+        score_final = -score_antiguedad
+    else:
+        score_final = (ponderacion * score_carga) - ((1 - ponderacion) * score_antiguedad)
+    return CandidateScores(ids, score_carga, score_antiguedad, score_final)
+
+
+def puntuar_grupo(grupo, config, ahora=None):
+    """Carga los candidatos del grupo con una consulta y devuelve sus `CandidateScores`."""
+    filas = list(candidatos_queryset(grupo, config).values_list(*CANDIDATE_FIELDS))
+    return calcular_scores(filas, config, ahora)
@@ -28,8 +28,8 @@ def _diagnosis_from_draft(case_draft, tipo_cancer_obj=None):
     tipo_cancer_pk = (case_draft or {}).get('tipo_cancer')
     if tipo_cancer_pk:
         try:
-            from medicos.models import TipoCancer
-            tc = TipoCancer.objects.filter(pk=tipo_cancer_pk).first()
+            from core.reference_data import tipo_cancer
+            tc = tipo_cancer(tipo_cancer_pk)
             if tc:
                 return tc.nombre
         except Exception:
@@ -65,10 +65,16 @@ def es_lider_del_caso(medico, case):
 
 def user_can_access_case_document(user, doc):
     """Paciente, médico asignado, líder o miembro del grupo/comité pueden ver documentos."""
-    if not user or not user.is_authenticated or not doc:
+    if not doc:
+        return False
+    return user_can_access_case(user, doc.case)
+
+
+def user_can_access_case(user, case):
+    """Mismas reglas que `user_can_access_case_document`, a nivel de caso."""
+    if not user or not user.is_authenticated or not case:
         return False
 
-    case = doc.case
     if getattr(user, 'is_staff', False) or getattr(user, 'is_superuser', False):
         return True
     if case.patient_id == user.id:
@@ -314,7 +320,6 @@ class CaseService:
         from django.apps import apps as django_apps
         PatientProfile = django_apps.get_model('authentication', 'PatientProfile')
         CaseDocument = django_apps.get_model('cases', 'CaseDocument')
-        TipoCancer = django_apps.get_model('medicos', 'TipoCancer')
 
         # Create or update patient profile
         profile, created = PatientProfile.objects.get_or_create(user=user)
@@ -335,10 +340,8 @@ class CaseService:
         tipo_cancer_obj = None
         tipo_cancer_pk = case_draft.get('tipo_cancer')
         if tipo_cancer_pk:
-            try:
-                tipo_cancer_obj = TipoCancer.objects.get(pk=tipo_cancer_pk)
-            except (TipoCancer.DoesNotExist, ValueError, TypeError):
-                pass
+            from core.reference_data import tipo_cancer
+            tipo_cancer_obj = tipo_cancer(tipo_cancer_pk)
 
         case_pk = session_data.get('case_pk')
         existing_case = Case.objects.filter(pk=case_pk, patient=user).first() if case_pk else None
@@ -374,8 +377,8 @@ class CaseService:
         try:
             localidad_id = case_draft.get('localidad')
             if localidad_id:
-                from medicos.models import Localidad
-                loc = Localidad.objects.filter(pk=localidad_id).first()
+                from core.reference_data import localidad
+                loc = localidad(localidad_id)
                 # persist localidad on case for later visibility
                 if loc:
                     try:
@@ -564,86 +567,79 @@ def asignar_caso_automatico(case):
     
     Este servicio:
     1. Determina el MedicalGroup según el tipo_cancer del caso
+       (o, si no, por specialty_required)
     2. Asigna al líder del grupo como responsable del caso
     3. Asigna el caso al grupo y responsable
     4. Envía notificaciones a los miembros del grupo
     
+    Grupo, líder y miembros salen de la tabla de enrutamiento precalculada
+    (cases.routing_table): decidir la ruta no hace consultas. El caso se
+    reclama con select_for_update(skip_locked=True), así que varios workers
+    pueden asignar en paralelo sin asignar dos veces el mismo caso.
+    
     Args:
         case (Case): El caso a asignar
         
     Returns:
         tuple: (success: bool, message: str)
     """
-    from medicos.models import MedicalGroup, DoctorGroupMembership, Medico
+    from .routing_table import routing_table
+    
+    tabla = routing_table()
+    ruta = tabla.ruta(case)
+    if not ruta:
+        return (False, f"No se encontró grupo médico para: {case.specialty_required}")
+    if not ruta.responsable_id:
+        return (False, f"No hay médicos disponibles en el grupo: {ruta.grupo_nombre}")
     
     with transaction.atomic():
-        # Buscar grupo por tipo_cancer del caso (ahora es FK directa)
-        if case.tipo_cancer and case.tipo_cancer.grupo_medico:
-            grupo = case.tipo_cancer.grupo_medico
-            if not grupo.activo:
-                grupo = None
-        else:
-            grupo = None
-        
-        # Fallback: buscar por specialty_required si no se encontró por tipo_cancer
-        if not grupo:
-            try:
-                grupo = MedicalGroup.objects.get(
-                    nombre__icontains=case.specialty_required,
-                    activo=True
-                )
-            except MedicalGroup.DoesNotExist:
-                try:
-                    grupo = MedicalGroup.objects.filter(
-                        nombre__icontains=case.specialty_required,
-                        activo=True
-                    ).first()
-                except Exception:
-                    pass
-            
-            if not grupo:
-                return (False, f"No se encontró grupo médico para: {case.specialty_required}")
-        
-        responsable = _seleccionar_responsable(grupo)
-        
-        if not responsable:
-            return (False, f"No hay médicos disponibles en el grupo: {grupo.nombre}")
+        # Reclamar el caso: si otro worker lo está asignando (fila bloqueada)
+        # o ya tiene grupo, no se toca
+        reclamado = list(
+            Case.objects.select_for_update(skip_locked=True)
+            .filter(pk=case.pk, medical_group__isnull=True)
+            .values_list('pk', flat=True)
+        )
+        if not reclamado:
+            return (False, f"El caso {case.case_id} ya está asignado o lo está asignando otro proceso")
         
-        case.medical_group = grupo
-        case.responsable = responsable
-        case.doctor = responsable.usuario
+        case.medical_group_id = ruta.grupo_id
+        case.responsable_id = ruta.responsable_id
+        case.doctor_id = ruta.responsable_usuario_id
         # Solo actualizar assigned_at si no ha sido establecido antes
         if not case.assigned_at:
             case.assigned_at = timezone.now()
-        case.save()
+        case.save(update_fields=['medical_group', 'responsable', 'doctor', 'assigned_at', 'updated_at'])
         
-        _notificar_asignacion_caso(case, grupo)
+        _notificar_asignacion_caso(case, ruta.grupo_nombre, tabla.receptores.get(ruta.grupo_id, ()))
         
-        return (True, f"Caso asignado al grupo {grupo.nombre} y responsable {responsable.nombre_completo}")
-
-
-def _seleccionar_responsable(grupo):
-    """El responsable del caso es siempre el líder del grupo MDT."""
-    return grupo.get_lider()
+        return (True, f"Caso asignado al grupo {ruta.grupo_nombre} y responsable {ruta.responsable_nombre}")
 
 
-def _notificar_asignacion_caso(case, grupo):
-    """Envía notificaciones a todos los miembros del grupo médico."""
+def avisos_asignacion(case, grupo_nombre, usuario_ids):
+    """Notificaciones (sin guardar) del caso asignado para los usuarios dados."""
     from notifications.models import Notification
     
     titulo = f"Nuevo caso asignado: {case.case_id}"
-    mensaje = f"Se ha asignado un nuevo caso de {case.specialty_required} al grupo {grupo.nombre}."
-    
-    for membresia in grupo.miembros.filter(activo=True):
-        medico = membresia.medico
-        Notification.objects.create(
-            receptor=medico.usuario,
+    mensaje = f"Se ha asignado un nuevo caso de {case.specialty_required} al grupo {grupo_nombre}."
+    return [
+        Notification(
+            receptor_id=usuario_id,
             tipo='asignacion_caso',
             titulo=titulo,
             mensaje=mensaje,
             enlace=f'/doctors/case/{case.case_id}/',
             caso_id=case.case_id
         )
+        for usuario_id in usuario_ids
+    ]
+
+
+def _notificar_asignacion_caso(case, grupo_nombre, usuario_ids):
+    """Envía notificaciones a todos los miembros activos del grupo médico (un INSERT)."""
+    from notifications.models import Notification
+    
+    Notification.objects.bulk_create(avisos_asignacion(case, grupo_nombre, usuario_ids))
 
 
 def obtener_estadisticas_grupo(grupo):
@@ -1,8 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
+from django.db import transaction
 from django.dispatch import receiver
 from django.utils import timezone
 
-from .models import Case
+from .models import Case, CaseDocument
 
 
 @receiver(post_save, sender=Case)
@@ -10,10 +11,15 @@ def assign_case_on_create_or_localidad_change(sender, instance: Case, created, *
     """
     Cuando se crea un Case o se actualiza su localidad, si tiene localidad y no tiene
     doctor asignado, intentar asignarlo al medico responsable de la localidad.
+
+    Solo en esos dos casos: cualquier otro save() (incluidos los de la propia
+    asignación) no vuelve a entrar en la asignación.
     """
     try:
         # If doctor already assigned, nothing to do
-        if instance.doctor:
+        if instance.doctor_id:
+            return
+        if not created and instance.localidad_id == getattr(instance, '_localidad_guardada', None):
             return
 
         loc = getattr(instance, 'localidad', None)
@@ -45,3 +51,90 @@ def assign_case_on_create_or_localidad_change(sender, instance: Case, created, *
             logging.getLogger(__name__).exception('Failed to auto-assign case %s', getattr(instance, 'case_id', instance.pk))
         except Exception:
             pass
+
+
+@receiver(post_delete, sender=CaseDocument)
+def release_document_blob(sender, instance: CaseDocument, **kwargs):
+    """
+    Al borrar un documento (también en borrados por queryset) se libera su
+    referencia al blob; el archivo físico solo se elimina si era la última.
+    """
+    if instance.blob_id:
+        from .blobs import BlobStorageService
+        BlobStorageService.release(instance.blob_id)
+    elif instance.file and instance.file.name:
+        from documents.renditions import delete_renditions
+        delete_renditions(instance.file.storage, instance.file.name)
+    if instance.is_anonymized or instance.anonymization_progress:
+        # Texto redactado del PDF (por documento, no por blob). `delete_case_files`
+        # los borra en bloque y limpia estos campos antes, así que aquí solo
+        # llegan borrados sueltos
+        try:
+            from django.core.files.storage import default_storage
+            from documents.pdf_redaction import redacted_text_key
+            if CaseDocument.case.is_cached(instance):
+                case_id = instance.case.case_id
+            else:
+                case_id = Case.objects.filter(pk=instance.case_id).values_list('case_id', flat=True).first()
+            if case_id:
+                default_storage.delete(redacted_text_key(case_id, instance.pk))
+        except Exception:
+            import logging
+            logging.getLogger(__name__).exception('No se pudo borrar el texto redactado del documento %s', instance.pk)
+
+
+@receiver(post_save, sender=CaseDocument)
+def schedule_document_renditions(sender, instance: CaseDocument, created, **kwargs):
+    """Encola la generación de miniaturas de los documentos de imagen/DICOM nuevos."""
+    if not created or not instance.has_stored_file:
+        return
+    try:
+        from documents.renditions import enqueue_renditions, source_kind
+        if source_kind(instance) is None:
+            return
+        transaction.on_commit(lambda: enqueue_renditions(instance.pk))
+    except Exception:
+        import logging
+        logging.getLogger(__name__).exception('No se pudieron encolar las renditions del documento %s', instance.pk)
+
+
+@receiver(post_save, sender=CaseDocument)
+def schedule_pdf_redaction(sender, instance: CaseDocument, created, **kwargs):
+    """Encola la anonimización del texto de los PDF nuevos subidos a través de Django."""
+    if not created or not instance.has_stored_file:
+        return
+    try:
+        from documents.pdf_redaction import is_pdf
+        if not is_pdf(instance):
+            return
+        from documents.tasks import anonymize_pdf_document
+        transaction.on_commit(lambda: anonymize_pdf_document.delay(instance.pk))
+    except Exception:
+        import logging
+        logging.getLogger(__name__).exception('No se pudo encolar la anonimización del documento %s', instance.pk)
+
+
+def _programar_conteo(caso_pk):
+    from functools import partial
+    from .vote_tally import programar_publicacion
+    if caso_pk:
+        transaction.on_commit(partial(programar_publicacion, caso_pk))
+
+
+@receiver(post_save, sender='cases.MedicalOpinion')
+@receiver(post_delete, sender='cases.MedicalOpinion')
+def publish_tally_on_opinion_change(sender, instance, **kwargs):
+    """Publica el conteo de votos en la sala del caso tras el commit (ver cases.vote_tally)."""
+    _programar_conteo(instance.case_id)
+
+
+@receiver(post_save, sender='cases.ConsensusVote')
+@receiver(post_delete, sender='cases.ConsensusVote')
+def publish_tally_on_consensus_vote_change(sender, instance, **kwargs):
+    """Igual que con las opiniones, para los votos del consenso."""
+    if type(instance).workflow.is_cached(instance):
+        caso_pk = instance.workflow.caso_id
+    else:
+        from .mdt_models import ConsensusWorkflow
+        caso_pk = ConsensusWorkflow.objects.filter(pk=instance.workflow_id).values_list('caso_id', flat=True).first()
+    _programar_conteo(caso_pk)
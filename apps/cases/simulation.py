@@ -0,0 +1,173 @@
+"""
+Simulador de la asignación de casos para comparar configuraciones.
+
+Reproduce en memoria una secuencia de llegadas de casos (históricas o
+sintéticas) con el mismo motor de scores que la asignación real
+(`cases.scoring`) y distintas variantes de `AlgoritmoConfig`, sin escribir
+nada en la base de datos. Cada caso ocupa la carga del médico elegido
+durante su duración (la real si el caso histórico se completó, o la fija de
+la simulación) y después la libera.
+
+Por configuración se informa del reparto de casos por médico, el coeficiente
+de Gini de ese reparto, los casos sin candidato y las asignaciones por
+segundo del motor.
+"""
+
+import heapq
+import random
+import time
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.utils import timezone
+
+from .scoring import calcular_scores
+
+CONFIG_FIELDS = ('ponderacion_carga', 'modo_estricto', 'limite_mensual_por_medico', 'respetar_disponibilidad')
+DEFAULT_CASE_DURATION_DAYS = 30
+
+
+# Médico de un grupo
+Candidato = namedtuple('Candidato', 'medico_id nombre max_casos_mes fecha_ingreso disponible activo')
+# Caso que llega; `duracion` None usa la duración fija de la simulación
+Llegada = namedtuple('Llegada', 'fecha grupo_id duracion', defaults=(None,))
+
+
+def config_desde(base=None, **cambios):
+    """Copia en memoria de los campos de `AlgoritmoConfig` que usa el motor, con cambios."""
+    if base is None:
+        from core.reference_data import algoritmo_config
+        from .mdt_models import AlgoritmoConfig
+        base = algoritmo_config() or AlgoritmoConfig()
+    valores = {campo: getattr(base, campo) for campo in CONFIG_FIELDS}
+    desconocidos = set(cambios) - set(CONFIG_FIELDS)
+    if desconocidos:
+        raise ValueError(f"Campos de configuración desconocidos: {', '.join(sorted(desconocidos))}")
+    valores.update(cambios)
+    return SimpleNamespace(**valores)
+
+
+def cargar_grupos():
+    """Candidatos de cada grupo activo, en el orden de las membresías (desempate del motor)."""
+    from medicos.models import DoctorGroupMembership
+
+    grupos = defaultdict(list)
+    membresias = (
+        DoctorGroupMembership.objects.filter(grupo__activo=True, activo=True)
+        .select_related('medico')
+        .order_by('-fecha_union')
+    )
+    for m in membresias:
+        medico = m.medico
+        grupos[m.grupo_id].append(Candidato(
+            medico_id=medico.pk,
+            nombre=medico.nombre_completo,
+            max_casos_mes=medico.max_casos_mes,
+            fecha_ingreso=medico.fecha_ingreso,
+            disponible=medico.disponible_segundas_opiniones,
+            activo=medico.estado == 'activo',
+        ))
+    return dict(grupos)
+
+
+def llegadas_historicas(desde=None, hasta=None):
+    """Casos con grupo médico, por fecha de creación; la duración es la real si se completaron."""
+    from .models import Case
+
+    qs = Case.objects.filter(medical_group__isnull=False)
+    if desde:
+        qs = qs.filter(created_at__gte=desde)
+    if hasta:
+        qs = qs.filter(created_at__lt=hasta)
+    return [
+        Llegada(fecha=creado, grupo_id=grupo_id, duracion=(completado - creado) if completado else None)
+        for creado, grupo_id, completado in qs.order_by('created_at', 'pk').values_list('created_at', 'medical_group_id', 'completed_at')
+    ]
+
+
+def llegadas_sinteticas(grupo_ids, total, dias=30, seed=0, inicio=None):
+    """`total` llegadas repartidas al azar (reproducible con `seed`) entre grupos y días."""
+    rng = random.Random(seed)
+    inicio = inicio or timezone.now()
+    segundos = dias * 86400
+    instantes = sorted(rng.uniform(0, segundos) for _ in range(total))
+    grupo_ids = sorted(grupo_ids)
+    return [Llegada(inicio + timedelta(seconds=s), rng.choice(grupo_ids)) for s in instantes]
+
+
+def gini(valores):
+    """Coeficiente de Gini (0 = reparto igualitario, tiende a 1 = todo en uno)."""
+    valores = sorted(valores)
+    n = len(valores)
+    total = sum(valores)
+    if not n or not total:
+        return 0.0
+    acumulado = sum((2 * i - n - 1) * x for i, x in enumerate(valores, 1))
+    return acumulado / (n * total)
+
+
+def simular(llegadas, grupos, config, duracion=timedelta(days=DEFAULT_CASE_DURATION_DAYS)):
+    """
+    Reproduce `llegadas` con `config` y devuelve el informe de la simulación.
+
+    `grupos` es `{grupo_id: [Candidato]}` (ver `cargar_grupos`). Todos los
+    médicos empiezan sin carga.
+    """
+    candidatos = {
+        grupo_id: [
+            c for c in miembros
+            if c.activo and (c.disponible or not config.respetar_disponibilidad)
+        ]
+        for grupo_id, miembros in grupos.items()
+    }
+    medicos = {c.medico_id: c for miembros in candidatos.values() for c in miembros}
+    carga = defaultdict(int)
+    asignados = defaultdict(int)
+    carga_max = defaultdict(int)
+    liberaciones = []  # heap de (fecha, secuencia, medico_id)
+    sin_candidato = 0
+    limite = config.limite_mensual_por_medico
+
+    inicio = time.perf_counter()
+    for secuencia, llegada in enumerate(llegadas):
+        while liberaciones and liberaciones[0][0] <= llegada.fecha:
+            carga[heapq.heappop(liberaciones)[2]] -= 1
+
+        filas = [
+            (c.medico_id, carga[c.medico_id], c.max_casos_mes, c.fecha_ingreso)
+            for c in candidatos.get(llegada.grupo_id, ())
+            if carga[c.medico_id] < limite
+        ]
+        if not filas:
+            sin_candidato += 1
+            continue
+        scores = calcular_scores(filas, config, llegada.fecha)
+        medico_id = scores.fila(scores.top_k(1)[0])[0]
+
+        carga[medico_id] += 1
+        asignados[medico_id] += 1
+        carga_max[medico_id] = max(carga_max[medico_id], carga[medico_id])
+        fin = llegada.fecha + (llegada.duracion if llegada.duracion is not None else duracion)
+        heapq.heappush(liberaciones, (fin, secuencia, medico_id))
+    segundos = time.perf_counter() - inicio
+
+    total = len(llegadas) - sin_candidato
+    return {
+        'config': {campo: getattr(config, campo) for campo in CONFIG_FIELDS},
+        'casos': len(llegadas),
+        'asignados': total,
+        'sin_candidato': sin_candidato,
+        'gini': round(gini([asignados[m] for m in medicos]), 4),
+        'segundos': round(segundos, 4),
+        'asignaciones_por_segundo': round(total / segundos, 1) if segundos else None,
+        'medicos': [
+            {
+                'medico_id': medico_id,
+                'nombre': c.nombre,
+                'asignados': asignados[medico_id],
+                'carga_max': carga_max[medico_id],
+            }
+            for medico_id, c in sorted(medicos.items(), key=lambda item: (-asignados[item[0]], item[0]))
+        ],
+    }
@@ -0,0 +1,62 @@
+from celery import shared_task
+import logging
+
+log = logging.getLogger(__name__)
+
+
+@shared_task
+def assign_backlog_task(chunk_size=None, limit=None, notify=True):
+    """Asigna en lote los casos SUBMITTED sin grupo médico (ver cases.backlog).
+
+    Devuelve el resumen con `pendientes`, `asignados` y `omitidos`.
+    """
+    from cases.backlog import DEFAULT_CHUNK_SIZE, assign_backlog
+
+    resumen = assign_backlog(chunk_size=chunk_size or DEFAULT_CHUNK_SIZE, limit=limit, notify=notify)
+    if resumen['omitidos']:
+        log.warning('assign_backlog_task: %s casos sin grupo o sin líder: %s', len(resumen['omitidos']), resumen['omitidos'][:20])
+    return resumen
+
+
+@shared_task
+def reconcile_workload_task():
+    """Recalcula `Medico.casos_actuales` a partir de los casos abiertos (ver cases.workload).
+
+    Programada cada noche en `app.conf.beat_schedule` (oncosegunda/celery.py). Devuelve cuántos médicos se corrigieron.
+    """
+    from cases.workload import reconciliar_carga
+
+    desviados = reconciliar_carga()
+    for medico_id, contador, abiertos in desviados:
+        log.warning('reconcile_workload_task: médico %s tenía %s casos_actuales, %s abiertos', medico_id, contador, abiertos)
+    return len(desviados)
+
+
+@shared_task
+def verify_vote_tallies_task():
+    """Comprueba los contadores de votos de los consensos MDT (ver cases.voting).
+
+    Programada cada hora en `app.conf.beat_schedule` (oncosegunda/celery.py). Devuelve cuántos workflows se corrigieron.
+    """
+    from cases.voting import verificar_conteos
+
+    desviados = verificar_conteos()
+    for workflow_id, diferencias in desviados:
+        log.warning('verify_vote_tallies_task: workflow %s desviado (guardado, real): %s', workflow_id, diferencias)
+    return len(desviados)
+
+
+@shared_task
+def publish_vote_tally_task(caso_pk):
+    """Publica el conteo de votos del caso en su sala MDT (ver cases.vote_tally)."""
+    from cases.vote_tally import publicar_conteo
+
+    publicar_conteo(caso_pk)
+
+
+@shared_task
+def cleanup_chunked_uploads_task():
+    """Borra las subidas por fragmentos abandonadas (ver cases.uploads). Devuelve cuántas."""
+    from cases.uploads import ChunkedUploadService
+
+    return ChunkedUploadService.limpiar_abandonadas()
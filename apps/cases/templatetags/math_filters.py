@@ -16,3 +16,10 @@ def mul(value, arg):
 def filter_by_document_type(documents, doc_type):
     """Filter documents by document_type."""
     return [doc for doc in documents if doc.document_type == doc_type]
+
+
+@register.filter(name='has_rendition')
+def has_rendition(doc):
+    """True si el documento tiene archivo y es una imagen o un DICOM (admite miniatura)."""
+    from documents.renditions import source_kind
+    return bool(doc.has_stored_file and source_kind(doc))
@@ -0,0 +1,103 @@
+import io
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase, TestCase, override_settings
+from reportlab.pdfgen import canvas
+
+from cases.anonymization import anonimizar, anonimizar_lote
+from cases.mdt_services import AnonymizationService
+from cases.models import Case, CaseDocument
+from documents.pdf_redaction import page_count, redact_pdf, redacted_text_name
+from documents.tasks import anonymize_pdf_document
+
+User = get_user_model()
+
+
+def _pdf(paginas):
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+    for texto in paginas:
+        pdf.drawString(72, 720, texto)
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+class SinglePassAnonymizationTests(SimpleTestCase):
+    def test_replaces_all_pii_in_one_pass(self):
+        texto = 'Paciente JUAN Pérez (juan.perez@example.com, 555-123-4567, CI 12345678). Juanito pérez.'
+        self.assertEqual(
+            anonimizar(texto, 'Juan Pérez'),
+            'Paciente [NOMBRE_REMOVIDO] [NOMBRE_REMOVIDO] ([EMAIL_REMOVIDO], [TELÉFONO_REMOVIDO], '
+            'CI [ID_REMOVIDO]). Juanito [NOMBRE_REMOVIDO].',
+        )
+
+    def test_batch_keeps_order_and_empty_values(self):
+        self.assertEqual(
+            anonimizar_lote(['María Gómez', None, '', 'sin datos'], ['María Gómez']),
+            ['[NOMBRE_REMOVIDO] [NOMBRE_REMOVIDO]', None, '', 'sin datos'],
+        )
+
+
+@override_settings(PDF_REDACTION_WORKERS=1)
+class PdfRedactionTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.patient = User.objects.create_user(
+            username='marta', email='marta@example.com', password='pass', role='patient',
+            first_name='Marta', last_name='Ruiz',
+        )
+        self.case = Case.objects.create(patient=self.patient, case_id='CASO-PDF-1', primary_diagnosis='Dx')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _documento(self, nombre, contenido):
+        return CaseDocument.objects.create(
+            case=self.case, document_type='resumen_historia_clinica', uploaded_by=self.patient,
+            file=ContentFile(contenido, name=nombre), file_name=nombre,
+        )
+
+    def test_pdf_text_is_redacted_page_by_page(self):
+        paginas = ['Paciente Marta Ruiz', 'Contacto marta.ruiz@example.com', 'Sin datos personales']
+        doc = self._documento('historia.pdf', _pdf(paginas))
+
+        nombre = anonymize_pdf_document(doc.pk)
+
+        self.assertEqual(nombre, redacted_text_name(doc))
+        with default_storage.open(nombre) as f:
+            texto = f.read().decode('utf-8')
+        self.assertNotIn('Marta', texto)
+        self.assertNotIn('marta.ruiz@example.com', texto)
+        self.assertIn('[NOMBRE_REMOVIDO]', texto)
+        self.assertIn('Sin datos personales', texto)
+        self.assertEqual(texto.count('--- Página '), 3)
+        # El original no se toca
+        self.assertEqual(page_count(doc.file.path), 3)
+        doc.refresh_from_db()
+        self.assertTrue(doc.is_anonymized)
+        self.assertEqual(doc.anonymization_progress, 100)
+
+    def test_parallel_ranges_keep_page_order(self):
+        doc = self._documento('largo.pdf', _pdf([f'Pagina {i} de Marta Ruiz' for i in range(12)]))
+
+        paginas = redact_pdf(doc.file.path, ['Marta Ruiz'], workers=3)
+
+        self.assertEqual(len(paginas), 12)
+        self.assertEqual([p.split()[1] for p in paginas], [str(i) for i in range(12)])
+        self.assertFalse(any('Marta' in p for p in paginas))
+
+    def test_local_non_pdf_document_is_marked_anonymized(self):
+        doc = self._documento('foto.png', b'no es un pdf')
+
+        AnonymizationService.generar_version_anonima(doc)
+
+        doc.refresh_from_db()
+        self.assertTrue(doc.is_anonymized)
@@ -0,0 +1,300 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.models import Count, Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from cases.backlog import assign_backlog
+from cases.mdt_models import AlgoritmoConfig, AsignacionAuditLog
+from cases.mdt_services import AssignmentService
+from cases.models import Case
+from cases.routing_table import routing_table
+from cases.scoring import calcular_scores
+from cases.services import asignar_caso_automatico
+from cases.workload import reconciliar_carga, reservar_carga
+from core import reference_data
+from medicos.models import DoctorGroupMembership, MedicalGroup, Medico
+from notifications.models import Notification
+
+User = get_user_model()
+
+
+class AsignarCasoQueryCountTests(TestCase):
+    def setUp(self):
+        # La copia local de los datos de referencia sobrevive entre tests
+        cache.clear()
+        reference_data.invalidate_all()
+        AlgoritmoConfig.objects.create(activo=True, limite_mensual_por_medico=100)
+        self.patient = User.objects.create_user(username='paciente', email='paciente@example.com', password='pass', role='patient')
+
+    def _grupo(self, nombre, miembros):
+        grupo = MedicalGroup.objects.create(nombre=nombre)
+        for i in range(miembros):
+            usuario = User.objects.create_user(
+                username=f'{nombre}-{i}', email=f'{nombre}-{i}@example.com', password='pass', role='doctor'
+            )
+            medico = Medico.objects.create(
+                usuario=usuario, numero_documento=f'{nombre}{i}', nombres='Médico', apellidos=str(i),
+                fecha_nacimiento=date(1980, 1, 1), genero='otro', registro_medico=f'RM-{nombre}-{i}',
+                institucion_actual='Hospital', telefono='3000000000', casos_actuales=i % 5,
+            )
+            DoctorGroupMembership.objects.create(medico=medico, grupo=grupo, es_responsable=(i == 0))
+        return grupo
+
+    def _asignar(self, grupo, case_id):
+        caso = Case.objects.create(patient=self.patient, case_id=case_id, primary_diagnosis='Dx', medical_group=grupo)
+        # Solo se cuentan las consultas de la asignación, no la carga del caché
+        reference_data.algoritmo_config()
+        with CaptureQueriesContext(connection) as ctx:
+            medico = AssignmentService.asignar_caso(caso)
+        self.assertIsNotNone(medico)
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT') and 'asignacionauditlog' in q['sql'].lower()]
+        return len(ctx.captured_queries), len(inserts)
+
+    def test_audit_rows_written_in_one_insert_regardless_of_group_size(self):
+        pequeno = self._asignar(self._grupo('pequeno', 3), 'CASO-Q-3')
+        grande = self._asignar(self._grupo('grande', 30), 'CASO-Q-30')
+
+        self.assertEqual(grande, pequeno)
+        self.assertEqual(grande[1], 1)
+        caso = Case.objects.get(case_id='CASO-Q-30')
+        self.assertEqual(AsignacionAuditLog.objects.filter(caso=caso).count(), 30)
+        self.assertEqual(AsignacionAuditLog.objects.filter(caso=caso, decision='asignado').count(), 1)
+
+
+class AssignBacklogTests(TestCase):
+    setUp = AsignarCasoQueryCountTests.setUp
+    _grupo = AsignarCasoQueryCountTests._grupo
+
+    def test_assigns_pending_cases_and_spreads_load(self):
+        grupo = self._grupo('mama', 3)
+        for i in range(6):
+            Case.objects.create(patient=self.patient, case_id=f'CASO-B-{i}', primary_diagnosis='Dx', specialty_required='mama', status='SUBMITTED')
+        Case.objects.create(patient=self.patient, case_id='CASO-B-X', primary_diagnosis='Dx', specialty_required='inexistente', status='SUBMITTED')
+
+        resumen = assign_backlog(chunk_size=4)
+
+        self.assertEqual(resumen['asignados'], 6)
+        self.assertEqual(resumen['omitidos'], ['CASO-B-X'])
+        lider = grupo.get_lider()
+        self.assertEqual(Case.objects.filter(medical_group=grupo, responsable=lider, doctor=lider.usuario).count(), 6)
+        self.assertEqual(AsignacionAuditLog.objects.filter(decision='asignado').count(), 6)
+        self.assertEqual(Notification.objects.filter(tipo='asignacion_caso').count(), 18)
+        # casos_actuales inicial 0, 1, 2: la carga se reparte con los deltas del lote
+        self.assertEqual(sorted(Medico.objects.filter(membresias_grupo__grupo=grupo).values_list('casos_actuales', flat=True)), [3, 3, 3])
+        self.assertEqual(assign_backlog()['pendientes'], 1)
+
+
+class WorkloadCounterTests(TestCase):
+    setUp = AsignarCasoQueryCountTests.setUp
+    _grupo = AsignarCasoQueryCountTests._grupo
+
+    def test_counter_follows_assignment_cancel_and_reconciliation(self):
+        grupo = self._grupo('carga', 1)
+        caso = Case.objects.create(patient=self.patient, case_id='CASO-W-1', primary_diagnosis='Dx', medical_group=grupo)
+        medico = AssignmentService.asignar_caso(caso)
+        medico.refresh_from_db()
+        self.assertEqual(medico.casos_actuales, 1)
+        self.assertEqual(caso.medico_asignado, medico)
+
+        caso = Case.objects.get(pk=caso.pk)
+        caso.cancelar_caso()
+        caso.save()
+        medico.refresh_from_db()
+        self.assertEqual(medico.casos_actuales, 0)
+
+        Case.objects.create(
+            patient=self.patient, case_id='CASO-W-2', primary_diagnosis='Dx', medical_group=grupo, medico_asignado=medico,
+        )
+        self.assertEqual(reconciliar_carga(), [(medico.pk, 0, 1)])
+        medico.refresh_from_db()
+        self.assertEqual(medico.casos_actuales, 1)
+        self.assertEqual(reconciliar_carga(), [])
+
+
+class RoutingTableTests(TestCase):
+    setUp = AsignarCasoQueryCountTests.setUp
+    _grupo = AsignarCasoQueryCountTests._grupo
+
+    def test_routes_without_queries_and_rebuilds_on_membership_change(self):
+        cache.clear()
+        reference_data.invalidate_all()
+        pulmon = self._grupo('Pulmon', 2)
+        self._grupo('Mama', 2)
+        caso = Case.objects.create(patient=self.patient, case_id='CASO-R-1', primary_diagnosis='Dx', specialty_required=' PULMON ')
+
+        tabla = routing_table()
+        with self.assertNumQueries(0):
+            ruta = routing_table().ruta(caso)
+        self.assertEqual(ruta.grupo_id, pulmon.pk)
+        self.assertEqual(ruta.responsable_id, pulmon.get_lider().pk)
+        self.assertEqual(len(tabla.receptores[pulmon.pk]), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DoctorGroupMembership.objects.filter(grupo=pulmon).update(es_responsable=False)
+            DoctorGroupMembership.objects.filter(grupo=pulmon).first().save()
+        self.assertIsNone(routing_table().ruta(caso).responsable_id)
+
+        ok, _ = asignar_caso_automatico(caso)
+        self.assertFalse(ok)
+
+    def test_empty_specialty_falls_back_to_first_active_group(self):
+        self._grupo('Pulmon', 1)
+        colon = self._grupo('Colon', 1)
+        caso = Case.objects.create(patient=self.patient, case_id='CASO-R-3', primary_diagnosis='Dx', specialty_required='')
+
+        self.assertEqual(routing_table().ruta(caso).grupo_id, colon.pk)
+
+    def test_assignment_uses_route_and_bulk_notifies(self):
+        cache.clear()
+        reference_data.invalidate_all()
+        grupo = self._grupo('Colon', 3)
+        caso = Case.objects.create(patient=self.patient, case_id='CASO-R-2', primary_diagnosis='Dx', specialty_required='colon')
+        routing_table()
+
+        with CaptureQueriesContext(connection) as ctx:
+            ok, _ = asignar_caso_automatico(caso)
+        self.assertTrue(ok)
+        # Sin búsquedas de grupo, líder ni miembros; notificaciones en un INSERT
+        self.assertFalse([q for q in ctx.captured_queries if 'medicos_' in q['sql'] and q['sql'].startswith('SELECT')])
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('INSERT') and 'notification' in q['sql'].lower()]), 1)
+        caso.refresh_from_db()
+        self.assertEqual(caso.medical_group, grupo)
+        self.assertEqual(caso.responsable, grupo.get_lider())
+        self.assertEqual(Notification.objects.filter(caso_id='CASO-R-2').count(), 3)
+
+
+class AssignmentClaimTests(TestCase):
+    """
+    La lógica de reclamo sin depender del backend: lo que hace un segundo
+    worker que llega tarde a un caso o a la última plaza de un médico.
+    `ConcurrentAssignmentTests` lo ejercita con hilos reales en PostgreSQL.
+    """
+    setUp = AsignarCasoQueryCountTests.setUp
+    _grupo = AsignarCasoQueryCountTests._grupo
+
+    def test_reservation_only_succeeds_below_limit(self):
+        grupo = self._grupo('plaza', 1)
+        medico = Medico.objects.get(membresias_grupo__grupo=grupo)
+        Medico.objects.filter(pk=medico.pk).update(casos_actuales=2)
+
+        # Dos workers con los mismos scores eligen al mismo médico con una plaza libre
+        self.assertEqual([reservar_carga(medico.pk, 3), reservar_carga(medico.pk, 3)], [True, False])
+        medico.refresh_from_db()
+        self.assertEqual(medico.casos_actuales, 3)
+
+    def test_second_assignment_of_a_case_is_idempotent(self):
+        grupo = self._grupo('reintento', 3)
+        caso = Case.objects.create(patient=self.patient, case_id='CASO-C-1', primary_diagnosis='Dx', medical_group=grupo)
+        carga_inicial = Medico.objects.aggregate(total=Sum('casos_actuales'))['total']
+
+        primero = AssignmentService.asignar_caso(Case.objects.get(pk=caso.pk))
+        segundo = AssignmentService.asignar_caso(Case.objects.get(pk=caso.pk))
+
+        self.assertEqual(primero, segundo)
+        self.assertEqual(AsignacionAuditLog.objects.filter(caso=caso, decision='asignado').count(), 1)
+        self.assertEqual(Medico.objects.aggregate(total=Sum('casos_actuales'))['total'], carga_inicial + 1)
+
+    def test_routing_a_claimed_case_does_not_notify_again(self):
+        cache.clear()
+        reference_data.invalidate_all()
+        self._grupo('Recaida', 2)
+        caso = Case.objects.create(patient=self.patient, case_id='CASO-C-2', primary_diagnosis='Dx', specialty_required='recaida')
+
+        self.assertTrue(asignar_caso_automatico(Case.objects.get(pk=caso.pk))[0])
+        self.assertFalse(asignar_caso_automatico(Case.objects.get(pk=caso.pk))[0])
+        self.assertEqual(Notification.objects.filter(caso_id='CASO-C-2', tipo='asignacion_caso').count(), 2)
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class ConcurrentAssignmentTests(TransactionTestCase):
+    """Varios hilos (como workers de Celery) asignando los mismos casos a la vez."""
+
+    HILOS = 8
+
+    def setUp(self):
+        cache.clear()
+        reference_data.invalidate_all()
+        AlgoritmoConfig.objects.create(activo=True, limite_mensual_por_medico=3)
+        self.patient = User.objects.create_user(username='paciente', email='paciente@example.com', password='pass', role='patient')
+
+    _grupo = AsignarCasoQueryCountTests._grupo
+
+    def _en_paralelo(self, funcion, pks):
+        def worker(orden):
+            try:
+                for pk in orden:
+                    funcion(Case.objects.get(pk=pk))
+            finally:
+                connections.close_all()
+
+        # Cada hilo recorre los casos en un orden distinto
+        ordenes = [pks[i:] + pks[:i] for i in range(self.HILOS)]
+        with ThreadPoolExecutor(max_workers=self.HILOS) as executor:
+            list(executor.map(worker, ordenes))
+
+    def test_no_double_assignment_and_limits_respected(self):
+        grupo = self._grupo('estres', 4)
+        Medico.objects.update(casos_actuales=0)
+        pks = [
+            Case.objects.create(patient=self.patient, case_id=f'CASO-S-{i}', primary_diagnosis='Dx', medical_group=grupo).pk
+            for i in range(30)
+        ]
+
+        self._en_paralelo(AssignmentService.asignar_caso, pks)
+
+        duplicados = (
+            AsignacionAuditLog.objects.filter(decision='asignado').values('caso')
+            .annotate(n=Count('pk')).filter(n__gt=1)
+        )
+        self.assertFalse(duplicados.exists())
+        # 4 médicos con límite 3: 12 casos asignados, ninguno por encima del límite
+        self.assertEqual(Case.objects.filter(medico_asignado__isnull=False).count(), 12)
+        self.assertEqual(Medico.objects.aggregate(total=Sum('casos_actuales'))['total'], 12)
+        self.assertFalse(Medico.objects.filter(casos_actuales__gt=3).exists())
+        self.assertEqual(reconciliar_carga(dry_run=True), [])
+
+    def test_routing_claims_each_case_once(self):
+        self._grupo('Paralelo', 3)
+        pks = [
+            Case.objects.create(patient=self.patient, case_id=f'CASO-P-{i}', primary_diagnosis='Dx', specialty_required='paralelo').pk
+            for i in range(30)
+        ]
+
+        self._en_paralelo(asignar_caso_automatico, pks)
+
+        self.assertEqual(Case.objects.filter(medical_group__isnull=False).count(), 30)
+        # Una notificación por miembro y caso: ningún caso se notificó dos veces
+        self.assertEqual(Notification.objects.filter(tipo='asignacion_caso').count(), 30 * 3)
+
+
+class CandidateScoringTests(SimpleTestCase):
+    def test_scores_and_ties_match_sequential_sort(self):
+        ahora = timezone.now()
+        config = SimpleNamespace(ponderacion_carga=50, modo_estricto=False)
+        # (id, casos, capacidad, ingreso); 11 y 13 empatan con el mejor score
+        filas = [
+            (10, 5, 10, ahora - timedelta(days=100)),
+            (11, 0, 0, ahora - timedelta(days=365, hours=23)),
+            (12, 9, 10, ahora - timedelta(days=2000)),
+            (13, 0, 10, ahora - timedelta(days=365, hours=1)),
+        ]
+        scores = calcular_scores(filas, config, ahora)
+
+        esperado = []
+        for medico_id, casos, capacidad, ingreso in filas:
+            carga = min(1.0, casos / (capacidad or 1))
+            antiguedad = min(1.0, (ahora - ingreso).days / 1825)
+            esperado.append((medico_id, carga, antiguedad, 0.5 * carga - 0.5 * antiguedad))
+        self.assertEqual([scores.fila(i) for i in range(len(filas))], esperado)
+
+        orden = sorted(range(len(filas)), key=lambda i: esperado[i][3])
+        self.assertEqual(scores.top_k(1), orden[:1])
+        self.assertEqual(scores.top_k(3), orden[:3])
+        self.assertEqual(scores.top_k(10), orden)
@@ -0,0 +1,88 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from cases.models import Case, CaseDocument, StoredBlob
+from documents.pdf_redaction import redacted_text_name
+from documents.services import delete_case_files
+from documents.storage import LocalObjectStore
+
+User = get_user_model()
+
+
+class StoredBlobDeduplicationTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(username='patient1', email='patient1@example.com', password='pass', role='patient', is_active=True)
+        self.case_a = Case.objects.create(patient=self.user, case_id='CASO-BLOB-A', primary_diagnosis='Dx')
+        self.case_b = Case.objects.create(patient=self.user, case_id='CASO-BLOB-B', primary_diagnosis='Dx')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _upload(self, case, content):
+        return CaseDocument.objects.create(
+            case=case,
+            document_type='resultado_biopsia',
+            file=ContentFile(content, name='biopsia.pdf'),
+            file_name='biopsia.pdf',
+            uploaded_by=self.user,
+        )
+
+    def test_duplicates_share_one_blob_until_last_reference(self):
+        doc_a = self._upload(self.case_a, b'%PDF-1.4 biopsia')
+        doc_b = self._upload(self.case_b, b'%PDF-1.4 biopsia')
+
+        self.assertEqual(doc_a.blob_id, doc_b.blob_id)
+        self.assertEqual(doc_a.file.name, doc_b.file.name)
+        blob = StoredBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        storage = blob.file.storage
+
+        with self.captureOnCommitCallbacks(execute=True):
+            doc_a.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(storage.exists(blob.file.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            doc_b.delete()
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertFalse(storage.exists(blob.file.name))
+
+    def test_batched_case_deletion_keeps_shared_blobs(self):
+        self._upload(self.case_a, b'compartido')
+        self._upload(self.case_a, b'solo A')
+        self._upload(self.case_b, b'compartido')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            summary = delete_case_files(self.case_a, store=LocalObjectStore(root=self.media_root))
+
+        self.assertEqual(summary['documents_deleted'], 2)
+        self.assertEqual(summary['blobs_deleted'], 1)
+        self.assertEqual(summary['errors'], [])
+        self.assertFalse(CaseDocument.objects.filter(case=self.case_a).exists())
+        shared = StoredBlob.objects.get()
+        self.assertEqual(shared.ref_count, 1)
+        self.assertTrue(shared.file.storage.exists(shared.file.name))
+
+    def test_case_deletion_removes_redacted_texts_without_loading_the_case(self):
+        docs = [self._upload(self.case_a, b'uno'), self._upload(self.case_a, b'dos')]
+        CaseDocument.objects.filter(case=self.case_a).update(is_anonymized=True, anonymization_progress=100)
+        nombres = [default_storage.save(redacted_text_name(doc), ContentFile(b'[REDACTADO]')) for doc in docs]
+
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            delete_case_files(self.case_a, store=LocalObjectStore(root=self.media_root))
+
+        self.assertFalse(any(default_storage.exists(nombre) for nombre in nombres))
+        tabla_casos = f'"{Case._meta.db_table}"'
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if f'FROM {tabla_casos}' in q['sql']])
@@ -0,0 +1,135 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import pydicom
+from django.test import SimpleTestCase
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+from documents.dicom_anon import anonymize_file, anonymize_s3_object, read_header
+
+SECONDARY_CAPTURE = '1.2.840.10008.5.1.4.1.1.7'
+
+
+def _dicom():
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = SECONDARY_CAPTURE
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = SECONDARY_CAPTURE
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Modality = 'OT'
+    ds.PatientName = 'Ruiz^Marta'
+    ds.PatientID = 'HC-12345'
+    ds.PatientBirthDate = '19800101'
+    ds.OtherPatientIDs = 'CC-999'
+    ds.InstitutionAddress = 'Calle 1 # 2-3'
+    ds.private_block(0x0009, 'ONCOSEGUNDA', create=True).add_new(0x10, 'LO', 'dato privado')
+    ds.Rows = ds.Columns = 64
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = 'MONOCHROME2'
+    ds.BitsAllocated = ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 0
+    ds.PixelData = bytes(range(256)) * 32
+
+    buffer = io.BytesIO()
+    ds.save_as(buffer, enforce_file_format=True)
+    return buffer.getvalue()
+
+
+def _pixeles(contenido):
+    """Bytes desde el inicio de PixelData hasta el final del fichero."""
+    _, offset = read_header(io.BytesIO(contenido))
+    return contenido[offset:]
+
+
+class _S3EnMemoria:
+    """Lo justo de un cliente S3 para `anonymize_s3_object`."""
+
+    def __init__(self, objetos):
+        self.objetos = objetos
+        self.partes = {}
+        self.copias = []
+
+    @staticmethod
+    def _rango(rango):
+        inicio, fin = rango.removeprefix('bytes=').split('-')
+        return slice(int(inicio), int(fin) + 1)
+
+    def head_object(self, Bucket, Key):
+        return {'ContentLength': len(self.objetos[Key])}
+
+    def get_object(self, Bucket, Key, Range):
+        return {'Body': io.BytesIO(self.objetos[Key][self._rango(Range)])}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objetos[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.partes[Key] = {}
+        return {'UploadId': Key}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.partes[UploadId][PartNumber] = Body
+        return {'ETag': str(PartNumber)}
+
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceRange):
+        self.copias.append(CopySourceRange)
+        self.partes[UploadId][PartNumber] = self.objetos[CopySource['Key']][self._rango(CopySourceRange)]
+        return {'CopyPartResult': {'ETag': str(PartNumber)}}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        partes = self.partes.pop(UploadId)
+        self.objetos[Key] = b''.join(partes[p['PartNumber']] for p in MultipartUpload['Parts'])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.partes.pop(UploadId, None)
+
+
+class DicomAnonymizationTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.original = _dicom()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _assert_anonimizado(self, contenido):
+        ds = pydicom.dcmread(io.BytesIO(contenido))
+        self.assertEqual(str(ds.PatientName), '')
+        self.assertEqual(ds.PatientID, '')
+        self.assertEqual(ds.PatientBirthDate, '')
+        self.assertNotIn('OtherPatientIDs', ds)
+        self.assertNotIn('InstitutionAddress', ds)
+        self.assertFalse([e for e in ds if e.tag.is_private])
+        self.assertEqual(ds.PixelData, pydicom.dcmread(io.BytesIO(self.original)).PixelData)
+        # Los píxeles se copian tal cual, sin decodificar ni reescribir
+        self.assertEqual(_pixeles(contenido), _pixeles(self.original))
+
+    def test_local_file_blanks_phi_and_keeps_pixels(self):
+        src, dst = os.path.join(self.tmp, 'in.dcm'), os.path.join(self.tmp, 'out.dcm')
+        with open(src, 'wb') as f:
+            f.write(self.original)
+
+        anonymize_file(src, dst)
+
+        with open(dst, 'rb') as f:
+            self._assert_anonimizado(f.read())
+
+    def test_object_store_copies_pixels_server_side(self):
+        s3 = _S3EnMemoria({'cases/CASO-1/rx.dcm': self.original})
+
+        # Partes pequeñas para que la cola de píxeles vaya por upload_part_copy
+        with mock.patch.multiple('documents.dicom_anon', S3_MIN_PART_SIZE=1024, S3_COPY_PART_SIZE=2048):
+            anonymize_s3_object(s3, 'docs', 'cases/CASO-1/rx.dcm', 'anonymized/cases/CASO-1/rx.dcm', probe_size=64)
+
+        self.assertTrue(s3.copias)
+        self._assert_anonimizado(s3.objetos['anonymized/cases/CASO-1/rx.dcm'])
+        self.assertEqual(s3.objetos['cases/CASO-1/rx.dcm'], self.original)
@@ -0,0 +1,34 @@
+from django.core.files.storage import FileSystemStorage
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from cases.downloads import file_response, parse_range
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_ranges(self):
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range('bytes=0-10,20-30', 100))
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=50-500', 100), (50, 99))
+
+    def test_unsatisfiable(self):
+        with self.assertRaises(ValueError):
+            parse_range('bytes=100-', 100)
+        with self.assertRaises(ValueError):
+            parse_range('bytes=-0', 100)
+
+
+class XAccelRedirectTests(SimpleTestCase):
+    @override_settings(DOCUMENT_DOWNLOAD_X_ACCEL=True, DOCUMENT_X_ACCEL_PREFIX='/protected-media/')
+    def test_internal_uri_is_percent_encoded(self):
+        request = RequestFactory().get('/descarga/')
+        name = 'case_documents/2024/Resumen clínico ¿v2? #1.pdf'
+        response = file_response(request, FileSystemStorage(), name, '"etag"', 'application/pdf')
+
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            '/protected-media/case_documents/2024/Resumen%20cl%C3%ADnico%20%C2%BFv2%3F%20%231.pdf',
+        )
+        self.assertIn("filename*=utf-8''Resumen%20cl%C3%ADnico", response['Content-Disposition'])
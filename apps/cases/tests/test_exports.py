@@ -0,0 +1,43 @@
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models.fields.files import FieldFile
+from django.test import SimpleTestCase
+
+from cases.exports import MANIFEST_NAME, iter_zip
+
+
+class _Field(FieldFile):
+    def __init__(self, storage, name):
+        self.storage = storage
+        self.name = name
+
+
+class StreamingZipTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.storage = FileSystemStorage(location=self.root)
+        self.storage.save('a.pdf', io.BytesIO(b'%PDF-1.4 ' * 50000))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_zip_contains_entries_and_manifest(self):
+        info = {'case_id': 'CASO-1', 'document_id': 7, 'document_type': 'informe', 'file_name': 'a.pdf'}
+        entries = [
+            ('CASO-1__7__a.pdf', _Field(self.storage, 'a.pdf'), info),
+            ('CASO-1__8__b.pdf', _Field(self.storage, 'b.pdf'), dict(info, document_id=8, file_name='b.pdf')),
+        ]
+        chunks = list(iter_zip(entries))
+        self.assertGreater(len(chunks), 2)
+
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.read('CASO-1__7__a.pdf'), b'%PDF-1.4 ' * 50000)
+            manifest = json.loads(zf.read(MANIFEST_NAME))
+        self.assertEqual([f['name'] for f in manifest['files']], ['CASO-1__7__a.pdf'])
+        self.assertEqual([m['document_id'] for m in manifest['missing']], [8])
@@ -0,0 +1,26 @@
+from django.test import SimpleTestCase
+
+from documents.metadata import extract_from_chunks, sniff_mime_type
+
+
+def _trocear(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class MetadataExtractorTests(SimpleTestCase):
+    def test_pdf_pages_counted_across_chunks(self):
+        pdf = b'%PDF-1.4\n1 0 obj << /Type /Pages /Count 3 >>\n'
+        pdf += b''.join(b'%d 0 obj << /Type /Page /Parent 1 0 R >>\n' % i for i in range(2, 5))
+        pdf += b'%%EOF'
+        for size in (1, 7, 13, len(pdf)):
+            meta = extract_from_chunks(_trocear(pdf, size), 'informe.pdf')
+            self.assertEqual(meta['page_count'], 3, size)
+            self.assertEqual(meta['file_size'], len(pdf))
+            self.assertEqual(meta['mime_type'], 'application/pdf')
+
+    def test_mime_sniffed_from_content(self):
+        self.assertEqual(sniff_mime_type(b'\x89PNG\r\n\x1a\n' + b'\0' * 20, 'foto.pdf'), 'image/png')
+        self.assertEqual(sniff_mime_type(b'\0' * 128 + b'DICM', 'corte'), 'application/dicom')
+        self.assertEqual(sniff_mime_type(b'PK\x03\x04', 'informe.docx'),
+                         'application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+        self.assertEqual(sniff_mime_type(b'\xff\xfe\x00\x01', ''), 'application/octet-stream')
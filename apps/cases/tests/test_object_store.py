@@ -0,0 +1,57 @@
+import shutil
+import tempfile
+
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from documents.storage import LocalObjectStore, ObjectStore, S3ObjectStore, get_object_store
+
+
+class LocalObjectStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.store = LocalObjectStore(root=self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_tokenized_upload_round_trip(self):
+        post = self.store.presigned_post('cases/CASO-1/a.pdf', content_type='application/pdf')
+        fields = post['fields']
+
+        self.store.verify_upload_token(fields['token'], fields['key'])
+        self.store.save_upload(fields['key'], SimpleUploadedFile('a.pdf', b'%PDF'))
+
+        self.assertTrue(self.store.exists('cases/CASO-1/a.pdf'))
+        with self.assertRaises(signing.BadSignature):
+            self.store.verify_upload_token(fields['token'], 'cases/CASO-2/a.pdf')
+
+    def test_expired_token_and_path_traversal_are_rejected(self):
+        token = self.store.presigned_post('a.pdf', expires_in=-1)['fields']['token']
+        with self.assertRaises(signing.SignatureExpired):
+            self.store.verify_upload_token(token, 'a.pdf')
+        with self.assertRaises(ValueError):
+            self.store.local_path('../fuera.pdf')
+
+    def test_incomplete_backend_fails_at_instantiation(self):
+        class SoloBorrado(ObjectStore):
+            def delete(self, key):
+                pass
+
+        with self.assertRaises(TypeError):
+            SoloBorrado()
+
+
+class ObjectStoreSelectionTests(SimpleTestCase):
+    @override_settings(DOCUMENT_OBJECT_STORE=None, AWS_S3_BUCKET_NAME=None, AWS_STORAGE_BUCKET_NAME='docs-prod')
+    def test_storages_bucket_selects_s3(self):
+        store = get_object_store()
+        self.assertIsInstance(store, S3ObjectStore)
+        self.assertEqual(store.bucket, 'docs-prod')
+
+    @override_settings(DOCUMENT_OBJECT_STORE='s3', AWS_S3_BUCKET_NAME=None, AWS_STORAGE_BUCKET_NAME=None)
+    def test_s3_without_bucket_fails_loudly(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_object_store()
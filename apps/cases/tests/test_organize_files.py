@@ -0,0 +1,90 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from cases.models import Case, CaseDocument
+from documents.management.commands.organize_case_files import Command
+
+User = get_user_model()
+
+
+class OrganizeCaseFilesTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.checkpoint = os.path.join(self.media_root, 'checkpoint.json')
+        user = User.objects.create_user(username='paciente', email='paciente@example.com', password='pass', role='patient')
+        self.docs = []
+        for i in range(3):
+            case = Case.objects.create(patient=user, case_id=f'CASO-O-{i}', primary_diagnosis='Dx')
+            self.docs.append(self._documento(case, f'viejo/a{i}.pdf', uploaded_by=user))
+        # Sin archivo en disco: cuenta como error
+        self.docs.append(CaseDocument.objects.create(
+            case=case, document_type='otros_documentos', file_name='perdido.pdf', s3_file_path='viejo/perdido.pdf',
+        ))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _documento(self, case, ruta, **extra):
+        path = os.path.join(self.media_root, ruta)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(ruta.encode())
+        return CaseDocument.objects.create(
+            case=case, document_type='otros_documentos', file_name=os.path.basename(ruta), s3_file_path=ruta, **extra,
+        )
+
+    def _organizar(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('organize_case_files', '--checkpoint', self.checkpoint, '--batch-size', '1', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def _rutas(self):
+        return [CaseDocument.objects.get(pk=doc.pk).s3_file_path for doc in self.docs]
+
+    def test_dry_run_output_is_unchanged_and_touches_nothing(self):
+        out, err = self._organizar('--dry-run')
+
+        # Mismas líneas que la versión secuencial (un documento por línea)
+        self.assertEqual(out, ''.join(
+            f'FS: Caso CASO-O-{i} - mover {self.media_root}/viejo/a{i}.pdf -> {self.media_root}/cases/CASO-O-{i}/a{i}.pdf\n'
+            for i in range(3)
+        ) + 'Proceso finalizado. Moved=0 Errors=1\n')
+        self.assertEqual(
+            err, f'Archivo no encontrado en disco: {self.media_root}/viejo/perdido.pdf (CaseDocument id={self.docs[3].pk})\n'
+        )
+        self.assertEqual(self._rutas(), ['viejo/a0.pdf', 'viejo/a1.pdf', 'viejo/a2.pdf', 'viejo/perdido.pdf'])
+        self.assertFalse(os.path.exists(self.checkpoint))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'cases')))
+
+    def test_resume_skips_documents_already_moved(self):
+        copiar = Command._copiar
+
+        def cortar_en_el_segundo(command, movimiento):
+            if movimiento[0].pk == self.docs[1].pk:
+                raise KeyboardInterrupt
+            return copiar(command, movimiento)
+
+        with mock.patch.object(Command, '_copiar', cortar_en_el_segundo), self.assertRaises(KeyboardInterrupt):
+            self._organizar()
+        with open(self.checkpoint, encoding='utf-8') as f:
+            self.assertEqual(json.load(f), {'filtros': {'s3': False}, 'ultimo_pk': self.docs[0].pk, 'fallidos': []})
+        self.assertEqual(self._rutas()[:2], ['cases/CASO-O-0/a0.pdf', 'viejo/a1.pdf'])
+
+        with mock.patch.object(Command, '_copiar', autospec=True, side_effect=copiar) as espia:
+            out, _ = self._organizar()
+
+        self.assertIn(f'Reanudando tras el documento {self.docs[0].pk}', out)
+        self.assertEqual([c.args[1][0].pk for c in espia.call_args_list], [self.docs[1].pk, self.docs[2].pk])
+        self.assertIn('Proceso finalizado. Moved=2 Errors=1', out)
+        self.assertEqual(self._rutas(), ['cases/CASO-O-0/a0.pdf', 'cases/CASO-O-1/a1.pdf', 'cases/CASO-O-2/a2.pdf', 'viejo/perdido.pdf'])
@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from cases.templatetags.math_filters import has_rendition
+from documents.renditions import enqueue_renditions, rendition_name
+
+
+def _doc(file_name, mime_type='', stored=True):
+    return SimpleNamespace(
+        file_name=file_name, mime_type=mime_type, has_stored_file=stored, file=SimpleNamespace(name=file_name),
+    )
+
+
+class RenditionTests(SimpleTestCase):
+    def test_only_images_and_dicom_get_thumbnails(self):
+        self.assertTrue(has_rendition(_doc('rx.jpg', 'image/jpeg')))
+        self.assertTrue(has_rendition(_doc('serie', 'application/dicom')))
+        self.assertTrue(has_rendition(_doc('corte.dcm')))
+        self.assertFalse(has_rendition(_doc('informe.pdf', 'application/pdf')))
+        self.assertFalse(has_rendition(_doc('rx.jpg', 'image/jpeg', stored=False)))
+        self.assertEqual(rendition_name('a/rx.jpg', 'thumb'), 'a/rx.jpg.thumb.jpg')
+
+    def test_enqueue_is_debounced_per_document(self):
+        cache.clear()
+        # Generación ya encolada hace poco: las peticiones siguientes no encolan otra
+        cache.add('renditions:encolado:7', True)
+        self.assertFalse(enqueue_renditions(7))
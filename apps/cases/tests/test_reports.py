@@ -0,0 +1,177 @@
+import json
+import os
+import shutil
+import tempfile
+from tempfile import SpooledTemporaryFile
+from types import SimpleNamespace
+from datetime import date, datetime
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from cases.mdt_services import MDTResponseService
+from cases.models import Case, FinalReport, MedicalOpinion
+from cases.reports import build_report_payload, compute_input_digest, determinar_conformidad, render_report_pdf_bytes
+from medicos.models import Medico
+
+User = get_user_model()
+
+
+def _opinion(nombre, voto, comentario=''):
+    displays = {'acuerdo': 'De acuerdo', 'desacuerdo': 'En desacuerdo', 'abstencion': 'Abstención'}
+    return SimpleNamespace(
+        voto=voto,
+        comentario_privado=comentario,
+        doctor=SimpleNamespace(nombre_completo=nombre),
+        get_voto_display=lambda: displays[voto],
+    )
+
+
+class ReportPayloadTests(SimpleTestCase):
+    def test_determinar_conformidad(self):
+        self.assertEqual(determinar_conformidad(3, 1)[0], 'acuerdo')
+        self.assertEqual(determinar_conformidad(1, 3)[0], 'desacuerdo')
+        self.assertEqual(determinar_conformidad(2, 2)[0], 'consenso_parcial')
+
+    def test_payload_is_plain_data(self):
+        caso = SimpleNamespace(
+            case_id='CASO-TEST',
+            created_at=datetime(2026, 3, 1),
+            tipo_cancer=None,
+            primary_diagnosis='Adenocarcinoma',
+        )
+        opiniones = [
+            _opinion('Ana Ruiz', 'acuerdo', 'Conforme'),
+            _opinion('Luis Gil', 'acuerdo'),
+            _opinion('Eva Sanz', 'abstencion'),
+        ]
+
+        payload = build_report_payload(caso, opiniones)
+
+        self.assertEqual(payload['case_id'], 'CASO-TEST')
+        self.assertEqual(payload['fecha_solicitud'], '01/03/2026')
+        self.assertEqual(payload['tipo_cancer'], 'No especificado')
+        self.assertEqual((payload['votos_acuerdo'], payload['votos_desacuerdo'], payload['votos_abstencion']), (2, 0, 1))
+        self.assertEqual(payload['conclusion'], 'acuerdo')
+        self.assertEqual(payload['opiniones'][0], {'medico': 'Ana Ruiz', 'voto': 'De acuerdo', 'comentario': 'Conforme'})
+
+    def test_input_digest_is_stable(self):
+        payload = {'case_id': 'CASO-TEST', 'opiniones': [{'medico': 'Ana Ruiz', 'voto': 'De acuerdo'}]}
+        reordenado = {'opiniones': [{'voto': 'De acuerdo', 'medico': 'Ana Ruiz'}], 'case_id': 'CASO-TEST'}
+
+        digest = compute_input_digest(payload)
+
+        self.assertEqual(len(digest), 64)
+        self.assertEqual(digest, compute_input_digest(reordenado))
+        self.assertNotEqual(digest, compute_input_digest(payload, template_version='otra'))
+        self.assertNotEqual(digest, compute_input_digest({**payload, 'case_id': 'CASO-OTRO'}))
+
+
+def _medico():
+    usuario = User.objects.create_user(username='medico', email='medico@example.com', password='pass', role='doctor')
+    return Medico.objects.create(
+        usuario=usuario, numero_documento='R1', nombres='Ana', apellidos='Ruiz',
+        fecha_nacimiento=date(1980, 1, 1), genero='otro', registro_medico='RM-R-1',
+        institucion_actual='Hospital', telefono='3000000000',
+    )
+
+
+class RegenerateReportsCommandTests(TransactionTestCase):
+    # TransactionTestCase: el comando cierra las conexiones antes de crear el pool
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.checkpoint = os.path.join(self.media_root, 'checkpoint.json')
+        patient = User.objects.create_user(username='paciente', email='paciente@example.com', password='pass', role='patient')
+        medico = _medico()
+        self.case_ids = [f'CASO-R-{i}' for i in range(3)]
+        for case_id in self.case_ids:
+            caso = Case.objects.create(patient=patient, case_id=case_id, primary_diagnosis='Dx', responsable=medico)
+            MedicalOpinion.objects.create(case=caso, doctor=medico, voto='acuerdo')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _regenerar(self):
+        out = StringIO()
+        call_command(
+            'regenerate_reports', '--workers', '1', '--batch-size', '1', '--checkpoint', self.checkpoint,
+            stdout=out, stderr=StringIO(),
+        )
+        return out.getvalue()
+
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        def cortar_en_el_segundo(payload):
+            if payload['case_id'] == 'CASO-R-1':
+                raise KeyboardInterrupt
+            return render_report_pdf_bytes(payload)
+
+        renderizar = 'core.management.commands.regenerate_reports.render_report_pdf_bytes'
+        with mock.patch(renderizar, side_effect=cortar_en_el_segundo), self.assertRaises(KeyboardInterrupt):
+            self._regenerar()
+        with open(self.checkpoint, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['procesados'], ['CASO-R-0'])
+        self.assertEqual(list(FinalReport.objects.values_list('case__case_id', flat=True)), ['CASO-R-0'])
+
+        with mock.patch(renderizar, side_effect=render_report_pdf_bytes) as render:
+            out = self._regenerar()
+
+        self.assertIn('Casos seleccionados: 3 (ya procesados: 1, pendientes: 2)', out)
+        self.assertEqual([c.args[0]['case_id'] for c in render.call_args_list], ['CASO-R-1', 'CASO-R-2'])
+        self.assertIn('Generados=2 SinCambios=0 Errores=0', out)
+        self.assertEqual(FinalReport.objects.count(), 3)
+        for informe in FinalReport.objects.all():
+            with informe.pdf_file.open('rb') as f:
+                self.assertTrue(f.read().startswith(b'%PDF'))
+        with open(self.checkpoint, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['procesados'], self.case_ids)
+
+
+class ResponsePdfTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        patient = User.objects.create_user(username='paciente', email='paciente@example.com', password='pass', role='patient')
+        self.responsable = _medico()
+        self.caso = Case.objects.create(patient=patient, case_id='CASO-P-1', primary_diagnosis='Dx', responsable=self.responsable)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _responder(self):
+        spools = []
+
+        def spool(*args, **kwargs):
+            spools.append(SpooledTemporaryFile(*args, **kwargs))
+            return spools[-1]
+
+        with mock.patch('tempfile.SpooledTemporaryFile', side_effect=spool):
+            resultado = MDTResponseService.generar_y_enviar_respuesta(self.caso, self.responsable, 'conformidad')
+        self.assertTrue(resultado['success'], resultado.get('error'))
+        return resultado, spools
+
+    def test_spooled_pdf_is_stored_attached_and_closed(self):
+        resultado, spools = self._responder()
+
+        self.assertEqual(len(spools), 1)
+        self.assertTrue(spools[0].closed)
+        informe = FinalReport.objects.get(case=self.caso)
+        self.assertEqual(resultado['pdf_path'], informe.pdf_file.url)
+        with informe.pdf_file.open('rb') as f:
+            pdf = f.read()
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        self.assertEqual(mail.outbox[0].attachments, [('informe_segunda_opinion.pdf', pdf, 'application/pdf')])
+
+        # Mismas entradas: se reenvía el PDF almacenado sin volver a generarlo
+        _, spools = self._responder()
+        self.assertEqual(spools, [])
+        self.assertEqual(mail.outbox[1].attachments, [('informe_segunda_opinion.pdf', pdf, 'application/pdf')])
+        self.assertEqual(FinalReport.objects.get(case=self.caso).pdf_file.name, informe.pdf_file.name)
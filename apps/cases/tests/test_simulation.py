@@ -0,0 +1,54 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from cases.simulation import Candidato, Llegada, gini, llegadas_sinteticas, simular
+
+
+class GiniTests(SimpleTestCase):
+    def test_extremes(self):
+        self.assertEqual(gini([3, 3, 3]), 0.0)
+        self.assertEqual(gini([]), 0.0)
+        self.assertAlmostEqual(gini([0, 0, 0, 12]), 0.75)
+
+
+class SimularTests(SimpleTestCase):
+    def setUp(self):
+        self.ahora = timezone.now()
+        self.grupos = {
+            1: [
+                Candidato(10, 'Veterano', 10, self.ahora - timedelta(days=2000), True, True),
+                Candidato(11, 'Nuevo', 10, self.ahora - timedelta(days=10), True, True),
+                Candidato(12, 'No disponible', 10, self.ahora - timedelta(days=10), False, True),
+            ],
+        }
+
+    def _config(self, **cambios):
+        valores = dict(ponderacion_carga=100, modo_estricto=False, limite_mensual_por_medico=5, respetar_disponibilidad=True)
+        valores.update(cambios)
+        return SimpleNamespace(**valores)
+
+    def test_load_weighting_spreads_cases_and_strict_mode_concentrates_them(self):
+        llegadas = [Llegada(self.ahora + timedelta(hours=i), 1) for i in range(6)]
+
+        reparto = simular(llegadas, self.grupos, self._config())
+        self.assertEqual(reparto['asignados'], 6)
+        self.assertEqual({m['medico_id']: m['asignados'] for m in reparto['medicos']}, {10: 3, 11: 3})
+        self.assertEqual(reparto['gini'], 0.0)
+
+        estricto = simular(llegadas, self.grupos, self._config(modo_estricto=True))
+        self.assertEqual({m['medico_id']: m['asignados'] for m in estricto['medicos']}, {10: 5, 11: 1})
+        self.assertGreater(estricto['gini'], reparto['gini'])
+
+    def test_finished_cases_release_load(self):
+        llegadas = [Llegada(self.ahora + timedelta(days=i), 1, timedelta(hours=1)) for i in range(20)]
+        resultado = simular(llegadas, self.grupos, self._config(modo_estricto=True, limite_mensual_por_medico=1))
+        self.assertEqual(resultado['sin_candidato'], 0)
+        self.assertEqual(resultado['medicos'][0]['carga_max'], 1)
+
+    def test_synthetic_arrivals_are_reproducible(self):
+        a = llegadas_sinteticas([1, 2], 50, seed=7, inicio=self.ahora)
+        self.assertEqual(a, llegadas_sinteticas([2, 1], 50, seed=7, inicio=self.ahora))
+        self.assertEqual([l.fecha for l in a], sorted(l.fecha for l in a))
@@ -0,0 +1,97 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from cases.uploads import ChunkedUploadError, ChunkedUploadService
+
+
+class ChunkedUploadServiceTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.settings_override = override_settings(CHUNKED_UPLOAD_DIR=self.tmpdir)
+        self.settings_override.enable()
+        self.user = SimpleNamespace(pk=1)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_resume_after_offset_mismatch(self):
+        data = b'0123456789' * 10
+        upload_id = ChunkedUploadService.iniciar(self.user, 'serie.dcm', len(data), 'imagenes')['upload_id']
+
+        ChunkedUploadService.anexar(self.user, upload_id, 0, io.BytesIO(data[:40]), 40)
+        with self.assertRaises(ChunkedUploadError) as ctx:
+            ChunkedUploadService.anexar(self.user, upload_id, 60, io.BytesIO(data[60:]), 40)
+        self.assertEqual((ctx.exception.status, ctx.exception.offset), (409, 40))
+
+        # Reintento de un fragmento ya recibido: no duplica datos
+        ChunkedUploadService.anexar(self.user, upload_id, 0, io.BytesIO(data[:40]), 40)
+        estado = ChunkedUploadService.anexar(self.user, upload_id, 40, io.BytesIO(data[40:]), 60)
+        self.assertTrue(estado['complete'])
+
+        meta, f = ChunkedUploadService.abrir_completo(self.user, upload_id)
+        with f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(meta['document_type'], 'imagenes')
+
+    def test_other_user_cannot_access_upload(self):
+        upload_id = ChunkedUploadService.iniciar(self.user, 'a.pdf', 10, 'otros_documentos')['upload_id']
+        with self.assertRaises(ChunkedUploadError) as ctx:
+            ChunkedUploadService.estado(SimpleNamespace(pk=2), upload_id)
+        self.assertEqual(ctx.exception.status, 404)
+
+    def test_cleanup_removes_only_abandoned_uploads(self):
+        viejo = ChunkedUploadService.iniciar(self.user, 'viejo.pdf', 10, 'otros_documentos')['upload_id']
+        nuevo = ChunkedUploadService.iniciar(self.user, 'nuevo.pdf', 10, 'otros_documentos')['upload_id']
+        hace_dos_dias = time.time() - 2 * 24 * 3600
+        directorio = os.path.join(self.tmpdir, viejo)
+        for ruta in [directorio] + [os.path.join(directorio, n) for n in os.listdir(directorio)]:
+            os.utime(ruta, (hace_dos_dias, hace_dos_dias))
+
+        self.assertEqual(ChunkedUploadService.limpiar_abandonadas(), 1)
+        with self.assertRaises(ChunkedUploadError):
+            ChunkedUploadService.estado(self.user, viejo)
+        self.assertEqual(ChunkedUploadService.estado(self.user, nuevo)['offset'], 0)
+
+
+class ChunkedUploadCompleteViewTests(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.settings_override = override_settings(CHUNKED_UPLOAD_DIR=self.tmpdir)
+        self.settings_override.enable()
+        self.user = get_user_model().objects.create_user(
+            username='paciente', email='paciente@example.com', password='pass', role='patient', is_active=True
+        )
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_incomplete_upload_reports_offset(self):
+        upload_id = ChunkedUploadService.iniciar(self.user, 'a.pdf', 8, 'otros_documentos')['upload_id']
+        ChunkedUploadService.anexar(self.user, upload_id, 0, io.BytesIO(b'%PDF'), 4)
+
+        response = self.client.post(reverse('cases:sop_upload_complete', args=[upload_id]))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {'error': 'La subida no está completa', 'offset': 4})
+
+    def test_upload_is_kept_when_no_document_is_created(self):
+        upload_id = ChunkedUploadService.iniciar(self.user, 'a.pdf', 4, 'otros_documentos')['upload_id']
+        ChunkedUploadService.anexar(self.user, upload_id, 0, io.BytesIO(b'%PDF'), 4)
+
+        # Sin caso borrador en la sesión no hay dónde guardar el documento
+        response = self.client.post(reverse('cases:sop_upload_complete', args=[upload_id]))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 4)
+        self.assertTrue(ChunkedUploadService.estado(self.user, upload_id)['complete'])
@@ -0,0 +1,133 @@
+from datetime import date
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+
+from cases.consumers import MDTChatConsumer
+from cases.mdt_models import ConsensusVote, ConsensusWorkflow
+from cases.mdt_services import ConsensusService
+from cases.models import Case, MedicalOpinion
+from cases.vote_tally import grupo_caso, programar_publicacion, publicar_conteo
+from cases.voting import verificar_conteos
+from medicos.models import Medico
+
+User = get_user_model()
+
+
+class VoteTallyTests(TestCase):
+    def setUp(self):
+        patient = User.objects.create_user(username='paciente', email='paciente@example.com', password='pass', role='patient')
+        caso = Case.objects.create(patient=patient, case_id='CASO-V-1', primary_diagnosis='Dx')
+        self.workflow = ConsensusWorkflow.objects.create(caso=caso, fase='VOTACION')
+        self.medicos = []
+        for i in range(2):
+            usuario = User.objects.create_user(username=f'voto-{i}', email=f'voto-{i}@example.com', password='pass', role='doctor')
+            self.medicos.append(Medico.objects.create(
+                usuario=usuario, numero_documento=f'V{i}', nombres='Médico', apellidos=str(i),
+                fecha_nacimiento=date(1980, 1, 1), genero='otro', registro_medico=f'RM-V-{i}',
+                institucion_actual='Hospital', telefono='3000000000',
+            ))
+
+    def _conteos(self):
+        return (self.workflow.votos_a_favor, self.workflow.votos_en_contra, self.workflow.abstenciones)
+
+    def test_vote_changes_apply_deltas(self):
+        uno, dos = self.medicos
+        ConsensusService.emitir_voto(self.workflow, uno, 'aprueba')
+        ConsensusService.emitir_voto(self.workflow, dos, 'abstiene')
+        self.assertEqual(self._conteos(), (1, 0, 1))
+
+        # Cambiar de categoría mueve un voto; dentro de la misma no cambia nada
+        ConsensusService.emitir_voto(self.workflow, uno, 'contraindicado', 'Riesgo quirúrgico')
+        self.assertEqual(self._conteos(), (0, 1, 1))
+        ConsensusService.emitir_voto(self.workflow, uno, 'alternativa', 'Riesgo quirúrgico')
+        self.assertEqual(self._conteos(), (0, 1, 1))
+        self.assertEqual(ConsensusVote.objects.filter(workflow=self.workflow).count(), 2)
+
+        self.workflow.refresh_from_db()
+        self.assertEqual(self._conteos(), (0, 1, 1))
+        self.assertEqual(verificar_conteos(), [])
+
+    def test_verifier_fixes_drift(self):
+        uno, dos = self.medicos
+        ConsensusService.emitir_voto(self.workflow, uno, 'aprueba')
+        ConsensusService.emitir_voto(self.workflow, dos, 'aprueba_mod')
+        ConsensusVote.objects.filter(medico=dos).delete()
+
+        self.assertEqual(verificar_conteos(dry_run=True), [(self.workflow.pk, {'votos_a_favor': (2, 1)})])
+        self.assertEqual(verificar_conteos(), [(self.workflow.pk, {'votos_a_favor': (2, 1)})])
+        self.workflow.refresh_from_db()
+        self.assertEqual(self._conteos(), (1, 0, 0))
+        self.assertEqual(verificar_conteos(), [])
+
+
+class VoteTallyBroadcastTests(TestCase):
+    setUp = VoteTallyTests.setUp
+
+    def test_publishes_compact_tally_to_case_room_once_per_window(self):
+        cache.clear()
+        caso = self.workflow.caso
+        uno, dos = self.medicos
+        MedicalOpinion.objects.create(case=caso, doctor=uno, voto='acuerdo')
+        MedicalOpinion.objects.create(case=caso, doctor=dos, voto='abstencion')
+        ConsensusService.emitir_voto(self.workflow, uno, 'aprueba')
+
+        capa = get_channel_layer()
+        canal = async_to_sync(capa.new_channel)()
+        async_to_sync(capa.group_add)(grupo_caso(caso.case_id), canal)
+
+        # Con una publicación pendiente, las escrituras siguientes no encolan otra
+        cache.add(f'mdt:tally:pendiente:{caso.pk}', True)
+        self.assertFalse(programar_publicacion(caso.pk))
+
+        publicar_conteo(caso.pk)
+        mensaje = async_to_sync(capa.receive)(canal)
+        self.assertEqual(mensaje['type'], 'vote_tally')
+        self.assertEqual(mensaje['conteo'], {
+            'case_id': caso.case_id,
+            'opiniones': {'acuerdo': 1, 'desacuerdo': 0, 'abstencion': 1},
+            'consenso': {'fase': 'VOTACION', 'a_favor': 1, 'en_contra': 0, 'abstenciones': 0},
+        })
+        self.assertIsNone(cache.get(f'mdt:tally:pendiente:{caso.pk}'))
+
+
+class TallyListenerTests(TransactionTestCase):
+    def setUp(self):
+        patient = User.objects.create_user(username='paciente', email='paciente@example.com', password='pass', role='patient')
+        self.doctor = User.objects.create_user(username='medico', email='medico@example.com', password='pass', role='doctor')
+        self.ajeno = User.objects.create_user(username='ajeno', email='ajeno@example.com', password='pass', role='doctor')
+        Case.objects.create(patient=patient, case_id='CASO-V-9', primary_diagnosis='Dx', doctor=self.doctor)
+
+    def _cliente(self, query='', user=None):
+        cliente = WebsocketCommunicator(MDTChatConsumer.as_asgi(), f'/ws/mdt/1/caso/CASO-V-9/{query}')
+        cliente.scope['url_route'] = {'kwargs': {'grupo_id': '1', 'caso_id': 'CASO-V-9'}}
+        cliente.scope['user'] = user
+        return cliente
+
+    def test_tally_listener_joins_silently_and_gets_tallies(self):
+        async def flujo():
+            miembro = self._cliente()
+            await miembro.connect()
+            await miembro.receive_json_from()  # su propio aviso de conexión
+
+            # Solo escuchan quienes pueden ver el caso
+            for user in (None, self.ajeno):
+                conectado, _ = await self._cliente('?modo=conteo', user).connect()
+                self.assertFalse(conectado)
+
+            oyente = self._cliente('?modo=conteo', self.doctor)
+            conectado, _ = await oyente.connect()
+            self.assertTrue(conectado)
+            # El detalle del caso no publica "Usuario conectado" en el chat
+            self.assertTrue(await miembro.receive_nothing())
+
+            await get_channel_layer().group_send(grupo_caso('CASO-V-9'), {'type': 'vote_tally', 'conteo': {'case_id': 'CASO-V-9'}})
+            self.assertEqual(await oyente.receive_json_from(), {'type': 'vote_tally', 'conteo': {'case_id': 'CASO-V-9'}})
+            await oyente.disconnect()
+            await miembro.disconnect()
+
+        async_to_sync(flujo)()
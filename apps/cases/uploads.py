@@ -0,0 +1,226 @@
+"""
+Subidas por fragmentos (chunked) y reanudables de documentos de un caso.
+
+El cliente abre una subida indicando nombre y tamaño total, envía el archivo
+en fragmentos con su offset y, al terminar, pide ensamblarlo. Los fragmentos
+se anexan a un archivo parcial en disco local; el offset actual es el tamaño
+de ese archivo, de modo que tras un corte el cliente consulta el estado y
+continúa desde ahí. El ensamblado final copia el parcial al storage
+configurado por bloques, sin cargarlo entero en memoria.
+
+Las subidas abandonadas se borran con `limpiar_abandonadas`
+(`cleanup_chunked_uploads_task`, cada hora).
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows (desarrollo): sin cerrojo entre procesos
+    fcntl = None
+
+from django.conf import settings
+from django.core.files import File
+
+
+class ChunkedUploadError(Exception):
+    """Error de una subida por fragmentos (offset inválido, subida inexistente...)."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class ChunkedUploadService:
+    """
+    Gestiona el estado de las subidas por fragmentos en disco local.
+
+    Cada subida ocupa un directorio `<CHUNKED_UPLOAD_DIR>/<upload_id>/` con
+    `meta.json` (propietario, nombre, tipo y tamaño total) y `data.part`.
+    """
+
+    @staticmethod
+    def base_dir():
+        return getattr(settings, 'CHUNKED_UPLOAD_DIR', os.path.join(settings.BASE_DIR, 'tmp', 'chunked_uploads'))
+
+    @staticmethod
+    def max_size():
+        # Límite del archivo completo; cada fragmento por separado queda
+        # por debajo de client_max_body_size de nginx
+        return getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024)
+
+    @staticmethod
+    def chunk_size():
+        return getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)
+
+    @staticmethod
+    def _dir(upload_id):
+        # upload_id es siempre un uuid hex; validarlo evita rutas arbitrarias
+        try:
+            upload_id = uuid.UUID(hex=str(upload_id)).hex
+        except ValueError:
+            raise ChunkedUploadError('Subida no encontrada', status=404)
+        return os.path.join(ChunkedUploadService.base_dir(), upload_id)
+
+    @staticmethod
+    def _part_path(upload_id):
+        return os.path.join(ChunkedUploadService._dir(upload_id), 'data.part')
+
+    @staticmethod
+    def iniciar(user, file_name, file_size, document_type):
+        """Crea una subida vacía y devuelve su estado."""
+        file_name = os.path.basename(file_name or '').strip()
+        if not file_name:
+            raise ChunkedUploadError('Nombre de archivo requerido')
+        try:
+            file_size = int(file_size)
+        except (TypeError, ValueError):
+            raise ChunkedUploadError('Tamaño de archivo inválido')
+        if file_size <= 0 or file_size > ChunkedUploadService.max_size():
+            raise ChunkedUploadError('Tamaño de archivo fuera de rango')
+
+        upload_id = uuid.uuid4().hex
+        path = ChunkedUploadService._dir(upload_id)
+        os.makedirs(path)
+        meta = {
+            'user_id': user.pk,
+            'file_name': file_name,
+            'file_size': file_size,
+            'document_type': document_type,
+        }
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        open(ChunkedUploadService._part_path(upload_id), 'wb').close()
+        return ChunkedUploadService.estado(user, upload_id)
+
+    @staticmethod
+    def _meta(user, upload_id):
+        try:
+            with open(os.path.join(ChunkedUploadService._dir(upload_id), 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise ChunkedUploadError('Subida no encontrada', status=404)
+        if meta.get('user_id') != user.pk:
+            raise ChunkedUploadError('Subida no encontrada', status=404)
+        return meta
+
+    @staticmethod
+    def estado(user, upload_id):
+        """Devuelve `{upload_id, offset, file_size, chunk_size, complete}`."""
+        meta = ChunkedUploadService._meta(user, upload_id)
+        offset = os.path.getsize(ChunkedUploadService._part_path(upload_id))
+        return {
+            'upload_id': uuid.UUID(hex=str(upload_id)).hex,
+            'offset': offset,
+            'file_size': meta['file_size'],
+            'chunk_size': ChunkedUploadService.chunk_size(),
+            'complete': offset == meta['file_size'],
+        }
+
+    @staticmethod
+    def anexar(user, upload_id, offset, stream, length):
+        """
+        Anexa un fragmento en `offset`.
+
+        El offset debe coincidir con el tamaño actual del parcial; si no,
+        se lanza un error 409 con el offset correcto para que el cliente
+        reanude desde ahí. Reenviar un fragmento ya recibido es idempotente.
+        """
+        meta = ChunkedUploadService._meta(user, upload_id)
+        with open(ChunkedUploadService._part_path(upload_id), 'ab') as f:
+            # Comprobar el offset y anexar bajo un cerrojo exclusivo: dos
+            # reintentos simultáneos del mismo fragmento no pueden anexar ambos
+            _bloquear(f)
+            try:
+                ChunkedUploadService._anexar_bloqueado(f, meta, offset, stream, length)
+            finally:
+                _desbloquear(f)
+        return ChunkedUploadService.estado(user, upload_id)
+
+    @staticmethod
+    def _anexar_bloqueado(f, meta, offset, stream, length):
+        actual = os.fstat(f.fileno()).st_size
+        try:
+            offset = int(offset)
+            length = int(length)
+        except (TypeError, ValueError):
+            raise ChunkedUploadError('Offset inválido', offset=actual)
+
+        if offset + length <= actual:
+            # Fragmento duplicado (reintento tras perder la respuesta)
+            return
+        if offset != actual:
+            raise ChunkedUploadError('Offset no coincide', status=409, offset=actual)
+        if length <= 0 or offset + length > meta['file_size']:
+            raise ChunkedUploadError('Fragmento fuera de rango', offset=actual)
+
+        escritos = 0
+        while escritos < length:
+            bloque = stream.read(min(64 * 1024, length - escritos))
+            if not bloque:
+                break
+            f.write(bloque)
+            escritos += len(bloque)
+        if escritos != length:
+            # Cuerpo truncado: descartar lo escrito para no dejar el parcial corrupto
+            f.truncate(actual)
+            raise ChunkedUploadError('Fragmento incompleto', offset=actual)
+        f.flush()
+
+    @staticmethod
+    def abrir_completo(user, upload_id):
+        """
+        Devuelve `(meta, File)` del archivo ensamblado, listo para asignarlo
+        a un FileField. El llamador debe cerrar el File y llamar a `descartar`.
+        """
+        meta = ChunkedUploadService._meta(user, upload_id)
+        part_path = ChunkedUploadService._part_path(upload_id)
+        offset = os.path.getsize(part_path)
+        if offset != meta['file_size']:
+            raise ChunkedUploadError('La subida no está completa', status=409, offset=offset)
+        return meta, File(open(part_path, 'rb'), name=meta['file_name'])
+
+    @staticmethod
+    def descartar(user, upload_id):
+        """Elimina el estado de la subida."""
+        ChunkedUploadService._meta(user, upload_id)
+        shutil.rmtree(ChunkedUploadService._dir(upload_id), ignore_errors=True)
+
+    @staticmethod
+    def limpiar_abandonadas(max_age=None):
+        """
+        Elimina las subidas sin actividad desde hace `max_age` segundos
+        (`CHUNKED_UPLOAD_EXPIRY`, 24 h por defecto). Devuelve cuántas borró.
+        """
+        if max_age is None:
+            max_age = getattr(settings, 'CHUNKED_UPLOAD_EXPIRY', 24 * 3600)
+        base = ChunkedUploadService.base_dir()
+        if not os.path.isdir(base):
+            return 0
+        limite = time.time() - max_age
+        borradas = 0
+        for entrada in os.scandir(base):
+            if not entrada.is_dir():
+                continue
+            # Cada fragmento anexado actualiza el mtime de data.part
+            rutas = [entrada.path] + [os.path.join(entrada.path, n) for n in ('meta.json', 'data.part')]
+            ultima = max((os.path.getmtime(r) for r in rutas if os.path.exists(r)), default=0)
+            if ultima < limite:
+                shutil.rmtree(entrada.path, ignore_errors=True)
+                borradas += 1
+        return borradas
+
+
+def _bloquear(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+def _desbloquear(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
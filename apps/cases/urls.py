@@ -37,6 +37,8 @@ urlpatterns = [
     
     # Documentos
     path('document/download/<int:doc_id>/', views.download_document, name='download_document'),
+    path('document/<int:doc_id>/rendition/<str:variant>/', views.document_rendition, name='document_rendition'),
+    path('case/<str:case_id>/documents.zip', views.export_case_documents, name='export_case_documents'),
     
     # Consentimiento informado
     path('consentimiento/', views.consentimiento_informado_view, name='consentimiento_info'),
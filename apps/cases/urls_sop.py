@@ -7,4 +7,7 @@ urlpatterns = [
     path('sop/step-2/', views_sop.sop_step2, name='sop_step2'),
     path('sop/step-3/', views_sop.sop_step3, name='sop_step3'),
     path('sop/step-4/', views_sop.sop_step4, name='sop_step4'),
+    path('sop/uploads/', views_sop.sop_upload_start, name='sop_upload_start'),
+    path('sop/uploads/<str:upload_id>/', views_sop.sop_upload_chunk, name='sop_upload_chunk'),
+    path('sop/uploads/<str:upload_id>/complete/', views_sop.sop_upload_complete, name='sop_upload_complete'),
 ]
@@ -2,13 +2,13 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import Http404, HttpResponseRedirect, FileResponse
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.urls import reverse
 from django.utils import timezone
 
 from .models import Case
 from .mdt_models import MDTMessage
-from .services import CaseService, PENDING_CASE_STATUSES, COMPLETED_CASE_STATUSES, es_lider_del_caso, user_can_access_case_document
+from .services import CaseService, PENDING_CASE_STATUSES, COMPLETED_CASE_STATUSES, es_lider_del_caso, user_can_access_case, user_can_access_case_document
 
 
 class PatientDashboardView(LoginRequiredMixin, View):
@@ -336,6 +336,11 @@ class DoctorCaseDetailView(LoginRequiredMixin, View):
         # Obtener opiniones de los miembros del comité
         from .models import MedicalOpinion
         opiniones = MedicalOpinion.objects.filter(case=case)
+        conteo_opiniones = {}
+        for opinion in opiniones:
+            conteo_opiniones[opinion.voto] = conteo_opiniones.get(opinion.voto, 0) + 1
+        from .mdt_models import ConsensusWorkflow
+        workflow_consenso = ConsensusWorkflow.objects.filter(caso=case).first()
         
         # Obtener la opinión del médico actual (si existe)
         try:
@@ -376,6 +381,8 @@ class DoctorCaseDetailView(LoginRequiredMixin, View):
             'patient_genero': patient_genero,
             'documents': list(case.documents.all()),  # Convertir QuerySet a lista
             'opiniones': opiniones,
+            'conteo_opiniones': conteo_opiniones,
+            'workflow_consenso': workflow_consenso,
             'opinion_medico_actual': opinion_medico_actual,
             'es_responsable': es_responsable,
             'opinion': getattr(case, 'second_opinion', None),
@@ -435,24 +442,73 @@ def download_document(request, doc_id):
     """Sirve el archivo del caso a usuarios autorizados."""
     from .models import CaseDocument
 
-    doc = get_object_or_404(CaseDocument, pk=doc_id)
+    doc = get_object_or_404(CaseDocument.objects.select_related('blob'), pk=doc_id)
     if not user_can_access_case_document(request.user, doc):
         raise Http404('No tienes permiso para descargar este documento.')
     if not doc.has_stored_file:
         raise Http404('Archivo no disponible')
 
+    # Range/ETag y, si está activado, entrega delegada a nginx (X-Accel-Redirect)
+    from .downloads import document_response
     try:
-        content_type = doc.mime_type or None
-        return FileResponse(
-            doc.file.open('rb'),
-            as_attachment=True,
-            filename=doc.file_name,
-            content_type=content_type,
-        )
-    except Exception:
+        return document_response(request, doc)
+    except (FileNotFoundError, OSError):
         raise Http404('Archivo no disponible')
 
 
+@login_required
+def document_rendition(request, doc_id, variant):
+    """
+    Sirve la miniatura (`thumb`) o versión media (`medium`) de un documento
+    de imagen. Si aún no existe, encola su generación y responde 202 para
+    que la plantilla muestre el icono genérico.
+    """
+    from .models import CaseDocument
+    from documents.renditions import RENDITION_SIZES, enqueue_renditions, rendition_name, source_kind
+
+    if variant not in RENDITION_SIZES:
+        raise Http404()
+    doc = get_object_or_404(CaseDocument.objects.select_related('blob'), pk=doc_id)
+    if not user_can_access_case_document(request.user, doc):
+        raise Http404('No tienes permiso para ver este documento.')
+    if not doc.has_stored_file or source_kind(doc) is None:
+        raise Http404()
+
+    storage = doc.file.storage
+    name = rendition_name(doc.file.name, variant)
+    if not storage.exists(name):
+        enqueue_renditions(doc.pk)
+        response = HttpResponse(status=202)
+        response['Retry-After'] = '5'
+        return response
+
+    from .downloads import document_etag, file_response
+    return file_response(
+        request, storage, name,
+        etag=document_etag(doc, suffix=f'-{variant}'),
+        content_type='image/jpeg',
+        as_attachment=False,
+    )
+
+
+@login_required
+def export_case_documents(request, case_id):
+    """Descarga en ZIP (generado al vuelo) los documentos y el informe final del caso."""
+    from django.http import StreamingHttpResponse
+    from django.utils.http import content_disposition_header
+    from .exports import collect_entries, export_filename, iter_zip
+
+    case = get_object_or_404(Case, case_id=case_id)
+    if not user_can_access_case(request.user, case):
+        raise Http404('No tienes permiso para descargar este caso.')
+
+    response = StreamingHttpResponse(iter_zip(collect_entries([case])), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, export_filename(case.case_id))
+    # Sin buffer en nginx: el ZIP se envía según se genera
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # =============================================================================
 # VISTAS DE MÉDICOS - CASOS (FALTANTES)
 # =============================================================================
@@ -879,25 +935,16 @@ class MDTOpinionView(LoginRequiredMixin, View):
         medico = request.user.medico
         
         # Obtener o crear workflow
-        from .mdt_models import ConsensusWorkflow, ConsensusVote
+        from .mdt_models import ConsensusWorkflow
+        from .mdt_services import ConsensusService
         workflow, created = ConsensusWorkflow.objects.get_or_create(caso=case)
         
         # Procesar el voto
         voto = request.POST.get('voto', '')
         justificacion = request.POST.get('justificacion', '').strip()
         
-        # Guardar o actualizar voto
-        vote_obj, vote_created = ConsensusVote.objects.update_or_create(
-            workflow=workflow,
-            medico=medico,
-            defaults={'voto': voto, 'justificacion': justificacion}
-        )
-        
-        # Actualizar contadores del workflow
-        workflow.votos_a_favor = ConsensusVote.objects.filter(workflow=workflow, voto__in=['aprueba', 'aprueba_mod']).count()
-        workflow.votos_en_contra = ConsensusVote.objects.filter(workflow=workflow, voto__in=['contraindicado', 'alternativa']).count()
-        workflow.abstenciones = ConsensusVote.objects.filter(workflow=workflow, voto='abstiene').count()
-        workflow.save()
+        # Guardar o actualizar voto y sus contadores
+        ConsensusService.emitir_voto(workflow, medico, voto, justificacion)
         
         from django.shortcuts import redirect
         return redirect('cases:mdt_opinion', case_id=case_id)
@@ -1,3 +1,5 @@
+import logging
+
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -9,6 +11,12 @@ import datetime
 from django.apps import apps as django_apps
 from django.utils import timezone
 from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST, require_http_methods
+from .uploads import ChunkedUploadService, ChunkedUploadError
+from core import reference_data
+
+log = logging.getLogger(__name__)
 
 
 def _serialize_for_session(value):
@@ -25,6 +33,73 @@ def _serialize_for_session(value):
 
 SESSION_KEY = 'sop_draft'
 
+# Mapeo de tipos de documento a etiquetas legibles
+DOCUMENT_TYPE_LABELS = {
+    'resumen_historia_clinica': 'Resumen de Historia Clínica',
+    'resultado_laboratorios': 'Resultado de Laboratorios',
+    'resultado_imagenologia': 'Resultado de Imagenología',
+    'imagenes': 'Imágenes',
+    'resultado_biopsia': 'Resultado de Biopsia',
+    'otros_documentos': 'Otros Documentos Relevantes',
+}
+
+
+def _caso_borrador(request):
+    """Case borrador de la sesión (del usuario actual) o None."""
+    case_pk = request.session.get(SESSION_KEY, {}).get('case_pk')
+    if not case_pk:
+        return None
+    Case = django_apps.get_model('cases', 'Case')
+    return Case.objects.filter(pk=case_pk, patient=request.user).first()
+
+
+def _anotar_documento(request, entrada):
+    draft = request.session.get(SESSION_KEY, {})
+    draft.setdefault('documents', []).append(entrada)
+    request.session[SESSION_KEY] = draft
+    request.session.modified = True
+
+
+def _crear_documento(request, case, f, file_name, doc_type):
+    """Guarda `f` como CaseDocument de `case` y lo anota en el borrador de la sesión."""
+    CaseDocument = django_apps.get_model('cases', 'CaseDocument')
+    cd = CaseDocument.objects.create(
+        case=case,
+        document_type=doc_type,
+        file=f,
+        file_name=file_name,
+        uploaded_by=request.user
+    )
+    log.info('CaseDocument %s creado para el caso %s', cd.pk, case.case_id)
+    # keep metadata in session for display in review
+    _anotar_documento(request, {
+        'name': cd.file_name,
+        'type': cd.get_document_type_display(),
+        'document_type': doc_type,
+        'id': cd.pk,
+    })
+    return cd
+
+
+def _registrar_documento(request, f, file_name, doc_type, content_type=''):
+    """
+    Subida por formulario: guarda `f` como CaseDocument del caso borrador si
+    existe; si no (o si falla), solo anota el documento en la sesión.
+    Devuelve el CaseDocument creado o None.
+    """
+    try:
+        case = _caso_borrador(request)
+        if case:
+            return _crear_documento(request, case, f, file_name, doc_type)
+        log.info('Subida sin caso borrador en la sesión: solo se anotan los metadatos')
+    except Exception:
+        log.exception('No se pudo guardar el documento %s; solo se anotan los metadatos', file_name)
+    # fallback to session-only metadata
+    _anotar_documento(request, {
+        'name': file_name, 'content_type': content_type, 'type': DOCUMENT_TYPE_LABELS.get(doc_type, doc_type),
+    })
+    return None
+
 
 @login_required
 def start_sop(request):
@@ -135,7 +210,6 @@ def sop_step2(request):
             # Persist or update a draft Case so uploaded documents can be attached
             try:
                 Case = django_apps.get_model('cases', 'Case')
-                TipoCancer = django_apps.get_model('medicos', 'TipoCancer')
                 # Check for existing draft case pk in session
                 case_pk = draft.get('case_pk')
                 if case_pk:
@@ -147,7 +221,7 @@ def sop_step2(request):
                         # Guardar tipo de cancer
                         tipo_cancer_pk = cleaned.get('tipo_cancer')
                         if tipo_cancer_pk:
-                            case.tipo_cancer = TipoCancer.objects.get(pk=tipo_cancer_pk)
+                            case.tipo_cancer = reference_data.tipo_cancer(tipo_cancer_pk)
                         case.primary_diagnosis = _diagnosis_from_draft(cleaned, case.tipo_cancer)
                         case.status = 'DRAFT'
                         case.save()
@@ -156,7 +230,7 @@ def sop_step2(request):
                     case_id = f"CASO-{uuid.uuid4().hex[:12].upper()}"
                     # Obtener tipo de cancer
                     tipo_cancer_pk = cleaned.get('tipo_cancer')
-                    tipo_cancer_obj = TipoCancer.objects.get(pk=tipo_cancer_pk) if tipo_cancer_pk else None
+                    tipo_cancer_obj = reference_data.tipo_cancer(tipo_cancer_pk) if tipo_cancer_pk else None
                     
                     case = Case.objects.create(
                         patient=request.user,
@@ -188,16 +262,6 @@ def sop_step2(request):
 
 @login_required
 def sop_step3(request):
-    # Mapeo de tipos de documento a etiquetas legibles
-    DOCUMENT_TYPE_LABELS = {
-        'resumen_historia_clinica': 'Resumen de Historia Clínica',
-        'resultado_laboratorios': 'Resultado de Laboratorios',
-        'resultado_imagenologia': 'Resultado de Imagenología',
-        'imagenes': 'Imágenes',
-        'resultado_biopsia': 'Resultado de Biopsia',
-        'otros_documentos': 'Otros Documentos Relevantes',
-    }
-    
     # we allow multiple uploads by repeating the form
     if request.method == 'POST':
         # Verificar si el usuario está intentando ir al siguiente paso
@@ -215,52 +279,8 @@ def sop_step3(request):
         
         form = CaseDocumentForm(request.POST, request.FILES)
         if form.is_valid():
-            # Register metadata in session and rely on presigned upload endpoint
-            draft = request.session.get(SESSION_KEY, {})
-            docs = draft.get('documents', [])
             f = request.FILES['document']
-            doc_type = form.cleaned_data['document_type']
-            doc_type_label = DOCUMENT_TYPE_LABELS.get(doc_type, doc_type)
-            
-            # Persist the uploaded file into CaseDocument if a draft Case exists
-            try:
-                CaseDocument = django_apps.get_model('cases', 'CaseDocument')
-                Case = django_apps.get_model('cases', 'Case')
-                case_pk = draft.get('case_pk')
-                print(f"[sop_step3] case_pk from session: {case_pk}")
-                case = Case.objects.filter(pk=case_pk, patient=request.user).first() if case_pk else None
-                print(f"[sop_step3] case found: {case}, case_id: {case.case_id if case else 'N/A'}")
-                if case:
-                    # save file to media storage and create CaseDocument
-                    cd = CaseDocument.objects.create(
-                        case=case,
-                        document_type=doc_type,
-                        file=f,
-                        file_name=f.name,
-                        uploaded_by=request.user
-                    )
-                    print(f"[sop_step3] CaseDocument created: {cd.id}")
-                    print(f"[sop_step3] CaseDocument file: {cd.file}, url: {cd.file.url if cd.file else 'N/A'}")
-                    # keep metadata in session for display in review
-                    docs.append({
-                        'name': cd.file_name,
-                        'type': cd.get_document_type_display(),
-                        'document_type': doc_type,
-                        'id': cd.pk,
-                    })
-                else:
-                    # fallback: keep metadata only
-                    print(f"[sop_step3] No case found, using session fallback")
-                    docs.append({'name': f.name, 'content_type': f.content_type, 'type': doc_type_label})
-                draft['documents'] = docs
-                request.session[SESSION_KEY] = draft
-                request.session.modified = True
-            except Exception:
-                # fallback to session-only metadata
-                docs.append({'name': f.name, 'content_type': f.content_type, 'type': doc_type_label})
-                draft['documents'] = docs
-                request.session[SESSION_KEY] = draft
-                request.session.modified = True
+            _registrar_documento(request, f, f.name, form.cleaned_data['document_type'], f.content_type)
             return redirect('cases:sop_step3')
     else:
         form = CaseDocumentForm()
@@ -318,8 +338,7 @@ def sop_step4(request):
             especialidad_nombre = ''
             if especialidad_pk:
                 try:
-                    from medicos.models import Especialidad
-                    esp = Especialidad.objects.filter(pk=especialidad_pk).first()
+                    esp = reference_data.especialidad(especialidad_pk)
                     if esp:
                         especialidad_nombre = esp.nombre
                 except Exception:
@@ -371,3 +390,76 @@ def sop_step4(request):
         form = ReviewConsentForm()
 
     return render(request, 'sop/step4_review.html', {'form': form, 'draft': draft, 'current_step': 4, 'case': case})
+
+
+# =====================================================
+# SUBIDA POR FRAGMENTOS (documentos grandes, reanudable)
+# =====================================================
+
+def _chunked_error(e):
+    data = {'error': str(e)}
+    if e.offset is not None:
+        data['offset'] = e.offset
+    return JsonResponse(data, status=e.status)
+
+
+@login_required
+@require_POST
+def sop_upload_start(request):
+    """Abre una subida por fragmentos: recibe file_name, file_size y document_type."""
+    doc_type = request.POST.get('document_type', '')
+    if doc_type not in DOCUMENT_TYPE_LABELS:
+        return JsonResponse({'error': 'Tipo de documento inválido'}, status=400)
+    try:
+        estado = ChunkedUploadService.iniciar(
+            request.user, request.POST.get('file_name'), request.POST.get('file_size'), doc_type
+        )
+    except ChunkedUploadError as e:
+        return _chunked_error(e)
+    return JsonResponse(estado, status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def sop_upload_chunk(request, upload_id):
+    """
+    GET devuelve el offset actual (para reanudar). POST anexa el cuerpo
+    crudo de la petición en el offset indicado por la cabecera
+    `Upload-Offset` (o el parámetro `offset`).
+    """
+    try:
+        if request.method == 'GET':
+            return JsonResponse(ChunkedUploadService.estado(request.user, upload_id))
+        offset = request.headers.get('Upload-Offset', request.GET.get('offset'))
+        estado = ChunkedUploadService.anexar(
+            request.user, upload_id, offset, request, request.META.get('CONTENT_LENGTH') or 0
+        )
+    except ChunkedUploadError as e:
+        return _chunked_error(e)
+    return JsonResponse(estado)
+
+
+@login_required
+@require_POST
+def sop_upload_complete(request, upload_id):
+    """Ensambla la subida en el storage y la registra como CaseDocument del borrador."""
+    try:
+        meta, f = ChunkedUploadService.abrir_completo(request.user, upload_id)
+    except ChunkedUploadError as e:
+        return _chunked_error(e)
+    # El parcial solo se descarta cuando el CaseDocument existe: ante
+    # cualquier error se conserva para que el cliente reintente
+    try:
+        case = _caso_borrador(request)
+        if case is None:
+            return JsonResponse(
+                {'error': 'No hay un caso en borrador para este documento', 'offset': meta['file_size']}, status=409
+            )
+        cd = _crear_documento(request, case, f, meta['file_name'], meta['document_type'])
+    except Exception:
+        log.exception('No se pudo registrar la subida %s', upload_id)
+        return JsonResponse({'error': 'No se pudo guardar el documento, reintente'}, status=500)
+    finally:
+        f.close()
+    ChunkedUploadService.descartar(request.user, upload_id)
+    return JsonResponse({'document_id': cd.pk, 'name': meta['file_name']})
@@ -0,0 +1,101 @@
+"""
+Conteo de votos en vivo para la sala MDT del caso.
+
+Cada vez que se guarda o borra una `MedicalOpinion` o un `ConsensusVote`
+(señales en `cases.signals`), tras el commit se programa la publicación de un
+resumen compacto de la votación en el grupo de canales `mdt_caso_<case_id>`,
+el mismo de `MDTChatConsumer`, que lo reenvía a los clientes como un mensaje
+`vote_tally`. Así el detalle del caso no tiene que recargarse para ver cómo va
+la votación. El detalle se conecta con `?modo=conteo`: solo escucha, sin
+anunciarse en el chat.
+
+Las publicaciones se agrupan por caso: la primera escritura deja una marca
+en el caché y encola `publish_vote_tally_task` con un retardo de
+`MDT_TALLY_DEBOUNCE_SECONDS`; las siguientes, mientras la marca exista, no
+encolan nada. La tarea borra la marca y lee el conteo en ese momento, así que
+el último estado siempre se publica.
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Case, MedicalOpinion
+
+log = logging.getLogger(__name__)
+
+EVENTO = 'vote_tally'
+
+
+def grupo_caso(case_id):
+    """Grupo de canales de la sala del caso (ver `MDTChatConsumer.connect`)."""
+    return f'mdt_caso_{case_id}'
+
+
+def _clave_pendiente(caso_pk):
+    return f'mdt:tally:pendiente:{caso_pk}'
+
+
+def conteo_caso(caso_pk):
+    """
+    Resumen de la votación del caso o None si ya no existe:
+    `{'case_id', 'opiniones': {voto: n}, 'consenso': {...} | None}`.
+    """
+    fila = Case.objects.filter(pk=caso_pk).values(
+        'case_id', 'workflow_consenso__pk', 'workflow_consenso__fase', 'workflow_consenso__votos_a_favor',
+        'workflow_consenso__votos_en_contra', 'workflow_consenso__abstenciones',
+    ).first()
+    if fila is None:
+        return None
+    por_voto = dict(
+        MedicalOpinion.objects.filter(case_id=caso_pk).order_by().values_list('voto').annotate(total=Count('pk'))
+    )
+    consenso = None
+    if fila['workflow_consenso__pk']:
+        consenso = {
+            'fase': fila['workflow_consenso__fase'],
+            'a_favor': fila['workflow_consenso__votos_a_favor'],
+            'en_contra': fila['workflow_consenso__votos_en_contra'],
+            'abstenciones': fila['workflow_consenso__abstenciones'],
+        }
+    return {
+        'case_id': fila['case_id'],
+        'opiniones': {voto: por_voto.get(voto, 0) for voto, _ in MedicalOpinion.VOTO_CHOICES},
+        'consenso': consenso,
+    }
+
+
+def programar_publicacion(caso_pk):
+    """
+    Encola la publicación del conteo del caso salvo que ya haya una pendiente.
+    Devuelve si se encoló. Se llama desde `transaction.on_commit`.
+    """
+    retardo = getattr(settings, 'MDT_TALLY_DEBOUNCE_SECONDS', 1)
+    # La marca caduca sola por si la tarea se pierde
+    if not cache.add(_clave_pendiente(caso_pk), True, retardo + 30):
+        return False
+    try:
+        from .tasks import publish_vote_tally_task
+        publish_vote_tally_task.apply_async((caso_pk,), countdown=retardo)
+    except Exception:
+        # El voto ya está guardado: sin broker solo se pierde el aviso en vivo
+        cache.delete(_clave_pendiente(caso_pk))
+        log.exception('No se pudo encolar la publicación del conteo del caso %s', caso_pk)
+        return False
+    return True
+
+
+def publicar_conteo(caso_pk):
+    """Envía el conteo actual del caso a su sala. Devuelve el conteo publicado o None."""
+    cache.delete(_clave_pendiente(caso_pk))
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+
+    capa = get_channel_layer()
+    conteo = conteo_caso(caso_pk)
+    if capa is None or conteo is None:
+        return None
+    async_to_sync(capa.group_send)(grupo_caso(conteo['case_id']), {'type': EVENTO, 'conteo': conteo})
+    return conteo
@@ -0,0 +1,128 @@
+"""
+Conteo de votos del consenso MDT (`ConsensusWorkflow.votos_a_favor`,
+`votos_en_contra` y `abstenciones`).
+
+Antes cada voto volvía a contar los votos del workflow con tres `COUNT` y
+guardaba el workflow entero, así que dos votos simultáneos podían pisarse
+los contadores. Ahora `registrar_voto` bloquea el voto anterior del médico,
+calcula el cambio de categoría y lo aplica con un UPDATE atómico con F()
+solo sobre los contadores que cambian. Es el único camino para votar
+(`ConsensusService.emitir_voto` y `MDTOpinionView`).
+
+`verificar_conteos` recalcula los contadores en la base de datos y corrige
+las desviaciones (votos borrados, cambios hechos con `update()`). Se
+ejecuta periódicamente con `verify_vote_tallies_task`.
+"""
+
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .mdt_models import ConsensusVote, ConsensusWorkflow
+
+# Contador del workflow -> votos que cuenta
+CATEGORIAS_VOTO = {
+    'votos_a_favor': ('aprueba', 'aprueba_mod'),
+    'votos_en_contra': ('contraindicado', 'alternativa'),
+    'abstenciones': ('abstiene',),
+}
+CONTADORES = tuple(CATEGORIAS_VOTO)
+
+
+def categoria(voto):
+    """Contador del workflow en el que cuenta `voto` (None si no cuenta)."""
+    return next((campo for campo, votos in CATEGORIAS_VOTO.items() if voto in votos), None)
+
+
+def aplicar_deltas(workflow_id, deltas):
+    """Aplica `{contador: delta}` al workflow en un solo UPDATE; los negativos no bajan de 0."""
+    cambios = {
+        campo: F(campo) + delta if delta > 0 else Greatest(F(campo) + delta, Value(0))
+        for campo, delta in deltas.items() if delta
+    }
+    if cambios:
+        ConsensusWorkflow.objects.filter(pk=workflow_id).update(**cambios)
+
+
+def registrar_voto(workflow, medico, tipo_voto, justificacion=''):
+    """
+    Crea o cambia el voto de `medico` y ajusta los contadores de `workflow`.
+
+    Devuelve el `ConsensusVote`. Al terminar, `workflow` lleva los contadores
+    leídos de la base de datos.
+    """
+    with transaction.atomic():
+        creado = False
+        voto = _voto_bloqueado(workflow, medico)
+        if voto is None:
+            try:
+                with transaction.atomic():
+                    voto = ConsensusVote.objects.create(
+                        workflow=workflow, medico=medico, voto=tipo_voto, justificacion=justificacion,
+                    )
+                creado = True
+            except IntegrityError:
+                # Otro envío del mismo médico creó el voto a la vez
+                voto = _voto_bloqueado(workflow, medico)
+
+        anterior = None if creado else voto.voto
+        if not creado and (voto.voto != tipo_voto or voto.justificacion != justificacion):
+            voto.voto = tipo_voto
+            voto.justificacion = justificacion
+            voto.save(update_fields=['voto', 'justificacion', 'actualizado_en'])
+
+        deltas = Counter()
+        if categoria(anterior) != categoria(tipo_voto):
+            deltas[categoria(anterior)] -= 1
+            deltas[categoria(tipo_voto)] += 1
+            deltas.pop(None, None)
+            aplicar_deltas(workflow.pk, deltas)
+    workflow.refresh_from_db(fields=CONTADORES)
+    return voto
+
+
+def _voto_bloqueado(workflow, medico):
+    return ConsensusVote.objects.select_for_update().filter(workflow=workflow, medico=medico).first()
+
+
+def _conteo(votos):
+    """Subconsulta agrupada: votos de la categoría en el workflow de la fila exterior."""
+    return Coalesce(
+        Subquery(
+            ConsensusVote.objects.filter(workflow=OuterRef('pk'), voto__in=votos)
+            .order_by()
+            .values('workflow')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        Value(0),
+    )
+
+
+def verificar_conteos(dry_run=False):
+    """
+    Compara los contadores de cada workflow con sus votos.
+
+    Devuelve la lista `(workflow_id, {contador: (guardado, real)})` de los
+    workflows desviados. Sin `dry_run` los corrige con un UPDATE que vuelve a
+    contar en la base de datos, así que no pisa votos concurrentes.
+    """
+    reales = {f'real_{campo}': _conteo(votos) for campo, votos in CATEGORIAS_VOTO.items()}
+    desviacion = Q()
+    for campo in CONTADORES:
+        desviacion |= ~Q(**{campo: F(f'real_{campo}')})
+    desviados = [
+        (fila['pk'], {
+            campo: (fila[campo], fila[f'real_{campo}'])
+            for campo in CONTADORES if fila[campo] != fila[f'real_{campo}']
+        })
+        for fila in ConsensusWorkflow.objects.annotate(**reales).filter(desviacion)
+        .order_by('pk').values('pk', *CONTADORES, *reales)
+    ]
+    if desviados and not dry_run:
+        ConsensusWorkflow.objects.filter(pk__in=[d[0] for d in desviados]).update(
+            **{campo: _conteo(votos) for campo, votos in CATEGORIAS_VOTO.items()}
+        )
+    return desviados
@@ -0,0 +1,105 @@
+"""
+Carga de trabajo de los médicos (`Medico.casos_actuales`).
+
+Un caso cuenta en la carga de su `medico_asignado` mientras no esté cerrado
+ni cancelado. El contador se mantiene con UPDATE atómicos con F():
+
+- al asignar (`AssignmentService.asignar_caso`, `cases.backlog`) se suma al
+  médico elegido y, si el caso se reasigna, se resta al anterior; la
+  asignación automática reserva la plaza con un UPDATE condicional al límite
+  (`reservar_carga`);
+- al cerrar o cancelar el caso (`Case.save`) se resta.
+
+`reconciliar_carga` recalcula el contador con una consulta agrupada y corrige
+las desviaciones (casos borrados, cambios de estado hechos con `update()`,
+incrementos perdidos). Se ejecuta cada noche con `reconcile_workload_task`.
+"""
+
+from collections import defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import CASE_STATUSES_WITHOUT_WORKLOAD, Case
+
+
+def _medicos():
+    from medicos.models import Medico
+    return Medico.objects
+
+
+def sumar_carga(medico_id, incremento=1):
+    _medicos().filter(pk=medico_id).update(casos_actuales=F('casos_actuales') + incremento)
+
+
+def reservar_carga(medico_id, limite):
+    """
+    Suma un caso al médico solo si sigue por debajo de `limite`. Devuelve si
+    se reservó: el UPDATE condicional es atómico, así que dos workers no
+    pueden pasar a la vez al mismo médico por encima del límite.
+    """
+    return bool(
+        _medicos().filter(pk=medico_id, casos_actuales__lt=limite).update(casos_actuales=F('casos_actuales') + 1)
+    )
+
+
+def sumar_cargas(incrementos):
+    """Aplica `{medico_id: incremento}` con un UPDATE por cada incremento distinto."""
+    por_incremento = defaultdict(list)
+    for medico_id, incremento in incrementos.items():
+        por_incremento[incremento].append(medico_id)
+    for incremento, ids in por_incremento.items():
+        _medicos().filter(pk__in=ids).update(casos_actuales=F('casos_actuales') + incremento)
+
+
+def liberar_carga(medico_id, decremento=1):
+    # Nunca por debajo de 0: un contador desviado lo corrige la reconciliación
+    _medicos().filter(pk=medico_id).update(casos_actuales=Greatest(F('casos_actuales') - decremento, Value(0)))
+
+
+def asignar_carga(caso, medico):
+    """
+    Pone a `medico` como `medico_asignado` del caso y ajusta las cargas.
+    No guarda el caso: el llamador lo hace en la misma transacción.
+    """
+    anterior_id = caso.medico_asignado_id
+    if anterior_id == medico.pk:
+        return
+    abierto = caso.status not in CASE_STATUSES_WITHOUT_WORKLOAD
+    if anterior_id and abierto:
+        liberar_carga(anterior_id)
+    if abierto:
+        sumar_carga(medico.pk)
+    caso.medico_asignado = medico
+
+
+def _casos_abiertos():
+    """Subconsulta agrupada: casos abiertos del médico de la fila exterior."""
+    return Subquery(
+        Case.objects.filter(medico_asignado=OuterRef('pk'))
+        .exclude(status__in=CASE_STATUSES_WITHOUT_WORKLOAD)
+        .order_by()
+        .values('medico_asignado')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+
+
+def reconciliar_carga(dry_run=False):
+    """
+    Recalcula `casos_actuales` a partir de los casos abiertos.
+
+    Devuelve la lista `(medico_id, casos_actuales, casos_abiertos)` de los
+    médicos desviados. Sin `dry_run` los corrige con un solo UPDATE que vuelve
+    a contar en la base de datos, así que no pisa asignaciones concurrentes.
+    """
+    reales = Coalesce(_casos_abiertos(), Value(0))
+    desviados = list(
+        _medicos().annotate(abiertos=reales)
+        .exclude(casos_actuales=F('abiertos'))
+        .order_by('pk')
+        .values_list('pk', 'casos_actuales', 'abiertos')
+    )
+    if desviados and not dry_run:
+        _medicos().filter(pk__in=[d[0] for d in desviados]).update(casos_actuales=reales)
+    return desviados
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = "core"
+
+    def ready(self):
+        # Registra los conjuntos del caché de datos de referencia y sus señales
+        from . import reference_data  # noqa: F401
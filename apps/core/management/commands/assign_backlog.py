@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cases.backlog import DEFAULT_CHUNK_SIZE, assign_backlog
+
+
+class Command(BaseCommand):
+    help = 'Asigna en lote los casos SUBMITTED que quedaron sin grupo médico'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Casos por transacción')
+        parser.add_argument('--limit', type=int, help='Máximo de casos a procesar')
+        parser.add_argument('--no-notify', action='store_true', help='No crear notificaciones para los miembros del grupo')
+        parser.add_argument('--dry-run', action='store_true', help='Calcula la asignación sin guardar cambios')
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+
+        def progreso(hechos, total, resumen):
+            self.stdout.write(f"{hechos}/{total} procesados, {resumen['asignados']} asignados")
+
+        resumen = assign_backlog(
+            chunk_size=options['chunk_size'],
+            limit=options['limit'],
+            notify=not options['no_notify'],
+            dry_run=options['dry_run'],
+            progress=progreso,
+        )
+        duracion = time.monotonic() - inicio
+
+        for case_id in resumen['omitidos']:
+            self.stderr.write(f'Sin grupo o sin líder: {case_id}')
+        prefijo = '[DRY-RUN] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefijo}{resumen['asignados']} de {resumen['pendientes']} casos asignados "
+            f"({len(resumen['omitidos'])} omitidos) en {duracion:.1f}s"
+        ))
@@ -0,0 +1,58 @@
+import json
+import os
+import sys
+import zipfile
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from cases.exports import MANIFEST_NAME, collect_entries, export_filename, iter_zip
+from cases.models import Case
+
+
+class Command(BaseCommand):
+    help = 'Exporta en un ZIP (con manifest.json) los documentos de un caso o de todos los casos de un paciente'
+
+    def add_arguments(self, parser):
+        grupo = parser.add_mutually_exclusive_group(required=True)
+        grupo.add_argument('--case', type=str, help='case_id del caso a exportar')
+        grupo.add_argument('--patient', type=str, help='Email del paciente (todos sus casos)')
+        parser.add_argument('--output', type=str, help="Ruta del ZIP ('-' para stdout). Por defecto en el directorio actual")
+
+    def handle(self, *args, **options):
+        if options['case']:
+            cases = list(Case.objects.filter(case_id=options['case']))
+            if not cases:
+                raise CommandError(f"Caso {options['case']} no encontrado")
+            label = options['case']
+        else:
+            user = get_user_model().objects.filter(email__iexact=options['patient']).first()
+            if not user:
+                raise CommandError(f"No se encontró usuario con email {options['patient']}")
+            cases = list(Case.objects.filter(patient=user))
+            label = options['patient']
+
+        entries = collect_entries(cases)
+        if not entries:
+            self.stdout.write('No se encontraron documentos para exportar')
+            return
+
+        output = options['output'] or export_filename(label)
+        if output == '-':
+            for data in iter_zip(entries):
+                sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+            return
+
+        with open(output, 'wb') as f:
+            for data in iter_zip(entries):
+                f.write(data)
+
+        with zipfile.ZipFile(output) as zf:
+            manifest = json.loads(zf.read(MANIFEST_NAME))
+        for item in manifest['missing']:
+            self.stderr.write(f"No incluido: {item['case_id']} {item['file_name']} ({item['error']})")
+        self.stdout.write(self.style.SUCCESS(
+            f"ZIP generado: {os.path.abspath(output)} ({len(manifest['files'])} archivos, "
+            f"{len(manifest['missing'])} no disponibles)"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from cases.workload import reconciliar_carga
+
+
+class Command(BaseCommand):
+    help = 'Recalcula Medico.casos_actuales a partir de los casos abiertos asignados a cada médico'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Solo muestra las desviaciones')
+
+    def handle(self, *args, **options):
+        desviados = reconciliar_carga(dry_run=options['dry_run'])
+        for medico_id, contador, abiertos in desviados:
+            self.stdout.write(f'Médico {medico_id}: casos_actuales={contador}, abiertos={abiertos}')
+        prefijo = '[DRY-RUN] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(f'{prefijo}{len(desviados)} médicos con la carga desviada'))
@@ -0,0 +1,270 @@
+"""
+Comando de Django para regenerar en bloque los informes finales (PDF).
+
+Útil tras un cambio de plantilla: selecciona los casos por estado, rango de
+fechas y grupo médico, renderiza los PDF en paralelo con un pool de procesos
+y guarda los resultados por lotes. Mantiene un fichero de checkpoint para que
+una ejecución interrumpida pueda reanudarse.
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from cases.models import Case, FinalReport, MedicalOpinion
+from cases.reports import (
+    REPORTLAB_AVAILABLE, build_report_payload, compute_input_digest, render_report_pdf_bytes,
+    report_filename, stored_pdf_matches,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT = '.regenerate_reports.checkpoint.json'
+
+
+class Command(BaseCommand):
+    help = 'Regenera en paralelo los informes finales (PDF) de los casos que cumplan el filtro'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', action='append', default=[], help='Estado del caso (repetible)')
+        parser.add_argument('--desde', type=str, help='Fecha de creación mínima (YYYY-MM-DD)')
+        parser.add_argument('--hasta', type=str, help='Fecha de creación máxima (YYYY-MM-DD)')
+        parser.add_argument('--grupo', type=str, help='ID o nombre del grupo médico')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Procesos de renderizado')
+        parser.add_argument('--batch-size', type=int, default=50, help='Casos por lote de escritura')
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, DEFAULT_CHECKPOINT),
+            help='Fichero de checkpoint para reanudar',
+        )
+        parser.add_argument('--force', action='store_true', help='Re-renderizar aunque las entradas no hayan cambiado')
+        parser.add_argument('--reset', action='store_true', help='Ignorar el checkpoint existente y empezar de cero')
+        parser.add_argument('--dry-run', action='store_true', help='No genera nada; muestra los casos seleccionados')
+
+    def handle(self, *args, **options):
+        if not REPORTLAB_AVAILABLE:
+            raise CommandError("reportlab no está instalado. Instala pip install reportlab")
+
+        force = options['force']
+        batch_size = max(1, options['batch_size'])
+        workers = max(1, options['workers'])
+        filtros = {
+            'status': sorted(options['status']),
+            'desde': options.get('desde'),
+            'hasta': options.get('hasta'),
+            'grupo': options.get('grupo'),
+        }
+
+        checkpoint_path = options['checkpoint']
+        procesados = set() if options['reset'] else self._cargar_checkpoint(checkpoint_path, filtros)
+
+        casos = self._seleccionar_casos(filtros)
+        pendientes = [c for c in casos if c.case_id not in procesados]
+        self.stdout.write(
+            f'Casos seleccionados: {len(casos)} (ya procesados: {len(casos) - len(pendientes)}, '
+            f'pendientes: {len(pendientes)})'
+        )
+
+        if options['dry_run']:
+            for caso in pendientes:
+                self.stdout.write(f'  - {caso.case_id} [{caso.status}]')
+            return
+
+        if not pendientes:
+            self.stdout.write(self.style.SUCCESS('No hay informes pendientes de regenerar.'))
+            return
+
+        # Los procesos hijos no usan la BD; cerrar las conexiones antes de
+        # crear el pool evita compartir sockets heredados por fork.
+        connections.close_all()
+
+        generados = 0
+        sin_cambios = 0
+        errores = 0
+        inicio = time.monotonic()
+
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            for i in range(0, len(pendientes), batch_size):
+                lote = pendientes[i:i + batch_size]
+                payloads = {}
+                digests = {}
+                for caso in lote:
+                    if not caso.responsable_id:
+                        self.stderr.write(f'Caso {caso.case_id} sin responsable; se omite')
+                        errores += 1
+                        continue
+                    payload = build_report_payload(caso, caso.opiniones.all())
+                    digest = compute_input_digest(payload)
+                    # Memoización: el PDF almacenado ya corresponde a estas entradas
+                    if not force and stored_pdf_matches(getattr(caso, 'informe_final', None), digest):
+                        sin_cambios += 1
+                        procesados.add(caso.case_id)
+                        continue
+                    payloads[caso.case_id] = payload
+                    digests[caso.case_id] = digest
+
+                pdfs, fallidos = self._renderizar(executor, payloads)
+                errores += fallidos
+
+                guardados = self._guardar_lote([c for c in lote if c.case_id in pdfs], payloads, digests, pdfs)
+                generados += len(guardados)
+                procesados.update(guardados)
+                self._guardar_checkpoint(checkpoint_path, filtros, procesados)
+
+                transcurrido = time.monotonic() - inicio
+                self.stdout.write(
+                    f'Lote {i // batch_size + 1}: {generados}/{len(pendientes)} informes '
+                    f'({generados / transcurrido:.1f} informes/s)'
+                )
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        transcurrido = time.monotonic() - inicio
+        throughput = generados / transcurrido if transcurrido else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f'Proceso finalizado. Generados={generados} SinCambios={sin_cambios} Errores={errores} '
+            f'Tiempo={transcurrido:.1f}s Throughput={throughput:.1f} informes/s'
+        ))
+
+    def _seleccionar_casos(self, filtros):
+        """Carga los casos con todo lo necesario para el payload en pocas consultas."""
+        qs = Case.objects.filter(opiniones__isnull=False).distinct()
+
+        if filtros['status']:
+            qs = qs.filter(status__in=filtros['status'])
+        if filtros['desde']:
+            qs = qs.filter(created_at__date__gte=self._parse_fecha(filtros['desde']))
+        if filtros['hasta']:
+            qs = qs.filter(created_at__date__lte=self._parse_fecha(filtros['hasta']))
+        if filtros['grupo']:
+            grupo = filtros['grupo']
+            if grupo.isdigit():
+                qs = qs.filter(medical_group_id=int(grupo))
+            else:
+                qs = qs.filter(medical_group__nombre=grupo)
+
+        return list(
+            qs.select_related('tipo_cancer', 'responsable', 'informe_final')
+            .prefetch_related(
+                Prefetch('opiniones', queryset=MedicalOpinion.objects.select_related('doctor'))
+            )
+            .order_by('pk')
+        )
+
+    @staticmethod
+    def _parse_fecha(valor):
+        try:
+            return datetime.strptime(valor, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Fecha inválida: {valor} (formato YYYY-MM-DD)')
+
+    def _renderizar(self, executor, payloads):
+        """Renderiza los payloads; devuelve ({case_id: bytes}, número de errores)."""
+        pdfs = {}
+        errores = 0
+
+        if executor is None:
+            for case_id, payload in payloads.items():
+                try:
+                    _, pdfs[case_id] = render_report_pdf_bytes(payload)
+                except Exception as e:
+                    logger.exception('Error renderizando informe de %s', case_id)
+                    self.stderr.write(f'Error renderizando {case_id}: {e}')
+                    errores += 1
+            return pdfs, errores
+
+        futuros = {executor.submit(render_report_pdf_bytes, p): case_id for case_id, p in payloads.items()}
+        for futuro in as_completed(futuros):
+            case_id = futuros[futuro]
+            try:
+                _, pdfs[case_id] = futuro.result()
+            except Exception as e:
+                logger.exception('Error renderizando informe de %s', case_id)
+                self.stderr.write(f'Error renderizando {case_id}: {e}')
+                errores += 1
+        return pdfs, errores
+
+    def _guardar_lote(self, casos, payloads, digests, pdfs):
+        """Escribe los PDF y actualiza/crea los FinalReport del lote en una transacción."""
+        nuevos = []
+        actualizados = []
+        archivos_viejos = []
+        ahora = timezone.now()
+
+        with transaction.atomic():
+            for caso in casos:
+                payload = payloads[caso.case_id]
+                try:
+                    informe = caso.informe_final
+                except FinalReport.DoesNotExist:
+                    informe = FinalReport(case=caso)
+
+                if informe.pdf_file:
+                    archivos_viejos.append(informe.pdf_file.name)
+
+                informe.conclusion = payload['conclusion']
+                informe.justificacion = payload['explicacion']
+                informe.recomendaciones = 'Generado automáticamente'
+                informe.redactado_por_id = caso.responsable_id
+                informe.firma_electronica = digests[caso.case_id]
+                informe.actualizado_en = ahora
+                informe.pdf_file.save(report_filename(caso.case_id), ContentFile(pdfs[caso.case_id]), save=False)
+
+                if informe.pk:
+                    actualizados.append(informe)
+                else:
+                    nuevos.append(informe)
+
+            if nuevos:
+                FinalReport.objects.bulk_create(nuevos)
+            if actualizados:
+                FinalReport.objects.bulk_update(
+                    actualizados,
+                    [
+                        'conclusion', 'justificacion', 'recomendaciones', 'redactado_por',
+                        'actualizado_en', 'pdf_file', 'firma_electronica',
+                    ],
+                )
+
+        # Borrar los PDF anteriores solo cuando los nuevos ya están referenciados
+        storage = FinalReport._meta.get_field('pdf_file').storage
+        for nombre in archivos_viejos:
+            try:
+                storage.delete(nombre)
+            except Exception as e:
+                self.stderr.write(f'Error borrando PDF anterior {nombre}: {e}')
+
+        return [c.case_id for c in casos]
+
+    @staticmethod
+    def _cargar_checkpoint(path, filtros):
+        if not os.path.exists(path):
+            return set()
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('filtros') != filtros:
+            raise CommandError(
+                f'El checkpoint {path} corresponde a otros filtros ({data.get("filtros")}). '
+                'Usa --reset para empezar de cero.'
+            )
+        return set(data.get('procesados', []))
+
+    @staticmethod
+    def _guardar_checkpoint(path, filtros, procesados):
+        # Escritura atómica: un corte a mitad no deja el checkpoint corrupto
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'filtros': filtros, 'procesados': sorted(procesados)}, f)
+        os.replace(tmp, path)
@@ -0,0 +1,96 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime, parse_date
+
+from cases.simulation import (
+    CONFIG_FIELDS, DEFAULT_CASE_DURATION_DAYS, cargar_grupos, config_desde, llegadas_historicas,
+    llegadas_sinteticas, simular,
+)
+
+
+def _valor(campo, texto):
+    if campo in ('modo_estricto', 'respetar_disponibilidad'):
+        if texto.lower() not in ('1', '0', 'true', 'false', 'si', 'no'):
+            raise CommandError(f'Valor booleano no válido para {campo}: {texto}')
+        return texto.lower() in ('1', 'true', 'si')
+    try:
+        return int(texto)
+    except ValueError:
+        raise CommandError(f'Valor entero no válido para {campo}: {texto}')
+
+
+def _parse_config(texto):
+    """'ponderacion_carga=30,modo_estricto=true' -> dict de cambios."""
+    cambios = {}
+    for parte in filter(None, texto.split(',')):
+        campo, sep, valor = parte.partition('=')
+        campo = campo.strip()
+        if not sep or campo not in CONFIG_FIELDS:
+            raise CommandError(f"Cambio no válido '{parte}'; campos: {', '.join(CONFIG_FIELDS)}")
+        cambios[campo] = _valor(campo, valor.strip())
+    return cambios
+
+
+def _parse_fecha(texto):
+    fecha = parse_datetime(texto) or parse_date(texto)
+    if fecha is None:
+        raise CommandError(f'Fecha no válida: {texto}')
+    return fecha
+
+
+class Command(BaseCommand):
+    help = (
+        'Simula en memoria la asignación de casos históricos o sintéticos con la configuración activa '
+        'y las variantes indicadas, y muestra en JSON el reparto por médico, el Gini y el rendimiento'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--config', action='append', default=[], metavar='CAMPO=VALOR,...',
+            help=f"Variante de la configuración activa (repetible). Campos: {', '.join(CONFIG_FIELDS)}",
+        )
+        parser.add_argument('--synthetic', type=int, metavar='N', help='Simular N llegadas sintéticas en lugar de las históricas')
+        parser.add_argument('--days', type=int, default=30, help='Días en que se reparten las llegadas sintéticas')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla de las llegadas sintéticas')
+        parser.add_argument('--since', type=str, help='Casos históricos creados desde esta fecha')
+        parser.add_argument('--until', type=str, help='Casos históricos creados antes de esta fecha')
+        parser.add_argument(
+            '--case-duration', type=int, default=DEFAULT_CASE_DURATION_DAYS,
+            help='Días que un caso ocupa la carga del médico si no tiene fecha de completado real',
+        )
+        parser.add_argument('--output', type=str, help='Fichero JSON de salida (por defecto stdout)')
+
+    def handle(self, *args, **options):
+        grupos = cargar_grupos()
+        if not grupos:
+            raise CommandError('No hay grupos médicos activos con miembros')
+
+        if options['synthetic']:
+            llegadas = llegadas_sinteticas(grupos.keys(), options['synthetic'], dias=options['days'], seed=options['seed'])
+            origen = {'tipo': 'sintetico', 'casos': options['synthetic'], 'dias': options['days'], 'seed': options['seed']}
+        else:
+            desde = _parse_fecha(options['since']) if options['since'] else None
+            hasta = _parse_fecha(options['until']) if options['until'] else None
+            llegadas = llegadas_historicas(desde, hasta)
+            origen = {'tipo': 'historico', 'desde': options['since'], 'hasta': options['until']}
+
+        variantes = [('activa', {})] + [(texto, _parse_config(texto)) for texto in options['config']]
+        duracion = timedelta(days=options['case_duration'])
+        resultado = {
+            'origen': origen,
+            'duracion_caso_dias': options['case_duration'],
+            'simulaciones': [
+                {'nombre': nombre, **simular(llegadas, grupos, config_desde(**cambios), duracion)}
+                for nombre, cambios in variantes
+            ],
+        }
+
+        salida = json.dumps(resultado, ensure_ascii=False, indent=2, default=str)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(salida)
+            self.stderr.write(f"Resultado guardado en {options['output']}")
+        else:
+            self.stdout.write(salida)
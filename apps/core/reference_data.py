@@ -0,0 +1,191 @@
+"""
+Caché de datos de referencia (tablas pequeñas que casi nunca cambian).
+
+Cada conjunto (`ReferenceCache`) tiene dos niveles:
+
+- local al proceso: el valor ya construido, que se reutiliza sin tocar el
+  caché compartido durante `REFERENCE_CACHE_LOCAL_TTL` segundos (5 por
+  defecto);
+- compartido (el caché de Django: Redis en producción): el valor bajo una
+  clave con número de versión, `refdata:<nombre>:<versión>`.
+
+Al guardar o borrar una instancia de cualquiera de los modelos de un conjunto
+se incrementa su versión en el caché compartido (tras el commit). Los demás
+procesos ven la versión nueva como tarde al caducar su copia local y vuelven
+a cargar el conjunto con una sola consulta. Los cambios hechos con
+`QuerySet.update()` no emiten señales: después hay que llamar a
+`invalidate()` del conjunto.
+
+Los valores son instancias de modelos compartidas entre peticiones: son de
+solo lectura.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+_registry = {}
+
+
+def _version_inicial():
+    return int(time.time() * 1000)
+
+
+class ReferenceCache:
+    """Conjunto de datos de referencia cargado por `loader()` e invalidado por `models`."""
+
+    def __init__(self, name, loader, models):
+        self.name = name
+        self.loader = loader
+        self.models = models
+        self._local = None  # (versión, valor, comprobado_en)
+        self._lock = threading.Lock()
+
+    @property
+    def _version_key(self):
+        return f'refdata:{self.name}:version'
+
+    def _version(self):
+        version = cache.get(self._version_key)
+        if version is None:
+            # add() no pisa la versión si otro proceso la creó a la vez. Se
+            # parte del reloj para no reutilizar versiones si la clave se expulsa
+            cache.add(self._version_key, _version_inicial(), None)
+            version = cache.get(self._version_key)
+        return version
+
+    def get(self):
+        ttl = getattr(settings, 'REFERENCE_CACHE_LOCAL_TTL', 5)
+        local = self._local
+        ahora = time.monotonic()
+        if local and ahora - local[2] < ttl:
+            return local[1]
+
+        with self._lock:
+            version = self._version()
+            # Sin caché compartido (DummyCache) no hay versión: se recarga al caducar
+            if local and version is not None and local[0] == version:
+                self._local = (version, local[1], ahora)
+                return local[1]
+            key = f'refdata:{self.name}:{version}'
+            valor = cache.get(key)
+            if valor is None:
+                valor = self.loader()
+                cache.set(key, valor, getattr(settings, 'REFERENCE_CACHE_TIMEOUT', 3600))
+            self._local = (version, valor, ahora)
+            return valor
+
+    def invalidate(self):
+        """Nueva versión del conjunto para todos los procesos; la copia local se descarta ya."""
+        self._local = None
+        try:
+            cache.incr(self._version_key)
+        except ValueError:
+            cache.set(self._version_key, _version_inicial(), None)
+
+
+def reference_cache(name, models):
+    """
+    Registra `loader` como conjunto de referencia invalidado por `models`
+    ('app.Modelo'). Otras apps pueden declarar sus propios conjuntos.
+    """
+    def decorator(loader):
+        ref = ReferenceCache(name, loader, models)
+        _registry[name] = ref
+        for label in models:
+            # El emisor como 'app.Modelo' se resuelve cuando el modelo está cargado
+            for signal in (post_save, post_delete):
+                signal.connect(_invalidar_al_commit, sender=label, dispatch_uid=f'refdata:{id(signal)}:{label}')
+        return ref
+    return decorator
+
+
+def _invalidar_al_commit(sender, **kwargs):
+    for ref in _registry.values():
+        if sender._meta.label in ref.models:
+            transaction.on_commit(ref.invalidate)
+
+
+def invalidate_all():
+    for ref in _registry.values():
+        ref.invalidate()
+
+
+# =====================================================
+# CONJUNTOS Y ACCESORES
+# =====================================================
+
+@reference_cache('algoritmo_config', models=('cases.AlgoritmoConfig',))
+def _algoritmo_config():
+    from cases.mdt_models import AlgoritmoConfig
+    # Lista para poder cachear también "no hay configuración activa"
+    return list(AlgoritmoConfig.objects.filter(activo=True)[:1])
+
+
+@reference_cache('tipos_cancer', models=('medicos.TipoCancer', 'medicos.MedicalGroup', 'medicos.Especialidad'))
+def _tipos_cancer():
+    from medicos.models import TipoCancer
+    return {
+        tc.pk: tc
+        for tc in TipoCancer.objects.select_related('grupo_medico', 'especialidad_principal').order_by('nombre')
+    }
+
+
+@reference_cache('especialidades', models=('medicos.Especialidad',))
+def _especialidades():
+    from medicos.models import Especialidad
+    return {e.pk: e for e in Especialidad.objects.order_by('nombre')}
+
+
+@reference_cache('localidades', models=('medicos.Localidad',))
+def _localidades():
+    from medicos.models import Localidad
+    return {loc.pk: loc for loc in Localidad.objects.order_by('nombre')}
+
+
+@reference_cache('email_templates', models=('notifications.EmailTemplate',))
+def _email_templates():
+    from notifications.models import EmailTemplate
+    return {t.name: t for t in EmailTemplate.objects.all()}
+
+
+def _pk(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def algoritmo_config():
+    """`AlgoritmoConfig` activo o None."""
+    activos = _algoritmo_config.get()
+    return activos[0] if activos else None
+
+
+def tipo_cancer(pk):
+    """`TipoCancer` (con `grupo_medico` y `especialidad_principal` cargados) o None."""
+    return _tipos_cancer.get().get(_pk(pk))
+
+
+def tipos_cancer_activos():
+    return [tc for tc in _tipos_cancer.get().values() if tc.activo]
+
+
+def especialidad(pk):
+    return _especialidades.get().get(_pk(pk))
+
+
+def especialidades_activas():
+    return [e for e in _especialidades.get().values() if e.activa]
+
+
+def localidad(pk):
+    return _localidades.get().get(_pk(pk))
+
+
+def email_template(name):
+    return _email_templates.get().get(name)
@@ -1,3 +1,28 @@
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from core import reference_data
+from medicos.models import TipoCancer
+
+
+class ReferenceDataCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reference_data.invalidate_all()
+
+    def test_read_through_and_invalidation_on_save(self):
+        tc = TipoCancer.objects.create(nombre='Mama', codigo='MAMA')
+        self.assertEqual(reference_data.tipo_cancer(tc.pk).nombre, 'Mama')
+        with self.assertNumQueries(0):
+            self.assertEqual(reference_data.tipo_cancer(str(tc.pk)).nombre, 'Mama')
+            self.assertEqual([t.pk for t in reference_data.tipos_cancer_activos()], [tc.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tc.activo = False
+            tc.save()
+        self.assertEqual(reference_data.tipos_cancer_activos(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tc.delete()
+        self.assertIsNone(reference_data.tipo_cancer(tc.pk))
+
@@ -0,0 +1,272 @@
+"""
+Anonimización de DICOM reescribiendo solo la cabecera.
+
+`pydicom.dcmread(..., stop_before_pixels=True)` deja el fichero posicionado
+al inicio del elemento PixelData. Se aplica el perfil de tags a la cabecera,
+se escribe de nuevo y el resto del fichero (los píxeles) se copia byte a byte
+sin decodificarlo. En S3 ni siquiera se descarga: la cola de píxeles se copia
+en el servidor con `upload_part_copy`.
+
+Los elementos que aparecen después de PixelData (p. ej. padding final) se
+copian sin modificar. Las series (varios ficheros o un ZIP) se procesan en
+paralelo con un pool de procesos.
+"""
+
+import io
+import logging
+import os
+import shutil
+import tempfile
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+try:
+    import pydicom
+    from pydicom.errors import InvalidDicomError
+    PYDICOM_AVAILABLE = True
+except ImportError:
+    PYDICOM_AVAILABLE = False
+
+    class InvalidDicomError(Exception):
+        pass
+
+
+# Keyword DICOM -> acción ('blank' vacía el valor, 'remove' elimina el elemento)
+DEFAULT_TAG_PROFILE = {
+    'PatientName': 'blank',
+    'PatientID': 'blank',
+    'PatientBirthDate': 'blank',
+    'PatientBirthTime': 'blank',
+    'PatientAddress': 'blank',
+    'OtherPatientIDs': 'remove',
+    'OtherPatientNames': 'remove',
+    'PatientTelephoneNumbers': 'remove',
+    'PatientMotherBirthName': 'remove',
+    'ReferringPhysicianName': 'blank',
+    'InstitutionAddress': 'remove',
+    'AccessionNumber': 'blank',
+}
+
+DEFLATED_TRANSFER_SYNTAX = '1.2.840.10008.1.2.1.99'
+COPY_BUFFER_SIZE = 1024 * 1024
+# Tamaño mínimo de parte en una subida multiparte de S3 (salvo la última)
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+S3_COPY_PART_SIZE = 512 * 1024 * 1024
+
+
+def get_tag_profile():
+    """Perfil configurado en `settings.DICOM_ANONYMIZATION_PROFILE` o el de por defecto."""
+    return getattr(settings, 'DICOM_ANONYMIZATION_PROFILE', None) or DEFAULT_TAG_PROFILE
+
+
+def apply_profile(ds, profile, remove_private=True):
+    """Aplica el perfil de tags a un Dataset (sin tocar PixelData)."""
+    for keyword, action in profile.items():
+        if keyword not in ds:
+            continue
+        if action == 'remove':
+            delattr(ds, keyword)
+        else:
+            ds.data_element(keyword).value = ''
+    if remove_private:
+        ds.remove_private_tags()
+    # Las longitudes de grupo (gggg,0000) dejan de ser válidas al cambiar valores
+    for tag in [t for t in ds.keys() if t.element == 0 and t.group != 0x0002]:
+        del ds[tag]
+    return ds
+
+
+def _write_header(ds, out):
+    try:
+        ds.save_as(out, enforce_file_format=False)
+    except TypeError:
+        # pydicom < 3
+        ds.save_as(out, write_like_original=True)
+
+
+def read_header(fp):
+    """
+    Lee la cabecera DICOM de `fp` (file-like con seek) sin leer los píxeles.
+
+    Returns:
+        (Dataset, offset) donde `offset` es la posición de inicio de PixelData
+        (o el final de fichero si no tiene píxeles).
+    """
+    if not PYDICOM_AVAILABLE:
+        raise RuntimeError('pydicom no está instalado')
+    ds = pydicom.dcmread(fp, stop_before_pixels=True)
+    return ds, fp.tell()
+
+
+def anonymize_file(src_path, dst_path, profile=None, remove_private=True):
+    """
+    Anonimiza un fichero DICOM reescribiendo solo la cabecera.
+
+    Lanza InvalidDicomError si el fichero no es DICOM.
+    """
+    profile = profile or get_tag_profile()
+    with open(src_path, 'rb') as src:
+        ds, offset = read_header(src)
+        apply_profile(ds, profile, remove_private=remove_private)
+
+        if getattr(ds.file_meta, 'TransferSyntaxUID', None) == DEFLATED_TRANSFER_SYNTAX:
+            # Dataset comprimido entero: no hay cola de píxeles que copiar aparte
+            full = pydicom.dcmread(src_path)
+            apply_profile(full, profile, remove_private=remove_private)
+            with open(dst_path, 'wb') as out:
+                _write_header(full, out)
+            return dst_path
+
+        with open(dst_path, 'wb') as out:
+            _write_header(ds, out)
+            src.seek(offset)
+            shutil.copyfileobj(src, out, COPY_BUFFER_SIZE)
+    return dst_path
+
+
+def _anonymize_job(args):
+    """Punto de entrada del pool: devuelve (src, dst, error)."""
+    src_path, dst_path, profile, remove_private = args
+    try:
+        anonymize_file(src_path, dst_path, profile, remove_private)
+        return src_path, dst_path, None
+    except InvalidDicomError:
+        return src_path, None, 'no es DICOM'
+    except Exception as e:
+        return src_path, None, str(e)
+
+
+def anonymize_series(pairs, workers=None, profile=None, remove_private=True):
+    """
+    Anonimiza en paralelo una lista de `(origen, destino)`.
+
+    Returns:
+        list de (origen, destino o None, error o None) en el mismo orden.
+    """
+    profile = profile or get_tag_profile()
+    workers = workers or getattr(settings, 'DICOM_ANONYMIZATION_WORKERS', None) or os.cpu_count() or 1
+    jobs = [(src, dst, profile, remove_private) for src, dst in pairs]
+    if workers <= 1 or len(jobs) <= 1:
+        return [_anonymize_job(job) for job in jobs]
+    # Los workers prefork de Celery son procesos daemon y no pueden crear
+    # hijos: ahí se usan hilos (el trabajo es sobre todo E/S)
+    executor_cls = ThreadPoolExecutor if multiprocessing.current_process().daemon else ProcessPoolExecutor
+    with executor_cls(max_workers=workers) as executor:
+        return list(executor.map(_anonymize_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+def anonymize_zip(src_zip, dst_zip, workers=None, profile=None, remove_private=True):
+    """
+    Anonimiza todos los DICOM de un ZIP y escribe un ZIP nuevo.
+
+    Los miembros que no son DICOM no se copian al ZIP de salida (podrían
+    contener datos identificativos); se devuelven en `omitidos`.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        src_dir = os.path.join(tmp, 'in')
+        dst_dir = os.path.join(tmp, 'out')
+        os.makedirs(dst_dir)
+        pairs = []
+        with zipfile.ZipFile(src_zip) as zf:
+            for i, info in enumerate(m for m in zf.infolist() if not m.is_dir()):
+                # Nombre interno seguro; el nombre original solo se usa en el ZIP de salida
+                src = zf.extract(info, os.path.join(src_dir, str(i)))
+                pairs.append((src, os.path.join(dst_dir, str(i)), info.filename))
+
+        resultados = anonymize_series([(s, d) for s, d, _ in pairs], workers, profile, remove_private)
+
+        omitidos = []
+        with zipfile.ZipFile(dst_zip, 'w', compression=zipfile.ZIP_DEFLATED) as out:
+            for (_, _, arcname), (_, dst, error) in zip(pairs, resultados):
+                if error:
+                    omitidos.append((arcname, error))
+                    continue
+                out.write(dst, arcname)
+    return {'anonimizados': len(pairs) - len(omitidos), 'omitidos': omitidos}
+
+
+def anonymize_s3_object(s3, bucket, key, dst_key, profile=None, remove_private=True, probe_size=256 * 1024):
+    """
+    Anonimiza un DICOM en S3 sin descargar sus píxeles.
+
+    Descarga solo el inicio del objeto (ampliando hasta que la cabecera
+    completa quepa), reescribe la cabecera y compone el objeto destino con
+    una subida multiparte: la primera parte es la cabecera nueva más el
+    comienzo de los píxeles y el resto se copia en el servidor con
+    `upload_part_copy`.
+    """
+    profile = profile or get_tag_profile()
+    size = s3.head_object(Bucket=bucket, Key=key)['ContentLength']
+
+    def get_range(start, end):
+        return s3.get_object(Bucket=bucket, Key=key, Range=f'bytes={start}-{end}')['Body'].read()
+
+    # Al menos el preámbulo y el prefijo DICM para poder validar el formato
+    probe = min(max(probe_size, 1024), size)
+    while True:
+        head = get_range(0, probe - 1)
+        try:
+            ds, offset = read_header(io.BytesIO(head))
+            # Cabecera completa si PixelData empieza dentro del bloque leído
+            if offset < len(head) or probe == size:
+                break
+        except InvalidDicomError:
+            raise
+        except Exception:
+            # Cabecera truncada por el bloque leído
+            if probe == size:
+                raise
+        probe = min(probe * 4, size)
+
+    apply_profile(ds, profile, remove_private=remove_private)
+    header = io.BytesIO()
+    _write_header(ds, header)
+    header = header.getvalue()
+
+    tail_size = size - offset
+    if len(header) + tail_size <= 2 * S3_MIN_PART_SIZE:
+        # Objeto pequeño: una sola escritura
+        body = header + (get_range(offset, size - 1) if tail_size else b'')
+        s3.put_object(Bucket=bucket, Key=dst_key, Body=body)
+        return dst_key
+
+    upload = s3.create_multipart_upload(Bucket=bucket, Key=dst_key)
+    upload_id = upload['UploadId']
+    try:
+        parts = []
+        first_end = offset + S3_MIN_PART_SIZE - 1
+        first = header + get_range(offset, first_end)
+        etag = s3.upload_part(Bucket=bucket, Key=dst_key, UploadId=upload_id, PartNumber=1, Body=first)['ETag']
+        parts.append({'PartNumber': 1, 'ETag': etag})
+
+        start = first_end + 1
+        part_number = 2
+        while start < size:
+            end = min(start + S3_COPY_PART_SIZE, size) - 1
+            # La última parte puede ser pequeña; si la penúltima lo fuera, se une
+            if size - (end + 1) < S3_MIN_PART_SIZE:
+                end = size - 1
+            result = s3.upload_part_copy(
+                Bucket=bucket,
+                Key=dst_key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                CopySource={'Bucket': bucket, 'Key': key},
+                CopySourceRange=f'bytes={start}-{end}',
+            )
+            parts.append({'PartNumber': part_number, 'ETag': result['CopyPartResult']['ETag']})
+            start = end + 1
+            part_number += 1
+
+        s3.complete_multipart_upload(
+            Bucket=bucket, Key=dst_key, UploadId=upload_id, MultipartUpload={'Parts': parts}
+        )
+    except Exception:
+        s3.abort_multipart_upload(Bucket=bucket, Key=dst_key, UploadId=upload_id)
+        raise
+    return dst_key
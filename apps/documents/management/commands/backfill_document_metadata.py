@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from cases.models import CaseDocument
+from documents.metadata import METADATA_FIELDS, apply_metadata, extract_from_chunks
+from documents.storage import get_object_store
+
+
+class Command(BaseCommand):
+    help = 'Rellena tamaño, tipo MIME, páginas, dimensiones y modalidad DICOM de los CaseDocument existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Documentos por lote de bulk_update')
+        parser.add_argument('--force', action='store_true', help='Recalcular también los que ya tienen metadatos')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar los documentos pendientes')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        qs = CaseDocument.objects.order_by('pk')
+        if not options['force']:
+            qs = qs.filter(Q(file_size__isnull=True) | Q(mime_type=''))
+
+        total = qs.count()
+        self.stdout.write(f'Documentos a procesar: {total}')
+        if options['dry_run'] or not total:
+            return
+
+        store = None
+        actualizados = errores = 0
+        inicio = time.monotonic()
+        ultimo_pk = 0
+        while True:
+            # Paginación por pk: los documentos ya rellenados salen del filtro
+            lote = list(qs.filter(pk__gt=ultimo_pk)[:batch_size])
+            if not lote:
+                break
+            ultimo_pk = lote[-1].pk
+
+            cambiados = []
+            for doc in lote:
+                try:
+                    if doc.file and doc.file.name:
+                        meta = extract_from_chunks(self._chunks_fichero(doc), doc.file_name)
+                    elif doc.s3_file_path:
+                        store = store or get_object_store()
+                        meta = extract_from_chunks(store.iter_chunks(doc.s3_file_path), doc.file_name)
+                    else:
+                        continue
+                except Exception as e:
+                    errores += 1
+                    self.stderr.write(f'CaseDocument id={doc.pk}: {e}')
+                    continue
+                if apply_metadata(doc, meta):
+                    cambiados.append(doc)
+
+            CaseDocument.objects.bulk_update(cambiados, METADATA_FIELDS)
+            actualizados += len(cambiados)
+            self.stdout.write(
+                f'Procesados hasta id={ultimo_pk}: {actualizados} actualizados, {errores} errores '
+                f'({time.monotonic() - inicio:.1f}s)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Proceso finalizado. Actualizados={actualizados} Errores={errores}'))
+
+    @staticmethod
+    def _chunks_fichero(doc):
+        with doc.file.storage.open(doc.file.name, 'rb') as f:
+            yield from f.chunks()
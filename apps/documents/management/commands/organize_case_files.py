@@ -1,11 +1,16 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-from django.db import transaction
+from django.db.models import Q
 from cases.models import CaseDocument, Case
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
 import os
 import shutil
-import boto3
+import time
 from botocore.exceptions import ClientError
+from documents.storage import get_s3_client, s3_bucket_name
+
+DEFAULT_CHECKPOINT = '.organize_case_files.checkpoint.json'
 
 
 class Command(BaseCommand):
@@ -16,6 +21,15 @@ class Command(BaseCommand):
         parser.add_argument('--s3', action='store_true', help='Operar sobre S3 (por defecto opera sobre MEDIA_ROOT si existe)')
         parser.add_argument('--delete-old', action='store_true', help='Eliminar objetos/archivos antiguos después de copiar (use con precaución)')
         parser.add_argument('--confirm', action='store_true', help='Confirmación necesaria para borrar cuando se usa --delete-old')
+        parser.add_argument('--workers', type=int, default=8, help='Copias concurrentes (hilos)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Documentos por lote de bulk_update y checkpoint')
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            default=os.path.join(settings.BASE_DIR, DEFAULT_CHECKPOINT),
+            help='Fichero de checkpoint para reanudar',
+        )
+        parser.add_argument('--reset', action='store_true', help='Ignorar el checkpoint existente y empezar de cero')
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
@@ -26,26 +40,63 @@ class Command(BaseCommand):
         if delete_old and not confirm:
             raise CommandError('Para borrar archivos antiguas con --delete-old debe pasar también --confirm')
 
-        docs = CaseDocument.objects.select_related('case').all()
+        # Orden por pk: el checkpoint guarda el último pk procesado
+        docs = CaseDocument.objects.select_related('case').order_by('pk')
         if not docs.exists():
             self.stdout.write('No se encontraron CaseDocument en la base de datos.')
             return
 
+        self.s3 = None
+        self.bucket = None
         if use_s3:
-            bucket = getattr(settings, 'AWS_S3_BUCKET_NAME', None)
-            if not bucket:
-                raise CommandError('No está configurado AWS_S3_BUCKET_NAME en settings')
-            s3 = boto3.client(
-                's3',
-                aws_access_key_id=getattr(settings, 'AWS_ACCESS_KEY_ID', None),
-                aws_secret_access_key=getattr(settings, 'AWS_SECRET_ACCESS_KEY', None),
-                region_name=getattr(settings, 'AWS_REGION', None),
-            )
+            self.bucket = s3_bucket_name()
+            if not self.bucket:
+                raise CommandError('No está configurado AWS_S3_BUCKET_NAME ni AWS_STORAGE_BUCKET_NAME en settings')
+            self.s3 = get_s3_client()
+
+        # La simulación no usa ni modifica el checkpoint: su salida no cambia
+        checkpoint_path = options['checkpoint']
+        filtros = {'s3': use_s3}
+        progreso = {'ultimo_pk': None, 'fallidos': set()}
+        if not dry_run and not options['reset']:
+            progreso = self._cargar_checkpoint(checkpoint_path, filtros)
+            if progreso['ultimo_pk'] is not None:
+                self.stdout.write(
+                    f"Reanudando tras el documento {progreso['ultimo_pk']} "
+                    f"({len(progreso['fallidos'])} fallidos para reintentar)"
+                )
+                # Los fallidos son pocos; el resto se recorre por rango de pk
+                docs = docs.filter(Q(pk__gt=progreso['ultimo_pk']) | Q(pk__in=progreso['fallidos']))
+
+        movimientos, errors = self._planificar(docs, use_s3)
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f'Proceso finalizado. Moved=0 Errors={errors}'))
+            return
 
-        moved = 0
+        moved, fallidos = self._ejecutar(
+            movimientos,
+            workers=max(1, options['workers']),
+            batch_size=max(1, options['batch_size']),
+            delete_old=delete_old,
+            checkpoint_path=checkpoint_path,
+            filtros=filtros,
+            progreso=progreso,
+        )
+        errors += fallidos
+
+        self.stdout.write(self.style.SUCCESS(f'Proceso finalizado. Moved={moved} Errors={errors}'))
+
+    def _planificar(self, docs, use_s3):
+        """
+        Recorre los documentos y decide qué mover, escribiendo las mismas
+        líneas que la versión secuencial. Devuelve `(movimientos, errores)`
+        con movimientos `(cd, tipo, origen, destino, nuevo_valor)`.
+        """
+        movimientos = []
         errors = 0
 
-        for cd in docs:
+        for cd in docs.iterator(chunk_size=2000):
             try:
                 case = cd.case
                 if not case or not case.case_id:
@@ -64,18 +115,7 @@ class Command(BaseCommand):
                     new_key = f"{desired_prefix}{filename}"
 
                     self.stdout.write(f"S3: Caso {case.case_id} - mover {current_key} -> {new_key}")
-                    if not dry_run:
-                        # Copy object
-                        s3.copy_object(Bucket=bucket, CopySource={'Bucket': bucket, 'Key': current_key}, Key=new_key)
-                        # Update DB
-                        cd.s3_file_path = new_key
-                        cd.save()
-                        if delete_old:
-                            try:
-                                s3.delete_object(Bucket=bucket, Key=current_key)
-                            except ClientError as e:
-                                self.stderr.write(f'Error borrando objeto {current_key}: {e}')
-                        moved += 1
+                    movimientos.append((cd, 's3', current_key, new_key, new_key))
 
                 else:
                     # Operar sobre filesystem: MEDIA_ROOT
@@ -104,23 +144,108 @@ class Command(BaseCommand):
                             continue
 
                     dest_dir = os.path.join(media_root, 'cases', str(case.case_id))
-                    os.makedirs(dest_dir, exist_ok=True)
                     dest_path = os.path.join(dest_dir, os.path.basename(src_path))
 
                     self.stdout.write(f'FS: Caso {case.case_id} - mover {src_path} -> {dest_path}')
-                    if not dry_run:
-                        shutil.copy2(src_path, dest_path)
-                        cd.s3_file_path = os.path.relpath(dest_path, media_root)
-                        cd.save()
-                        if delete_old:
-                            try:
-                                os.remove(src_path)
-                            except Exception as e:
-                                self.stderr.write(f'Error borrando archivo {src_path}: {e}')
-                        moved += 1
+                    movimientos.append((cd, 'fs', src_path, dest_path, os.path.relpath(dest_path, media_root)))
 
             except Exception as e:
                 errors += 1
                 self.stderr.write(f'Error procesando CaseDocument id={getattr(cd, "id", "?")}: {e}')
 
-        self.stdout.write(self.style.SUCCESS(f'Proceso finalizado. Moved={moved} Errors={errors}'))
+        return movimientos, errors
+
+    def _copiar(self, movimiento):
+        cd, tipo, origen, destino, nuevo_valor = movimiento
+        if tipo == 's3':
+            self.s3.copy_object(Bucket=self.bucket, CopySource={'Bucket': self.bucket, 'Key': origen}, Key=destino)
+        else:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            shutil.copy2(origen, destino)
+        cd.s3_file_path = nuevo_valor
+        return movimiento
+
+    def _borrar_origen(self, tipo, origen):
+        if tipo == 's3':
+            try:
+                self.s3.delete_object(Bucket=self.bucket, Key=origen)
+            except ClientError as e:
+                self.stderr.write(f'Error borrando objeto {origen}: {e}')
+        else:
+            try:
+                os.remove(origen)
+            except Exception as e:
+                self.stderr.write(f'Error borrando archivo {origen}: {e}')
+
+    def _ejecutar(self, movimientos, workers, batch_size, delete_old, checkpoint_path, filtros, progreso):
+        """Copia en paralelo y guarda por lotes; devuelve `(movidos, errores)`."""
+        moved = 0
+        errors = 0
+        inicio = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for i in range(0, len(movimientos), batch_size):
+                lote = movimientos[i:i + batch_size]
+                copiados, fallidos = [], []
+                futuros = {executor.submit(self._copiar, m): m for m in lote}
+                for futuro in as_completed(futuros):
+                    cd = futuros[futuro][0]
+                    try:
+                        copiados.append(futuro.result())
+                    except Exception as e:
+                        errors += 1
+                        fallidos.append(cd.pk)
+                        self.stderr.write(f'Error procesando CaseDocument id={cd.id}: {e}')
+
+                # El origen solo se borra cuando la BD ya apunta a la copia
+                CaseDocument.objects.bulk_update([m[0] for m in copiados], ['s3_file_path'])
+                if delete_old:
+                    for _, tipo, origen, _, _ in copiados:
+                        self._borrar_origen(tipo, origen)
+
+                moved += len(copiados)
+                # Los lotes van en orden de pk: todo hasta el último del lote
+                # se ha intentado; los fallidos se guardan aparte para reintentarlos
+                progreso['ultimo_pk'] = max(progreso['ultimo_pk'] or 0, max(m[0].pk for m in lote))
+                progreso['fallidos'].difference_update(m[0].pk for m in copiados)
+                progreso['fallidos'].update(fallidos)
+                self._guardar_checkpoint(checkpoint_path, filtros, progreso)
+
+                transcurrido = time.monotonic() - inicio
+                self.stdout.write(
+                    f'Lote {i // batch_size + 1}: {moved}/{len(movimientos)} documentos '
+                    f'({moved / transcurrido:.1f} docs/s)'
+                )
+
+        transcurrido = time.monotonic() - inicio
+        if movimientos:
+            self.stdout.write(f'Tiempo={transcurrido:.1f}s Throughput={moved / transcurrido:.1f} docs/s')
+        return moved, errors
+
+    @staticmethod
+    def _cargar_checkpoint(path, filtros):
+        progreso = {'ultimo_pk': None, 'fallidos': set()}
+        if not os.path.exists(path):
+            return progreso
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('filtros') != filtros or 'ultimo_pk' not in data:
+            raise CommandError(
+                f'El checkpoint {path} corresponde a otros filtros o a un formato anterior ({data.get("filtros")}). '
+                'Usa --reset para empezar de cero.'
+            )
+        progreso['ultimo_pk'] = data['ultimo_pk']
+        progreso['fallidos'] = set(data.get('fallidos', []))
+        return progreso
+
+    @staticmethod
+    def _guardar_checkpoint(path, filtros, progreso):
+        # Escritura atómica: un corte a mitad no deja el checkpoint corrupto
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'filtros': filtros,
+                'ultimo_pk': progreso['ultimo_pk'],
+                'fallidos': sorted(progreso['fallidos']),
+            }, f)
+        os.replace(tmp, path)
@@ -0,0 +1,174 @@
+"""
+Metadatos de documentos extraídos en una sola pasada al ingerirlos.
+
+`MetadataExtractor` recibe los mismos bloques que ya se leen para otra cosa
+(el SHA-256 del blob, la escritura de una subida local, la copia desde S3) y
+al terminar devuelve tamaño, tipo MIME detectado por firma, número de
+páginas de los PDF, dimensiones de imagen y modalidad DICOM, sin volver a
+leer el archivo.
+
+Solo se conservan en memoria los primeros `HEAD_SIZE` bytes (cabeceras de
+imagen y DICOM); las páginas de un PDF se cuentan buscando `/Type /Page` en
+el flujo. Los PDF con objetos comprimidos (object streams) pueden no
+exponer esos marcadores: en ese caso `page_count` queda vacío.
+"""
+
+import io
+import mimetypes
+import re
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    import pydicom
+    PYDICOM_AVAILABLE = True
+except ImportError:
+    PYDICOM_AVAILABLE = False
+
+HEAD_SIZE = 256 * 1024
+PDF_PAGE_RE = re.compile(rb'/Type\s{0,8}/Page(?![A-Za-z])')
+# Más que la longitud máxima de una coincidencia de PDF_PAGE_RE
+PDF_CARRY = 64
+
+METADATA_FIELDS = ['file_size', 'mime_type', 'page_count', 'image_width', 'image_height', 'dicom_modality']
+
+# (firma, desplazamiento, tipo MIME)
+SIGNATURES = [
+    (b'%PDF-', 0, 'application/pdf'),
+    (b'DICM', 128, 'application/dicom'),
+    (b'\x89PNG\r\n\x1a\n', 0, 'image/png'),
+    (b'\xff\xd8\xff', 0, 'image/jpeg'),
+    (b'GIF87a', 0, 'image/gif'),
+    (b'GIF89a', 0, 'image/gif'),
+    (b'II*\x00', 0, 'image/tiff'),
+    (b'MM\x00*', 0, 'image/tiff'),
+    (b'BM', 0, 'image/bmp'),
+    (b'PK\x03\x04', 0, 'application/zip'),
+    (b'\x1f\x8b', 0, 'application/gzip'),
+]
+
+
+def sniff_mime_type(head, file_name=''):
+    """Tipo MIME por firma de los primeros bytes; la extensión solo desempata."""
+    guessed = mimetypes.guess_type(file_name or '')[0] or ''
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, offset, mime in SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            # docx/xlsx/odt son ZIP: se respeta la extensión si es un formato ZIP
+            if mime == 'application/zip' and guessed.startswith('application/vnd.'):
+                return guessed
+            return mime
+    if guessed:
+        return guessed
+    try:
+        head[:4096].decode('utf-8')
+        return 'text/plain' if head else 'application/octet-stream'
+    except UnicodeDecodeError:
+        return 'application/octet-stream'
+
+
+class MetadataExtractor:
+    """Acumula bloques del archivo y calcula sus metadatos al final."""
+
+    def __init__(self, file_name=''):
+        self.file_name = file_name
+        self.size = 0
+        self._head = bytearray()
+        self._pdf = None
+        self._pdf_carry = b''
+        self._pdf_pages = 0
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        if len(self._head) < HEAD_SIZE:
+            self._head += chunk[:HEAD_SIZE - len(self._head)]
+        if self._pdf is None and len(self._head) >= 5:
+            self._pdf = bytes(self._head[:5]) == b'%PDF-'
+        if self._pdf:
+            self._scan_pdf(self._pdf_carry + bytes(chunk), final=False)
+        self.size += len(chunk)
+
+    def _scan_pdf(self, buf, final):
+        # Solo cuentan las coincidencias con carácter siguiente disponible
+        # (o fin de archivo); el resto pasa al siguiente bloque
+        limit = len(buf) if final else len(buf) - 1
+        last_end = 0
+        for match in PDF_PAGE_RE.finditer(buf):
+            if match.end() > limit:
+                break
+            self._pdf_pages += 1
+            last_end = match.end()
+        self._pdf_carry = b'' if final else buf[max(len(buf) - PDF_CARRY, last_end):]
+
+    def result(self):
+        head = bytes(self._head)
+        meta = {
+            'file_size': self.size,
+            'mime_type': sniff_mime_type(head, self.file_name),
+            'page_count': None,
+            'image_width': None,
+            'image_height': None,
+            'dicom_modality': '',
+        }
+        if self._pdf:
+            self._scan_pdf(self._pdf_carry, final=True)
+            meta['page_count'] = self._pdf_pages or None
+        elif meta['mime_type'] == 'application/dicom':
+            meta.update(_dicom_metadata(head))
+        elif meta['mime_type'].startswith('image/'):
+            meta.update(_image_metadata(head))
+        return meta
+
+
+def _image_metadata(head):
+    if not PIL_AVAILABLE:
+        return {}
+    try:
+        # Image.open solo decodifica la cabecera
+        with Image.open(io.BytesIO(head)) as img:
+            width, height = img.size
+        return {'image_width': width, 'image_height': height}
+    except Exception:
+        return {}
+
+
+def _dicom_metadata(head):
+    if not PYDICOM_AVAILABLE:
+        return {}
+    try:
+        ds = pydicom.dcmread(io.BytesIO(head), stop_before_pixels=True)
+    except Exception:
+        # Cabecera mayor que HEAD_SIZE o DICOM no válido
+        return {}
+    return {
+        'dicom_modality': str(ds.get('Modality', '') or '')[:16],
+        'image_width': ds.get('Columns'),
+        'image_height': ds.get('Rows'),
+    }
+
+
+def extract_from_chunks(chunks, file_name=''):
+    """Metadatos de un iterable de bloques de bytes."""
+    extractor = MetadataExtractor(file_name)
+    for chunk in chunks:
+        extractor.feed(chunk)
+    return extractor.result()
+
+
+def apply_metadata(doc, meta):
+    """Asigna los metadatos al CaseDocument y devuelve los campos modificados."""
+    changed = []
+    for field in METADATA_FIELDS:
+        value = meta.get(field)
+        if value is None and field in ('mime_type', 'dicom_modality'):
+            value = ''
+        if getattr(doc, field) != value:
+            setattr(doc, field, value)
+            changed.append(field)
+    return changed
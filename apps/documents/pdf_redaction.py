@@ -0,0 +1,144 @@
+"""
+Anonimización del texto de documentos PDF.
+
+Se extrae el texto página a página con pypdf y se pasa por el redactor de
+PII de `cases.anonymization`. Las páginas se reparten en rangos entre un
+pool de procesos (hilos dentro de los workers prefork de Celery, que no
+pueden crear hijos); cada proceso abre el PDF una vez por rango, así que un
+historial de cientos de páginas no queda limitado a un solo núcleo.
+
+El resultado es una versión de texto redactada que se guarda en el storage
+de documentos en `cases/<case_id>/redacted/<doc_id>.txt`: depende del
+paciente del caso, por eso es por documento y no por blob.
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+try:
+    from pypdf import PdfReader
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+PDF_EXTENSIONS = {'.pdf'}
+
+
+def is_pdf(doc):
+    mime = (doc.mime_type or '').lower()
+    ext = os.path.splitext(doc.file_name or doc.file.name or doc.s3_file_path or '')[1].lower()
+    return mime == 'application/pdf' or ext in PDF_EXTENSIONS
+
+
+def redacted_text_key(case_id, doc_pk):
+    """Nombre en el storage del texto redactado, sin cargar el documento ni el caso."""
+    return f'cases/{case_id}/redacted/{doc_pk}.txt'
+
+
+def redacted_text_name(doc):
+    """Nombre en el storage de la versión de texto redactada del documento."""
+    return redacted_text_key(doc.case.case_id, doc.pk)
+
+
+def page_count(path):
+    if not PYPDF_AVAILABLE:
+        raise RuntimeError('pypdf no está instalado')
+    return len(PdfReader(path).pages)
+
+
+def _redact_range(args):
+    """Punto de entrada del pool: devuelve `(inicio, [texto redactado por página])`."""
+    from cases.anonymization import anonimizar_lote
+
+    path, start, end, nombres = args
+    reader = PdfReader(path)
+    textos = []
+    for i in range(start, end):
+        try:
+            textos.append(reader.pages[i].extract_text() or '')
+        except Exception as e:
+            # Una página ilegible no invalida el resto del documento
+            log.warning('pdf_redaction: página %s de %s ilegible: %s', i + 1, path, e)
+            textos.append('')
+    return start, anonimizar_lote(textos, nombres)
+
+
+def redact_pdf(path, nombres=None, workers=None, progress=None):
+    """
+    Devuelve la lista de textos redactados de cada página de `path`.
+
+    `progress(paginas_hechas, total)` se llama cada vez que termina un rango.
+    """
+    total = page_count(path)
+    if not total:
+        return []
+    workers = workers or getattr(settings, 'PDF_REDACTION_WORKERS', None) or os.cpu_count() or 1
+    # Varios rangos por worker para repartir bien páginas de coste desigual
+    size = max(1, math.ceil(total / (workers * 4)))
+    jobs = [(path, start, min(start + size, total), nombres) for start in range(0, total, size)]
+
+    paginas = [None] * total
+    hechas = 0
+
+    def recoger(start, textos):
+        nonlocal hechas
+        paginas[start:start + len(textos)] = textos
+        hechas += len(textos)
+        if progress:
+            progress(hechas, total)
+
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            recoger(*_redact_range(job))
+        return paginas
+
+    executor_cls = ThreadPoolExecutor if multiprocessing.current_process().daemon else ProcessPoolExecutor
+    with executor_cls(max_workers=workers) as executor:
+        for future in as_completed([executor.submit(_redact_range, job) for job in jobs]):
+            recoger(*future.result())
+    return paginas
+
+
+def format_redacted_text(paginas):
+    return ''.join(f'--- Página {i} ---\n{texto.strip()}\n\n' for i, texto in enumerate(paginas, 1))
+
+
+@contextmanager
+def local_pdf_path(doc):
+    """Ruta local del PDF del documento; descarga a un temporal si hace falta."""
+    if doc.file and doc.file.name:
+        storage = doc.file.storage
+        try:
+            path = storage.path(doc.file.name)
+        except NotImplementedError:
+            path = None
+        if path:
+            yield path
+            return
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as tmp:
+            with storage.open(doc.file.name, 'rb') as src:
+                shutil.copyfileobj(src, tmp)
+            tmp.flush()
+            yield tmp.name
+        return
+
+    from .storage import get_object_store
+    store = get_object_store()
+    path = store.local_path(doc.s3_file_path)
+    if path:
+        yield path
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'documento.pdf')
+        store.download_file(doc.s3_file_path, path)
+        yield path
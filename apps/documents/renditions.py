@@ -0,0 +1,148 @@
+"""
+Renditions (miniatura y tamaño medio) de los documentos de imagen de un caso.
+
+Las renditions se guardan junto al archivo original con un nombre derivado
+(`<original>.<variante>.jpg`), de modo que no necesitan columnas propias y
+los documentos que comparten blob comparten también sus renditions. Se
+generan en segundo plano (`documents.tasks.generate_document_renditions`)
+y se borran junto con el archivo original.
+"""
+
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+
+log = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    import pydicom
+    PYDICOM_AVAILABLE = True
+except ImportError:
+    PYDICOM_AVAILABLE = False
+
+
+# Variante -> tamaño máximo (ancho, alto)
+RENDITION_SIZES = {
+    'thumb': (256, 256),
+    'medium': (1024, 1024),
+}
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.webp'}
+DICOM_EXTENSIONS = {'.dcm', '.dicom'}
+
+
+def rendition_name(name, variant):
+    """Nombre en el storage de la rendition `variant` del archivo `name`."""
+    return f'{name}.{variant}.jpg'
+
+
+def source_kind(doc):
+    """Devuelve 'image', 'dicom' o None según el tipo del documento."""
+    mime = (doc.mime_type or '').lower()
+    ext = os.path.splitext(doc.file_name or doc.file.name or '')[1].lower()
+    if mime == 'application/dicom' or ext in DICOM_EXTENSIONS:
+        return 'dicom'
+    if mime.startswith('image/') or ext in IMAGE_EXTENSIONS:
+        return 'image'
+    return None
+
+
+def enqueue_renditions(doc_pk):
+    """
+    Encola `generate_document_renditions` para el documento salvo que ya se
+    haya encolado en los últimos `RENDITION_ENQUEUE_DEBOUNCE` segundos (60 por
+    defecto): una página con varias miniaturas pendientes, recargada, no
+    encola la misma generación una vez por petición. Devuelve si se encoló.
+    """
+    if not cache.add(f'renditions:encolado:{doc_pk}', True, getattr(settings, 'RENDITION_ENQUEUE_DEBOUNCE', 60)):
+        return False
+    from .tasks import generate_document_renditions
+    generate_document_renditions.delay(doc_pk)
+    return True
+
+
+def _dicom_to_image(f):
+    """Convierte un DICOM (el corte central si tiene varios frames) a imagen Pillow."""
+    import numpy as np
+
+    ds = pydicom.dcmread(f)
+    pixels = ds.pixel_array
+    frames = int(getattr(ds, 'NumberOfFrames', 1) or 1)
+    if frames > 1:
+        pixels = pixels[frames // 2]
+
+    if pixels.ndim == 3 and pixels.shape[-1] in (3, 4):
+        return Image.fromarray(pixels.astype(np.uint8))
+
+    pixels = pixels.astype(np.float32)
+    low, high = float(pixels.min()), float(pixels.max())
+    if high > low:
+        pixels = (pixels - low) * (255.0 / (high - low))
+    else:
+        pixels = np.zeros_like(pixels)
+    if getattr(ds, 'PhotometricInterpretation', '') == 'MONOCHROME1':
+        pixels = 255.0 - pixels
+    return Image.fromarray(pixels.astype(np.uint8), mode='L')
+
+
+def load_source_image(doc):
+    """Abre el original del documento como imagen Pillow (o None si no aplica)."""
+    kind = source_kind(doc)
+    if kind is None or not PIL_AVAILABLE:
+        return None
+    if kind == 'dicom' and not PYDICOM_AVAILABLE:
+        return None
+
+    with doc.file.storage.open(doc.file.name, 'rb') as f:
+        if kind == 'dicom':
+            return _dicom_to_image(f)
+        image = Image.open(f)
+        image.load()
+        return image
+
+
+def generate_renditions(doc, variants=None):
+    """
+    Genera y guarda las renditions del documento.
+
+    Returns:
+        dict {variante: nombre en storage}; vacío si el documento no es una imagen.
+    """
+    image = load_source_image(doc)
+    if image is None:
+        return {}
+
+    storage = doc.file.storage
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    generadas = {}
+    # De mayor a menor: cada reducción parte de la anterior
+    for variant in sorted(variants or RENDITION_SIZES, key=lambda v: -RENDITION_SIZES[v][0]):
+        image.thumbnail(RENDITION_SIZES[variant])
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=85, optimize=True)
+        name = rendition_name(doc.file.name, variant)
+        if storage.exists(name):
+            storage.delete(name)
+        generadas[variant] = storage.save(name, ContentFile(buffer.getvalue()))
+    return generadas
+
+
+def delete_renditions(storage, name):
+    """Borra las renditions del archivo `name` (si existen)."""
+    for variant in RENDITION_SIZES:
+        try:
+            storage.delete(rendition_name(name, variant))
+        except Exception:
+            log.exception('Error borrando rendition %s de %s', variant, name)
@@ -1,57 +1,135 @@
+import os
+import shutil
 import uuid
-import boto3
 import logging
+from collections import Counter
+
 from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.deletion import Collector
+
+from .storage import get_object_store
 
 log = logging.getLogger(__name__)
 
 
 def generate_presigned_post(case, filename, content_type='', expires_in=3600):
-    """Genera un presigned POST para subida directa a S3 y devuelve (post_data, key).
+    """Genera un presigned POST para subida directa y devuelve (post_data, key).
 
-    Requiere que las credenciales AWS estén definidas en `settings`.
+    Con S3 requiere que las credenciales AWS estén definidas en `settings`;
+    con el almacén local devuelve una subida tokenizada equivalente.
     """
     log.info('generate_presigned_post start: case_id=%s filename=%s', getattr(case, 'case_id', None), filename)
-    s3 = boto3.client(
-        's3',
-        aws_access_key_id=getattr(settings, 'AWS_ACCESS_KEY_ID', None),
-        aws_secret_access_key=getattr(settings, 'AWS_SECRET_ACCESS_KEY', None),
-        region_name=getattr(settings, 'AWS_REGION', None),
-    )
-
     # Use deterministic per-case folder: cases/{case_id}/{filename}
     # To avoid collisions, prefix with a short uuid
     unique_prefix = uuid.uuid4().hex[:8]
     key = f"cases/{case.case_id}/{unique_prefix}_{filename}"
 
-    fields = {}
-    if content_type:
-        fields['Content-Type'] = content_type
-
-    post = s3.generate_presigned_post(
-        Bucket=getattr(settings, 'AWS_S3_BUCKET_NAME'),
-        Key=key,
-        Fields=fields,
-        Conditions=[],
-        ExpiresIn=expires_in,
-    )
+    post = get_object_store().presigned_post(key, content_type=content_type, expires_in=expires_in)
     log.info('generate_presigned_post end: case_id=%s key=%s', getattr(case, 'case_id', None), key)
     return post, key
 
 
-def schedule_delete_case_files(case_id, delay_seconds: int = 0):
+def delete_case_files(case, store=None):
+    """Borra en bloque los archivos y registros CaseDocument de un caso.
+
+    - Objetos del almacén (`s3_file_path`): DeleteObjects en lotes de 1000.
+    - Blobs deduplicados: se resta una referencia por documento y solo se
+      borran los que llegan a cero.
+    - Archivos locales heredados (FileField sin blob) y la carpeta
+      `MEDIA_ROOT/cases/<case_id>/`.
+    - Registros: un único `delete()` del queryset.
+
+    Los documentos cuyo objeto no se pudo borrar se conservan para que un
+    reintento los procese. Devuelve un resumen por caso.
+    """
+    from cases.blobs import BlobStorageService
+    from cases.models import CaseDocument
+
+    store = store or get_object_store()
+    docs = list(CaseDocument.objects.filter(case=case).values_list('id', 's3_file_path', 'blob_id', 'file'))
+    summary = {
+        'case_id': case.case_id,
+        'documents': len(docs),
+        'documents_deleted': 0,
+        'objects_deleted': 0,
+        'blobs_deleted': 0,
+        'local_files_deleted': 0,
+        'errors': [],
+    }
+    if not docs:
+        return summary
+
+    keys = [key for _, key, _, _ in docs if key]
+    borradas, errores = store.delete_many(keys) if keys else ([], [])
+    summary['objects_deleted'] = len(borradas)
+    summary['errors'].extend(f'{key}: {msg}' for key, msg in errores)
+    fallidas = {key for key, _ in errores}
+
+    eliminables = [d for d in docs if d[1] not in fallidas]
+    ids = [doc_id for doc_id, _, _, _ in eliminables]
+    refs = Counter(blob_id for _, _, blob_id, _ in eliminables if blob_id)
+    legacy = [name for _, _, blob_id, name in eliminables if name and not blob_id]
+
+    with transaction.atomic():
+        qs = CaseDocument.objects.filter(pk__in=ids)
+        redactados = list(
+            qs.filter(Q(is_anonymized=True) | Q(anonymization_progress__gt=0)).values_list('pk', flat=True)
+        )
+        # Desvincular antes de borrar: las referencias a blobs y los textos
+        # redactados se liberan aquí en bloque y el signal post_delete no tiene
+        # nada que liberar
+        qs.update(blob=None, file='', is_anonymized=False, anonymization_progress=0)
+        # Se borran con el caso ya en memoria: auditlog llama a `__str__` de
+        # cada documento, que si no cargaría el caso una vez por documento
+        instancias = list(qs)
+        for doc in instancias:
+            doc.case = case
+        collector = Collector(using=qs.db, origin=qs)
+        collector.collect(instancias)
+        summary['documents_deleted'] = collector.delete()[1].get(CaseDocument._meta.label, 0)
+        summary['blobs_deleted'] = BlobStorageService.release_many(refs)
+
+    from .pdf_redaction import redacted_text_key
+    for doc_id in redactados:
+        try:
+            default_storage.delete(redacted_text_key(case.case_id, doc_id))
+        except Exception as e:
+            summary['errors'].append(f'redacted/{doc_id}: {e}')
+
+    from .renditions import delete_renditions
+    for name in legacy:
+        try:
+            default_storage.delete(name)
+            delete_renditions(default_storage, name)
+            summary['local_files_deleted'] += 1
+        except Exception as e:
+            summary['errors'].append(f'{name}: {e}')
+
+    if not fallidas and isinstance(default_storage, FileSystemStorage):
+        case_folder = os.path.join(settings.MEDIA_ROOT, 'cases', case.case_id)
+        shutil.rmtree(case_folder, ignore_errors=True)
+
+    log.info('delete_case_files: %s', summary)
+    return summary
+
+
+def schedule_delete_case_files(case_id, delay_seconds: int = 0, enforce_state: bool = True):
     """Schedule asynchronous deletion of all case files. Uses Celery task if available.
 
     This function only enqueues the task; deletion behavior should be gated by
-    configuration (see settings.AUTO_DELETE_CASE_FILES).
+    configuration (see settings.AUTO_DELETE_CASE_FILES). With
+    `enforce_state=False` the task skips the CASE_FILE_DELETION_ALLOWED_STATES check.
     """
     log.info('schedule_delete_case_files requested for case_id=%s delay=%s', case_id, delay_seconds)
     try:
         from .tasks import delete_case_files_task
         if delay_seconds and hasattr(delete_case_files_task, 'apply_async'):
-            delete_case_files_task.apply_async((case_id,), countdown=delay_seconds)
+            delete_case_files_task.apply_async((case_id, enforce_state), countdown=delay_seconds)
         else:
-            delete_case_files_task.delay(case_id)
+            delete_case_files_task.delay(case_id, enforce_state)
         log.info('delete_case_files_task enqueued for case_id=%s', case_id)
     except Exception as e:
         log.exception('Failed to enqueue delete_case_files_task for case_id=%s: %s', case_id, e)
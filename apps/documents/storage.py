@@ -0,0 +1,285 @@
+"""
+Acceso al almacén de objetos de documentos (S3 o disco local).
+
+- `get_s3_client()` devuelve un cliente boto3 compartido por proceso. Los
+  clientes boto3 son thread-safe y mantienen un pool de conexiones HTTP, así
+  que reutilizarlo evita repetir la carga de endpoints y el handshake TLS en
+  cada tarea.
+- `get_object_store()` devuelve la implementación configurada en
+  `DOCUMENT_OBJECT_STORE` ('s3' o 'local'). Sin valor, se usa S3 si hay
+  bucket (`s3_bucket_name()`) y disco local en caso contrario. S3 sin bucket
+  es un error de configuración.
+
+`LocalObjectStore` imita las subidas presignadas de S3 con un token firmado
+que autoriza una única clave durante un tiempo limitado, de modo que todo el
+flujo de documentos funciona sin AWS.
+"""
+
+import os
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.urls import reverse
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+UPLOAD_TOKEN_SALT = 'documents.local-upload'
+# Máximo de claves por llamada a DeleteObjects de S3
+DELETE_BATCH_SIZE = 1000
+
+
+def s3_bucket_name():
+    """Bucket de documentos: `AWS_S3_BUCKET_NAME` o el de django-storages (`AWS_STORAGE_BUCKET_NAME`)."""
+    return getattr(settings, 'AWS_S3_BUCKET_NAME', None) or getattr(settings, 'AWS_STORAGE_BUCKET_NAME', None)
+
+
+def get_s3_client():
+    """Cliente S3 compartido (uno por proceso y configuración)."""
+    import boto3
+    from botocore.config import Config
+
+    key = (
+        os.getpid(),
+        getattr(settings, 'AWS_ACCESS_KEY_ID', None),
+        getattr(settings, 'AWS_REGION', None),
+        getattr(settings, 'AWS_S3_ENDPOINT_URL', None),
+    )
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = boto3.session.Session().client(
+                's3',
+                aws_access_key_id=getattr(settings, 'AWS_ACCESS_KEY_ID', None),
+                aws_secret_access_key=getattr(settings, 'AWS_SECRET_ACCESS_KEY', None),
+                region_name=getattr(settings, 'AWS_REGION', None),
+                endpoint_url=getattr(settings, 'AWS_S3_ENDPOINT_URL', None),
+                config=Config(
+                    max_pool_connections=getattr(settings, 'AWS_S3_MAX_POOL_CONNECTIONS', 50),
+                    retries={'max_attempts': 5, 'mode': 'standard'},
+                ),
+            )
+            _clients[key] = client
+    return client
+
+
+class ObjectStore(ABC):
+    """
+    Interfaz común de los almacenes de objetos. Un backend incompleto falla
+    al instanciarse, no en la primera llamada.
+    """
+
+    @abstractmethod
+    def presigned_post(self, key, content_type='', expires_in=3600):
+        """Devuelve `{'url', 'fields'}` para subir `key` directamente desde el navegador."""
+
+    def local_path(self, key):
+        """Ruta en disco del objeto, o None si el almacén no es local."""
+        return None
+
+    @abstractmethod
+    def download_file(self, key, path):
+        """Copia el objeto `key` al archivo local `path`."""
+
+    @abstractmethod
+    def upload_file(self, path, key):
+        """Sube el archivo local `path` como `key`."""
+
+    @abstractmethod
+    def copy(self, src_key, dst_key):
+        """Copia un objeto dentro del almacén."""
+
+    @abstractmethod
+    def exists(self, key):
+        """Indica si existe el objeto `key`."""
+
+    @abstractmethod
+    def iter_chunks(self, key, chunk_size=1024 * 1024):
+        """Lee el objeto por bloques sin descargarlo a disco."""
+
+    @abstractmethod
+    def delete(self, key):
+        """Borra el objeto; no falla si no existe."""
+
+    def delete_many(self, keys):
+        """
+        Borra varias claves. Devuelve `(borradas, errores)` donde `errores`
+        es una lista de `(clave, mensaje)`.
+        """
+        borradas, errores = [], []
+        for key in keys:
+            try:
+                self.delete(key)
+                borradas.append(key)
+            except Exception as e:
+                errores.append((key, str(e)))
+        return borradas, errores
+
+
+class S3ObjectStore(ObjectStore):
+    def __init__(self, bucket=None, client=None):
+        self.bucket = bucket or s3_bucket_name()
+        if not self.bucket:
+            raise ImproperlyConfigured('S3 sin bucket: define AWS_S3_BUCKET_NAME o AWS_STORAGE_BUCKET_NAME')
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_s3_client()
+        return self._client
+
+    def presigned_post(self, key, content_type='', expires_in=3600):
+        fields = {}
+        if content_type:
+            fields['Content-Type'] = content_type
+        return self.client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=key,
+            Fields=fields,
+            Conditions=[],
+            ExpiresIn=expires_in,
+        )
+
+    def download_file(self, key, path):
+        self.client.download_file(self.bucket, key, path)
+
+    def upload_file(self, path, key):
+        self.client.upload_file(path, self.bucket, key)
+
+    def copy(self, src_key, dst_key):
+        self.client.copy_object(Bucket=self.bucket, CopySource={'Bucket': self.bucket, 'Key': src_key}, Key=dst_key)
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+
+    def iter_chunks(self, key, chunk_size=1024 * 1024):
+        body = self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def delete_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        borradas, errores = [], []
+        for i in range(0, len(keys), DELETE_BATCH_SIZE):
+            lote = keys[i:i + DELETE_BATCH_SIZE]
+            try:
+                response = self.client.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={'Objects': [{'Key': k} for k in lote], 'Quiet': True},
+                )
+            except Exception as e:
+                errores.extend((k, str(e)) for k in lote)
+                continue
+            # En modo Quiet la respuesta solo incluye las claves con error
+            fallidas = {err['Key']: err.get('Message', err.get('Code', '')) for err in response.get('Errors', [])}
+            errores.extend(fallidas.items())
+            borradas.extend(k for k in lote if k not in fallidas)
+        return borradas, errores
+
+
+class LocalObjectStore(ObjectStore):
+    """Almacén de objetos en un directorio local (desarrollo, pruebas, benchmarks)."""
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(
+            root or getattr(settings, 'LOCAL_OBJECT_STORE_ROOT', os.path.join(settings.BASE_DIR, 'object_store'))
+        )
+
+    def local_path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        # Evitar claves que salgan del directorio raíz ('../')
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError(f'Clave fuera del almacén: {key}')
+        return path
+
+    def presigned_post(self, key, content_type='', expires_in=3600):
+        token = signing.dumps(
+            {'key': key, 'ct': content_type, 'exp': int(time.time()) + expires_in}, salt=UPLOAD_TOKEN_SALT
+        )
+        fields = {'key': key, 'token': token}
+        if content_type:
+            fields['Content-Type'] = content_type
+        return {'url': reverse('documents:local_upload'), 'fields': fields}
+
+    @staticmethod
+    def verify_upload_token(token, key):
+        """Valida el token de subida para `key`; lanza signing.BadSignature si no es válido."""
+        data = signing.loads(token, salt=UPLOAD_TOKEN_SALT)
+        if data['exp'] < time.time():
+            raise signing.SignatureExpired('El token de subida ha caducado')
+        if data['key'] != key:
+            raise signing.BadSignature('El token no corresponde a esta clave')
+        return data
+
+    def save_upload(self, key, uploaded_file, extractor=None):
+        """
+        Guarda un archivo recibido por la subida tokenizada. Si se pasa un
+        `MetadataExtractor`, recibe los bloques según se escriben.
+        """
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as out:
+            for chunk in uploaded_file.chunks():
+                out.write(chunk)
+                if extractor is not None:
+                    extractor.feed(chunk)
+        return path
+
+    def download_file(self, key, path):
+        shutil.copyfile(self.local_path(key), path)
+
+    def upload_file(self, path, key):
+        dst = self.local_path(key)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copyfile(path, dst)
+
+    def copy(self, src_key, dst_key):
+        self.upload_file(self.local_path(src_key), dst_key)
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    def iter_chunks(self, key, chunk_size=1024 * 1024):
+        with open(self.local_path(key), 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+
+def get_object_store():
+    """Almacén de objetos configurado para los documentos."""
+    backend = getattr(settings, 'DOCUMENT_OBJECT_STORE', None)
+    if backend is None:
+        backend = 's3' if s3_bucket_name() else 'local'
+    if backend == 's3':
+        return S3ObjectStore()
+    if backend == 'local':
+        return LocalObjectStore()
+    raise ValueError(f'DOCUMENT_OBJECT_STORE desconocido: {backend}')
@@ -1,10 +1,10 @@
 from celery import shared_task
-import boto3
 import tempfile
 import os
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from cases.models import CaseDocument
-import pydicom
+from documents.storage import S3ObjectStore, get_object_store
 import logging
 from django.apps import apps as django_apps
 
@@ -13,114 +13,178 @@ log = logging.getLogger(__name__)
 
 @shared_task
 def anonymize_document(s3_key, case_document_id):
-    """Tarea para descargar un archivo desde S3, intentar anonimizar (DICOM)
-    y subir la versión anonimada. Actualiza `CaseDocument.is_anonymized` y `s3_file_path`.
+    """Tarea para anonimizar un DICOM (o un ZIP con una serie) subido a S3.
+
+    Los DICOM sueltos se anonimizan reescribiendo solo la cabecera: los píxeles
+    se copian en el propio S3 sin descargarlos. Los ZIP se descargan y sus
+    ficheros se procesan en paralelo. Actualiza `CaseDocument.is_anonymized`
+    y `s3_file_path`. Los PDF se delegan en `anonymize_pdf_document`.
     """
-    s3 = boto3.client(
-        's3',
-        aws_access_key_id=getattr(settings, 'AWS_ACCESS_KEY_ID', None),
-        aws_secret_access_key=getattr(settings, 'AWS_SECRET_ACCESS_KEY', None),
-        region_name=getattr(settings, 'AWS_REGION', None),
-    )
-    bucket = getattr(settings, 'AWS_S3_BUCKET_NAME')
+    from documents.dicom_anon import InvalidDicomError, anonymize_file, anonymize_s3_object, anonymize_zip
+
+    if s3_key.lower().endswith('.pdf'):
+        # Los PDF se anonimizan extrayendo y redactando su texto
+        anonymize_pdf_document.delay(case_document_id)
+        return
 
-    tmp_in = tempfile.NamedTemporaryFile(delete=False)
-    tmp_out = tempfile.NamedTemporaryFile(delete=False)
-    tmp_in.close()
-    tmp_out.close()
+    store = get_object_store()
+    # Upload anonymized file to a segregated path
+    anon_key = f"anonymized/{s3_key}"
 
     try:
-        s3.download_file(bucket, s3_key, tmp_in.name)
-
-        try:
-            ds = pydicom.dcmread(tmp_in.name)
-            # Remove common identifying tags
-            for tag in ['PatientName', 'PatientID', 'PatientBirthDate', 'PatientBirthTime', 'PatientAddress']:
-                if hasattr(ds, tag):
-                    setattr(ds, tag, '')
-            ds.remove_private_tags()
-            ds.save_as(tmp_out.name)
-
-            # Upload anonymized file to a segregated path
-            anon_key = f"anonymized/{s3_key}"
-            s3.upload_file(tmp_out.name, bucket, anon_key)
-
-            cd = CaseDocument.objects.filter(id=case_document_id).first()
-            if cd:
-                cd.s3_file_path = anon_key
-                cd.is_anonymized = True
-                cd.save()
-
-        except Exception:
-            # If file isn't DICOM or anonymization failed, mark as processed=False
-            cd = CaseDocument.objects.filter(id=case_document_id).first()
-            if cd:
-                cd.is_anonymized = False
-                cd.save()
-
-    finally:
-        try:
-            os.unlink(tmp_in.name)
-        except Exception:
-            pass
-        try:
-            os.unlink(tmp_out.name)
-        except Exception:
-            pass
+        if s3_key.lower().endswith('.zip'):
+            with tempfile.TemporaryDirectory() as tmp:
+                src = os.path.join(tmp, 'in.zip')
+                dst = os.path.join(tmp, 'out.zip')
+                store.download_file(s3_key, src)
+                resultado = anonymize_zip(src, dst)
+                if not resultado['anonimizados']:
+                    raise InvalidDicomError('El ZIP no contiene ficheros DICOM')
+                if resultado['omitidos']:
+                    log.warning('anonymize_document: %s omitidos en %s: %s', len(resultado['omitidos']), s3_key, resultado['omitidos'])
+                store.upload_file(dst, anon_key)
+        elif isinstance(store, S3ObjectStore):
+            anonymize_s3_object(store.client, store.bucket, s3_key, anon_key)
+        else:
+            dst = store.local_path(anon_key)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            anonymize_file(store.local_path(s3_key), dst)
+
+        cd = CaseDocument.objects.filter(id=case_document_id).first()
+        if cd:
+            cd.s3_file_path = anon_key
+            cd.is_anonymized = True
+            cd.save(update_fields=['s3_file_path', 'is_anonymized'])
+
+    except InvalidDicomError:
+        # If file isn't DICOM, mark as processed=False
+        CaseDocument.objects.filter(id=case_document_id).update(is_anonymized=False)
+    except Exception:
+        log.exception('anonymize_document: no se pudo anonimizar %s', s3_key)
+        CaseDocument.objects.filter(id=case_document_id).update(is_anonymized=False)
 
 
-@shared_task
-def delete_case_files_task(case_id):
-    """Elimina todos los objetos en S3 asociados a un case_id y borra registros CaseDocument.
+@shared_task(bind=True, max_retries=5, default_retry_delay=60)
+def delete_case_files_task(self, case_id, enforce_state=True):
+    """Elimina en bloque los archivos y registros CaseDocument de un case_id.
 
-    Safety: Solo procede si el Case existe y su estado es CLOSED o OPINION_COMPLETE (configurable).
+    Safety: con `enforce_state` solo procede si el estado del Case está en
+    CASE_FILE_DELETION_ALLOWED_STATES (por defecto CLOSED). Si algún objeto no
+    se pudo borrar, reintenta con backoff; los documentos afectados siguen en
+    la base de datos hasta entonces. Devuelve el resumen del caso.
     """
+    from documents.services import delete_case_files
+
+    Case = django_apps.get_model('cases', 'Case')
+    case = Case.objects.filter(case_id=case_id).first()
+    if not case:
+        log.warning('delete_case_files_task: case not found %s', case_id)
+        return {'case_id': case_id, 'skipped': 'not_found'}
+
+    # Allowed states for deletion
+    allowed = getattr(settings, 'CASE_FILE_DELETION_ALLOWED_STATES', ['CLOSED'])
+    if enforce_state and case.status not in allowed:
+        log.warning('delete_case_files_task: case %s status %s not in allowed %s', case_id, case.status, allowed)
+        return {'case_id': case_id, 'skipped': 'status'}
+
     try:
-        Case = django_apps.get_model('cases', 'Case')
-        CaseDocument = django_apps.get_model('cases', 'CaseDocument')
-        case = Case.objects.filter(case_id=case_id).first()
-        if not case:
-            log.warning('delete_case_files_task: case not found %s', case_id)
-            return
-
-        # Allowed states for deletion
-        allowed = getattr(settings, 'CASE_FILE_DELETION_ALLOWED_STATES', ['CLOSED'])
-        if case.status not in allowed:
-            log.warning('delete_case_files_task: case %s status %s not in allowed %s', case_id, case.status, allowed)
-            return
-
-        docs = CaseDocument.objects.filter(case=case)
-        if not docs.exists():
-            log.info('delete_case_files_task: no documents for case %s', case_id)
-            return
-
-        s3 = boto3.client(
-            's3',
-            aws_access_key_id=getattr(settings, 'AWS_ACCESS_KEY_ID', None),
-            aws_secret_access_key=getattr(settings, 'AWS_SECRET_ACCESS_KEY', None),
-            region_name=getattr(settings, 'AWS_REGION', None),
-        )
-        bucket = getattr(settings, 'AWS_S3_BUCKET_NAME', None)
-        if not bucket:
-            log.error('delete_case_files_task: AWS_S3_BUCKET_NAME not set')
-            return
-
-        for cd in docs:
-            key = cd.s3_file_path
-            if not key:
-                log.warning('delete_case_files_task: CaseDocument id=%s has no s3_file_path', cd.id)
-                continue
-            try:
-                s3.delete_object(Bucket=bucket, Key=key)
-                log.info('delete_case_files_task: deleted s3 object %s', key)
-            except Exception as e:
-                log.exception('delete_case_files_task: error deleting %s: %s', key, e)
-            try:
-                cd.delete()
-                log.info('delete_case_files_task: deleted CaseDocument id=%s', cd.id)
-            except Exception as e:
-                log.exception('delete_case_files_task: error deleting CaseDocument id=%s: %s', cd.id, e)
-
-        log.info('delete_case_files_task: finished for case %s', case_id)
-    except Exception:
+        store = get_object_store()
+    except ImproperlyConfigured as e:
+        log.error('delete_case_files_task: %s', e)
+        return {'case_id': case_id, 'skipped': 'no_bucket'}
+
+    try:
+        summary = delete_case_files(case, store=store)
+    except Exception as e:
         log.exception('delete_case_files_task: unexpected error for case %s', case_id)
+        raise self.retry(exc=e, countdown=self.default_retry_delay * 2 ** self.request.retries)
+
+    if summary['errors'] and self.request.retries < self.max_retries:
+        log.warning('delete_case_files_task: %s errores en %s; reintentando', len(summary['errors']), case_id)
+        raise self.retry(countdown=self.default_retry_delay * 2 ** self.request.retries)
+
+    log.info('delete_case_files_task: finished for case %s: %s', case_id, summary)
+    return summary
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def generate_document_renditions(self, case_document_id):
+    """Genera la miniatura y la versión media de un CaseDocument de imagen o DICOM."""
+    from documents.renditions import RENDITION_SIZES, generate_renditions, rendition_name
+
+    cd = CaseDocument.objects.filter(id=case_document_id).first()
+    if not cd or not cd.has_stored_file:
+        return {}
+    storage = cd.file.storage
+    existentes = {v: rendition_name(cd.file.name, v) for v in RENDITION_SIZES}
+    if all(storage.exists(n) for n in existentes.values()):
+        # Blob compartido con otro documento que ya las generó
+        return existentes
+    try:
+        generadas = generate_renditions(cd)
+    except (OSError, ValueError) as e:
+        # Archivo corrupto o formato no soportado: no tiene sentido reintentar
+        log.warning('generate_document_renditions: doc %s sin renditions: %s', case_document_id, e)
+        return {}
+    except Exception as e:
+        log.exception('generate_document_renditions: error en doc %s', case_document_id)
+        raise self.retry(exc=e)
+    log.info('generate_document_renditions: doc %s -> %s', case_document_id, generadas)
+    return generadas
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def anonymize_pdf_document(self, case_document_id):
+    """Genera la versión de texto redactada de un CaseDocument PDF.
+
+    Las páginas se procesan en paralelo (ver documents.pdf_redaction) y el
+    avance se guarda en `CaseDocument.anonymization_progress`. Al terminar
+    marca `is_anonymized` y devuelve el nombre del texto en el storage.
+    """
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+    from documents.pdf_redaction import (
+        PYPDF_AVAILABLE, format_redacted_text, local_pdf_path, redact_pdf, redacted_text_name,
+    )
+
+    cd = CaseDocument.objects.select_related('case__patient').filter(id=case_document_id).first()
+    if not cd or not (cd.has_stored_file or cd.s3_file_path):
+        return None
+    if not PYPDF_AVAILABLE:
+        log.warning('anonymize_pdf_document: pypdf no instalado; doc %s sin procesar', case_document_id)
+        return None
+
+    patient = cd.case.patient
+    nombres = [patient.get_full_name()] if patient else []
+    progreso = {'ultimo': 0}
+
+    def actualizar(hechas, total):
+        # 100 solo cuando el texto ya está guardado; escrituras cada 5 puntos
+        porcentaje = hechas * 99 // total
+        if porcentaje >= progreso['ultimo'] + 5:
+            CaseDocument.objects.filter(pk=cd.pk).update(anonymization_progress=porcentaje)
+            progreso['ultimo'] = porcentaje
+
+    CaseDocument.objects.filter(pk=cd.pk).update(anonymization_progress=0)
+    try:
+        with local_pdf_path(cd) as path:
+            paginas = redact_pdf(path, nombres, progress=actualizar)
+    except (OSError, ValueError) as e:
+        log.warning('anonymize_pdf_document: doc %s no se pudo leer: %s', case_document_id, e)
+        return None
+    except Exception as e:
+        from pypdf.errors import PyPdfError
+        if isinstance(e, PyPdfError):
+            # PDF corrupto o cifrado: no tiene sentido reintentar
+            log.warning('anonymize_pdf_document: doc %s no es un PDF legible: %s', case_document_id, e)
+            return None
+        log.exception('anonymize_pdf_document: error en doc %s', case_document_id)
+        raise self.retry(exc=e)
+
+    name = redacted_text_name(cd)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    name = default_storage.save(name, ContentFile(format_redacted_text(paginas).encode('utf-8')))
+    CaseDocument.objects.filter(pk=cd.pk).update(anonymization_progress=100, is_anonymized=True)
+    log.info('anonymize_pdf_document: doc %s -> %s (%s páginas)', case_document_id, name, len(paginas))
+    return name
@@ -5,4 +5,5 @@ app_name = 'documents'
 
 urlpatterns = [
     path('presigned-upload/', views.get_presigned_upload, name='presigned_upload'),
+    path('local-upload/', views.local_upload, name='local_upload'),
 ]
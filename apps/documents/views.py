@@ -1,7 +1,11 @@
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponseForbidden
+from django.core import signing
+from django.http import HttpResponse, JsonResponse, HttpResponseBadRequest, HttpResponseForbidden
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
+from .metadata import MetadataExtractor
 from .services import generate_presigned_post
+from .storage import LocalObjectStore, get_object_store
 from cases.models import Case, CaseDocument
 from documents.tasks import anonymize_document
 import logging
@@ -39,3 +43,32 @@ def get_presigned_upload(request):
     anonymize_document.delay(key, cd.id)
 
     return JsonResponse({'presigned': post, 'document_id': cd.id})
+
+
+@csrf_exempt
+@require_POST
+def local_upload(request):
+    """Destino de las subidas "presignadas" del almacén local.
+
+    Equivale al POST directo a S3: la autorización la da el token firmado
+    que emitió `get_presigned_upload` para esa clave, no la sesión.
+    """
+    store = get_object_store()
+    if not isinstance(store, LocalObjectStore):
+        return HttpResponseForbidden()
+
+    key = request.POST.get('key', '')
+    upload = request.FILES.get('file')
+    if not key or upload is None:
+        return HttpResponseBadRequest('Faltan key o file')
+    extractor = MetadataExtractor(upload.name)
+    try:
+        store.verify_upload_token(request.POST.get('token', ''), key)
+        store.save_upload(key, upload, extractor=extractor)
+    except (signing.BadSignature, ValueError):
+        return HttpResponseForbidden()
+
+    meta = extractor.result()
+    CaseDocument.objects.filter(s3_file_path=key).update(**meta)
+    log.info('local_upload: stored key=%s size=%s mime=%s', key, meta['file_size'], meta['mime_type'])
+    return HttpResponse(status=204)
@@ -141,9 +141,13 @@ class Medico(TimeStampedModel):
         return max(0, self.max_casos_mes - self.casos_actuales)
     
     def actualizar_casos(self, incremento=1):
-        self.casos_actuales += incremento
-        self.casos_revisados += incremento
-        self.save()
+        """
+        Suma revisiones completadas con un UPDATE atómico.
+
+        `casos_actuales` (casos abiertos) lo mantiene `cases.workload`.
+        """
+        Medico.objects.filter(pk=self.pk).update(casos_revisados=models.F('casos_revisados') + incremento)
+        self.refresh_from_db(fields=['casos_revisados'])
     
     def __str__(self):
         return f"Dr. {self.nombre_completo} - {self.registro_medico}"
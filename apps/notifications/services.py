@@ -1,7 +1,8 @@
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.utils import timezone
-from .models import EmailLog, EmailTemplate, DoctorInvitation
+from core.reference_data import email_template
+from .models import EmailLog, DoctorInvitation
 from datetime import timedelta
 from .tasks import send_email_task
 
@@ -14,7 +15,7 @@ class EmailService:
         # Try to find template metadata
         template_meta = None
         try:
-            template_meta = EmailTemplate.objects.filter(name=template_name).first()
+            template_meta = email_template(template_name)
         except Exception:
             template_meta = None
 
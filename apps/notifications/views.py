@@ -6,7 +6,7 @@ from django.urls import reverse
 from authentication.models import CustomUser
 from authentication.services import DoctorService
 from django.core.exceptions import ValidationError
-from medicos.models import TipoCancer
+from core.reference_data import tipos_cancer_activos
 from .models import DoctorInvitation
 
 
@@ -23,7 +23,7 @@ class DoctorRegisterView(View):
             return render(request, 'registration/invalid_invite.html', {'reason': 'expired'})
 
         # Obtener todos los tipos de cáncer disponibles para la selección
-        tipos_cancer = TipoCancer.objects.filter(activo=True).select_related('grupo_medico')
+        tipos_cancer = tipos_cancer_activos()
 
         return render(request, self.template_name, {
             'invite': invite,
@@ -72,7 +72,7 @@ class DoctorRegisterView(View):
 
         if not password:
             messages.error(request, 'La contraseña es requerida')
-            tipos_cancer = TipoCancer.objects.filter(activo=True)
+            tipos_cancer = tipos_cancer_activos()
             return render(request, self.template_name, {
                 'invite': invite,
                 'tipos_cancer': tipos_cancer
@@ -115,7 +115,7 @@ class DoctorRegisterView(View):
         except ValidationError as e:
             print(f"[DEBUG] ValidationError: {str(e)}")
             messages.error(request, str(e))
-            tipos_cancer = TipoCancer.objects.filter(activo=True)
+            tipos_cancer = tipos_cancer_activos()
             return render(request, self.template_name, {
                 'invite': invite,
                 'tipos_cancer': tipos_cancer
@@ -123,7 +123,7 @@ class DoctorRegisterView(View):
         except Exception as e:
             print(f"[DEBUG] Exception: {type(e).__name__}: {str(e)}")
             messages.error(request, f'Error al completar el registro: {str(e)}')
-            tipos_cancer = TipoCancer.objects.filter(activo=True)
+            tipos_cancer = tipos_cancer_activos()
             return render(request, self.template_name, {
                 'invite': invite,
                 'tipos_cancer': tipos_cancer
@@ -1,8 +1,25 @@
 import os
 from celery import Celery
+from celery.schedules import crontab
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'oncosegunda.settings')
 
 app = Celery('oncosegunda')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
+
+# Tareas periódicas (celery beat)
+app.conf.beat_schedule = {
+    'reconcile-workload-nightly': {
+        'task': 'cases.tasks.reconcile_workload_task',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'verify-vote-tallies-hourly': {
+        'task': 'cases.tasks.verify_vote_tallies_task',
+        'schedule': crontab(minute=15),
+    },
+    'cleanup-chunked-uploads-hourly': {
+        'task': 'cases.tasks.cleanup_chunked_uploads_task',
+        'schedule': crontab(minute=45),
+    },
+}
@@ -78,6 +78,10 @@ if USE_S3:
     DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
     MEDIA_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/media/'
 
+# Descargas de documentos servidas por nginx (location interna /protected-media/)
+DOCUMENT_DOWNLOAD_X_ACCEL = os.environ.get('DOCUMENT_DOWNLOAD_X_ACCEL', 'True').lower() == 'true'
+DOCUMENT_X_ACCEL_PREFIX = '/protected-media/'
+
 # =============================================================================
 # EMAIL - PRODUCCIÓN
 # =============================================================================
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Benchmark del cálculo de scores de asignación para grupos de 10 a 10.000 médicos.
+
+Compara el método anterior (un `calcular_score_compuesto` por candidato, con
+`timezone.now()` y un dict cada uno, y `sort` completo) con
+`cases.scoring` (arrays de NumPy y top-k). Los datos son sintéticos y no
+tocan la base de datos; se comprueba que ambos eligen el mismo médico con
+los mismos scores.
+
+Uso:
+    python scripts/bench_assignment_scoring.py --sizes 10 100 1000 10000 --repeat 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'apps'))
+
+from django.conf import settings
+
+settings.configure(USE_TZ=True)
+
+from django.utils import timezone
+
+from cases.scoring import NUMPY_AVAILABLE, calcular_scores
+
+
+def anterior(medicos, config):
+    """Método previo de AssignmentService (scores por candidato y sort completo)."""
+    candidatos = []
+    for medico in medicos:
+        score_carga = min(1.0, (medico.casos_actuales or 0) / (medico.max_casos_mes or 1))
+        score_antiguedad = min(1.0, (timezone.now() - medico.fecha_ingreso).days / 1825)
+        ponderacion = config.ponderacion_carga / 100.0
+        if config.modo_estricto:
+            score_final = -score_antiguedad
+        else:
+            score_final = (ponderacion * score_carga) - ((1 - ponderacion) * score_antiguedad)
+        candidatos.append({'medico': medico, 'score_carga': score_carga,
+                           'score_antiguedad': score_antiguedad, 'score_final': score_final})
+    candidatos.sort(key=lambda x: x['score_final'])
+    return candidatos[0]
+
+
+def medir(fn, repeat):
+    inicio = time.perf_counter()
+    for _ in range(repeat):
+        resultado = fn()
+    return (time.perf_counter() - inicio) / repeat, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    config = SimpleNamespace(ponderacion_carga=60, modo_estricto=False)
+    ahora = timezone.now()
+    print(f'NumPy: {"sí" if NUMPY_AVAILABLE else "no (Python puro)"}')
+    print(f'{"médicos":>8} {"anterior ms":>12} {"motor ms":>10} {"x":>6}')
+    for n in args.sizes:
+        medicos = [
+            SimpleNamespace(
+                pk=i,
+                casos_actuales=rng.randint(0, 14),
+                max_casos_mes=rng.choice([0, 5, 10, 15]),
+                fecha_ingreso=ahora - timedelta(days=rng.randint(0, 3000), seconds=rng.randint(0, 86399)),
+            )
+            for i in range(n)
+        ]
+        filas = [(m.pk, m.casos_actuales, m.max_casos_mes, m.fecha_ingreso) for m in medicos]
+
+        t_anterior, mejor = medir(lambda: anterior(medicos, config), args.repeat)
+        t_motor, scores = medir(lambda: calcular_scores(filas, config), args.repeat)
+        i = scores.top_k(1)[0]
+        _, carga, antiguedad, final = scores.fila(i)
+        assert mejor['medico'].pk == scores.fila(i)[0]
+        assert (carga, antiguedad, final) == (mejor['score_carga'], mejor['score_antiguedad'], mejor['score_final'])
+        print(f'{n:>8} {t_anterior * 1000:>12.3f} {t_motor * 1000:>10.3f} {t_anterior / t_motor:>6.1f}')
+
+
+if __name__ == '__main__':
+    main()
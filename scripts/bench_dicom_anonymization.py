@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""
+Benchmark de anonimización DICOM sobre una serie sintética.
+
+Compara el método anterior (dcmread completo + save_as por fichero) con la
+reescritura de solo cabecera de `documents.dicom_anon`, secuencial y con
+pool de procesos.
+
+Uso:
+    python scripts/bench_dicom_anonymization.py --slices 500 --rows 512 --workers 4
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'apps'))
+
+import pydicom
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+from documents.dicom_anon import DEFAULT_TAG_PROFILE, anonymize_series
+
+LEGACY_TAGS = ['PatientName', 'PatientID', 'PatientBirthDate', 'PatientBirthTime', 'PatientAddress']
+
+
+def crear_serie(directorio, slices, rows):
+    """Genera `slices` cortes CT de rows x rows a 16 bits con datos de paciente."""
+    series_uid = generate_uid()
+    pixel_data = os.urandom(rows * rows * 2)
+    rutas = []
+    for i in range(slices):
+        meta = FileMetaDataset()
+        meta.MediaStorageSOPClassUID = CTImageStorage
+        meta.MediaStorageSOPInstanceUID = generate_uid()
+        meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+        ds = Dataset()
+        ds.file_meta = meta
+        ds.preamble = b'\0' * 128
+        ds.SOPClassUID = CTImageStorage
+        ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+        ds.SeriesInstanceUID = series_uid
+        ds.InstanceNumber = i + 1
+        ds.PatientName = 'Paciente^Prueba'
+        ds.PatientID = 'ID-0001'
+        ds.PatientBirthDate = '19700101'
+        ds.PatientAddress = 'Calle Falsa 123'
+        ds.InstitutionAddress = 'Hospital'
+        ds.add_new(0x00091001, 'LO', 'privado')
+        ds.Rows = rows
+        ds.Columns = rows
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = 'MONOCHROME2'
+        ds.BitsAllocated = 16
+        ds.BitsStored = 16
+        ds.HighBit = 15
+        ds.PixelRepresentation = 0
+        ds.PixelData = pixel_data
+
+        ruta = os.path.join(directorio, f'slice_{i:04d}.dcm')
+        ds.save_as(ruta, enforce_file_format=True)
+        rutas.append(ruta)
+    return rutas
+
+
+def legacy(pairs):
+    """Método anterior de anonymize_document: lectura y escritura completas."""
+    for src, dst in pairs:
+        ds = pydicom.dcmread(src)
+        for tag in LEGACY_TAGS:
+            if hasattr(ds, tag):
+                setattr(ds, tag, '')
+        ds.remove_private_tags()
+        ds.save_as(dst)
+
+
+def medir(nombre, fn, total_bytes):
+    inicio = time.perf_counter()
+    fn()
+    duracion = time.perf_counter() - inicio
+    print(f'{nombre:<32} {duracion:8.2f} s  {total_bytes / duracion / 1e6:8.1f} MB/s')
+    return duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--slices', type=int, default=500)
+    parser.add_argument('--rows', type=int, default=512)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench_dicom_')
+    try:
+        src_dir = os.path.join(tmp, 'src')
+        os.makedirs(src_dir)
+        rutas = crear_serie(src_dir, args.slices, args.rows)
+        total = sum(os.path.getsize(r) for r in rutas)
+        print(f'Serie sintética: {args.slices} cortes de {args.rows}x{args.rows}, {total / 1e6:.1f} MB')
+
+        def destinos(nombre):
+            d = os.path.join(tmp, nombre)
+            os.makedirs(d)
+            return [(r, os.path.join(d, os.path.basename(r))) for r in rutas]
+
+        base = medir('dcmread completo (anterior)', lambda: legacy(destinos('legacy')), total)
+        seq = medir('solo cabecera, 1 proceso', lambda: anonymize_series(destinos('seq'), workers=1, profile=DEFAULT_TAG_PROFILE), total)
+        par = medir(
+            f'solo cabecera, {args.workers} procesos',
+            lambda: anonymize_series(destinos('par'), workers=args.workers, profile=DEFAULT_TAG_PROFILE),
+            total,
+        )
+        print(f'Aceleración: x{base / seq:.1f} (secuencial), x{base / par:.1f} (pool)')
+
+        # Comprobación: los píxeles no cambian y los tags se vacían
+        original = pydicom.dcmread(rutas[0])
+        anonimo = pydicom.dcmread(os.path.join(tmp, 'par', os.path.basename(rutas[0])))
+        assert anonimo.PixelData == original.PixelData
+        assert str(anonimo.PatientName) == '' and 'InstitutionAddress' not in anonimo
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
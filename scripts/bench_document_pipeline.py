@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+Benchmark del flujo de documentos sin AWS, sobre el almacén de objetos local.
+
+Etapas: emisión de la subida presignada (token), subida por el endpoint
+`documents:local_upload`, anonimización DICOM (`anonymize_document`) y
+borrado. Si boto3 está instalado, compara además crear un cliente S3 por
+llamada con reutilizar el cliente compartido de `get_s3_client()`.
+
+Uso:
+    python scripts/bench_document_pipeline.py --docs 200 --rows 256
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import django
+
+# Add project root to path
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'oncosegunda.settings')
+
+# Setup Django
+django.setup()
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from documents.services import generate_presigned_post
+from documents.storage import get_object_store, get_s3_client
+from documents.tasks import anonymize_document
+
+
+def crear_dicom(rows):
+    """Devuelve los bytes de un corte CT sintético con datos de paciente."""
+    import io
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = CTImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.preamble = b'\0' * 128
+    ds.SOPClassUID = CTImageStorage
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.PatientName = 'Paciente^Prueba'
+    ds.PatientID = 'ID-0001'
+    ds.Rows = rows
+    ds.Columns = rows
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = 'MONOCHROME2'
+    ds.BitsAllocated = 16
+    ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 0
+    ds.PixelData = os.urandom(rows * rows * 2)
+    out = io.BytesIO()
+    ds.save_as(out, enforce_file_format=True)
+    return out.getvalue()
+
+
+def etapa(nombre, n, fn):
+    inicio = time.perf_counter()
+    resultado = fn()
+    duracion = time.perf_counter() - inicio
+    print(f'{nombre:<28} {duracion:8.3f} s  {n / duracion:10.1f} docs/s')
+    return resultado
+
+
+def bench_clientes(n):
+    try:
+        import boto3
+    except ImportError:
+        print('boto3 no instalado: se omite la comparación de clientes S3')
+        return
+    etapa('boto3.client() por llamada', n, lambda: [boto3.client('s3', region_name='us-east-1') for _ in range(n)])
+    etapa('get_s3_client() compartido', n, lambda: [get_s3_client() for _ in range(n)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--docs', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=256)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench_object_store_')
+    try:
+        with override_settings(DOCUMENT_OBJECT_STORE='local', LOCAL_OBJECT_STORE_ROOT=root):
+            store = get_object_store()
+            payload = crear_dicom(args.rows)
+            print(f'{args.docs} documentos DICOM de {len(payload) / 1024:.0f} KB en {root}')
+
+            class CasoFalso:
+                case_id = 'CASO-BENCH'
+
+            posts = etapa(
+                'presigned post (token)', args.docs,
+                lambda: [generate_presigned_post(CasoFalso, f'corte_{i}.dcm', 'application/dicom') for i in range(args.docs)],
+            )
+
+            client = Client()
+            url = reverse('documents:local_upload')
+
+            def subir():
+                for post, key in posts:
+                    data = dict(post['fields'])
+                    data['file'] = SimpleUploadedFile('f.dcm', payload, content_type='application/dicom')
+                    response = client.post(url, data)
+                    assert response.status_code == 204, response.status_code
+
+            etapa('subida tokenizada', args.docs, subir)
+            # Llamada directa (sin broker); el id 0 no actualiza ningún CaseDocument
+            etapa('anonimización', args.docs, lambda: [anonymize_document(key, 0) for _, key in posts])
+            assert all(store.exists(f'anonymized/{key}') for _, key in posts)
+            etapa('borrado', args.docs, lambda: [store.delete(k) for _, key in posts for k in (key, f'anonymized/{key}')])
+
+        bench_clientes(50)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
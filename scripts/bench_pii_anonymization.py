@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+Benchmark de anonimización de PII en notas clínicas sintéticas.
+
+Compara el método anterior (tres pasadas de regex más un `str.replace` por
+cada palabra del nombre) con la regex combinada de `cases.anonymization`,
+para textos de tamaño creciente y diccionarios de nombres grandes. El tiempo
+por MB de la versión en una pasada debe mantenerse constante.
+
+Uso:
+    python scripts/bench_pii_anonymization.py --sizes 1 2 4 8 --names 2 200 5000
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'apps'))
+
+from cases.anonymization import PATRONES_PII, anonimizar, anonimizar_lote
+
+FRASES = [
+    'Paciente {nombre} de 54 años con adenocarcinoma pulmonar estadio IIIA. ',
+    'Contacto: {email}, teléfono {telefono}. ',
+    'Documento de identidad {cedula}. TC de tórax del 12/03/2024 sin cambios. ',
+    'Se discute en comité el esquema de quimioterapia y radioterapia concurrente. ',
+]
+
+
+def nombres_aleatorios(n, rng):
+    return [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10))).capitalize() for _ in range(n)]
+
+
+def generar_texto(mb, nombres, rng):
+    partes = []
+    total = 0
+    while total < mb * 1_000_000:
+        frase = rng.choice(FRASES).format(
+            nombre=rng.choice(nombres),
+            email=f'{rng.choice(nombres).lower()}@example.com',
+            telefono=f'555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}',
+            cedula=rng.randint(10_000_000, 99_999_999),
+        )
+        partes.append(frase)
+        total += len(frase)
+    return ''.join(partes)
+
+
+def anterior(texto, nombres):
+    """Método previo de AnonymizationService.anonimizar_texto."""
+    resultado = re.sub(PATRONES_PII['email'], '[EMAIL_REMOVIDO]', texto)
+    resultado = re.sub(PATRONES_PII['telefono'], '[TELÉFONO_REMOVIDO]', resultado)
+    resultado = re.sub(PATRONES_PII['cedula'], '[ID_REMOVIDO]', resultado)
+    for nombre in ' '.join(nombres).split():
+        if len(nombre) > 3:
+            resultado = resultado.replace(nombre, '[NOMBRE_REMOVIDO]')
+    return resultado
+
+
+def medir(fn):
+    inicio = time.perf_counter()
+    fn()
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 2, 4, 8], help='Tamaños de texto en MB')
+    parser.add_argument('--names', type=int, nargs='+', default=[2, 200, 5000], help='Tamaños del diccionario de nombres')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f'{"nombres":>8} {"MB":>6} {"anterior s":>11} {"1 pasada s":>11} {"s/MB":>7}')
+    for n in args.names:
+        nombres = nombres_aleatorios(n, rng)
+        for mb in args.sizes:
+            texto = generar_texto(mb, nombres, rng)
+            t_anterior = medir(lambda: anterior(texto, nombres))
+            t_nuevo = medir(lambda: anonimizar(texto, nombres))
+            print(f'{n:>8} {mb:>6.1f} {t_anterior:>11.3f} {t_nuevo:>11.3f} {t_nuevo / mb:>7.3f}')
+
+    # Lote: muchas notas cortas con el mismo paciente
+    nombres = nombres_aleatorios(3, rng)
+    notas = [generar_texto(0.002, nombres, rng) for _ in range(5000)]
+    t_individual = medir(lambda: [anonimizar(t, nombres) for t in notas])
+    t_lote = medir(lambda: anonimizar_lote(notas, nombres))
+    print(f'5000 notas: individual {t_individual:.3f} s, anonimizar_lote {t_lote:.3f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,47 +1,25 @@
-import os,sys,shutil
+"""
+Exporta en un ZIP los documentos de todos los casos de un paciente.
+
+Uso:
+    python scripts/export_patient_documents.py paciente@example.com [salida.zip]
+
+Equivale a `python manage.py export_case_documents --patient <email>`.
+"""
+import os, sys
 from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent.parent
 sys.path.insert(0,str(BASE_DIR))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE','oncosegunda.settings')
 import django
 django.setup()
-from django.contrib.auth import get_user_model
-User = get_user_model()
-
-EMAIL = 'germanbarreiro2121@gmail.com'
-EXPORT_DIR = BASE_DIR / 'exports' / EMAIL
-EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+from django.core.management import call_command
 
-user = User.objects.filter(email__iexact=EMAIL).first()
-if not user:
-    print('No se encontró usuario con email', EMAIL)
+if len(sys.argv) < 2:
+    print(__doc__)
     sys.exit(1)
 
-from cases.models import CaseDocument
-
-qs = CaseDocument.objects.filter(case__patient=user)
-if not qs.exists():
-    print('No se encontraron documentos para el usuario', EMAIL)
-    sys.exit(0)
-
-exported = []
-for doc in qs:
-    try:
-        if not doc.file:
-            print('Documento sin archivo:', doc.file_name)
-            continue
-        src = Path(doc.file.path)
-        if not src.exists():
-            print('Archivo no existe en storage:', src)
-            continue
-        dst = EXPORT_DIR / f"{doc.case.case_id}__{doc.pk}__{doc.file_name}"
-        shutil.copy2(src, dst)
-        exported.append(dst)
-        print('Exportado:', dst)
-    except Exception as e:
-        print('Error exportando', doc.pk, e)
-
-print('\nResumen:')
-print(f'Total documentos exportados: {len(exported)}')
-for p in exported:
-    print(p)
+options = {'patient': sys.argv[1]}
+if len(sys.argv) > 2:
+    options['output'] = sys.argv[2]
+call_command('export_case_documents', **options)